@@ -9,6 +9,18 @@ GUNICORN_WORKER_CLASS="${GUNICORN_WORKER_CLASS:-sync}"
 GUNICORN_NUM_WORKERS="${GUNICORN_NUM_WORKERS:-2}"
 GUNICORN_NUM_THREADS="${GUNICORN_NUM_THREADS:-5}"
 GUNICORN_TIMEOUT="${GUNICORN_TIMEOUT:-60}"
+# wsgi: flask app on (g)thread workers; asgi: same app on uvicorn workers, async db and appsvc I/O (sessionsvc.asgi)
+SERVING_MODE="${SERVING_MODE:-wsgi}"
+if [ "${SERVING_MODE}" = "asgi" ]; then
+    GUNICORN_WORKER_CLASS="uvicorn.workers.UvicornWorker"
+    GUNICORN_APP="sessionsvc.asgi:create_asgi_app()"
+else
+    GUNICORN_APP="sessionsvc:create_app()"
+fi
+# load the app in the master before forking workers (gunicorn.config.py): memory shared by all workers, fast respawns
+export GUNICORN_PRELOAD="${GUNICORN_PRELOAD:-false}"
+# /metrics aggregates samples of all workers through this directory (recreated on start)
+export PROMETHEUS_MULTIPROC_DIR="${PROMETHEUS_MULTIPROC_DIR:-/tmp/sessionsvc-metrics}"
 
 exec "gunicorn" \
     --bind ":${GUNICORN_PORT}" \
@@ -21,4 +33,4 @@ exec "gunicorn" \
     --limit-request-field_size 0 \
     --threads ${GUNICORN_NUM_THREADS} \
     -c "${APP_HOME_DIR}/conf/gunicorn.config.py" \
-    sessionsvc:create_app\(\)
+    "${GUNICORN_APP}"
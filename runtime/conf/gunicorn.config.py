@@ -1,5 +1,7 @@
+import gc
 import logging
 import os
+import shutil
 
 from gunicorn.arbiter import Arbiter
 from gunicorn.workers.gthread import ThreadWorker
@@ -15,6 +17,23 @@ from opentelemetry.sdk._logs.export import BatchLogRecordProcessor
 from opentelemetry.sdk.resources import Resource
 from opentelemetry.sdk.trace import TracerProvider
 from opentelemetry.sdk.trace.export import BatchSpanProcessor
+from prometheus_client import multiprocess
+
+# the app is created once in the master and workers are forked with it (faster worker start and recycling, memory
+# shared between workers), see README
+preload_app = os.environ.get("GUNICORN_PRELOAD", "false").lower() == "true"
+
+# objects of the preloaded app are shared with workers copy-on-write: the master doesn't collect garbage, which would
+# leave holes in the shared pages, and moves them out of the collector's reach before every fork, so that workers'
+# collections don't write to (and copy) them
+if preload_app:
+    gc.disable()
+
+# per-worker prometheus metric files, aggregated by /metrics (see sessionsvc.biz.metrics); the directory must exist
+# before sessionsvc is imported (by the preloaded app), it's emptied of the previous run's files on start
+PROMETHEUS_MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+if PROMETHEUS_MULTIPROC_DIR:
+    os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
 
 OTEL_COLLECTOR_HOST = os.environ.get("OTEL_COLLECTOR_HOST")
 OTEL_COLLECTOR_PORT = os.environ.get("OTEL_COLLECTOR_PORT")
@@ -22,9 +41,35 @@ OTEL_SERVICE_NAME = os.environ.get("OTEL_SERVICE_NAME")
 OTEL_SERVICE_INSTANCE_ID = os.environ.get("OTEL_SERVICE_INSTANCE_ID")
 
 OTEL_TRACE_ENABLED = os.environ.get("OTEL_TRACE_ENABLED", "false").lower() == "true"
+# head sampling is set with the standard OTEL_TRACES_SAMPLER (e.g. parentbased_traceidratio) and
+# OTEL_TRACES_SAMPLER_ARG; tail sampling exports only head-sampled traces which failed, took longer than
+# OTEL_TAIL_SAMPLING_LATENCY seconds or were picked with OTEL_TAIL_SAMPLING_RATIO (disabled when latency is not set)
+OTEL_TAIL_SAMPLING_LATENCY = os.environ.get("OTEL_TAIL_SAMPLING_LATENCY")
+OTEL_TAIL_SAMPLING_RATIO = float(os.environ.get("OTEL_TAIL_SAMPLING_RATIO", 0))
+
+
+def on_starting(server: Arbiter) -> None:
+    if PROMETHEUS_MULTIPROC_DIR:
+        # samples of the previous run's workers must not be aggregated
+        shutil.rmtree(PROMETHEUS_MULTIPROC_DIR, ignore_errors=True)
+        os.makedirs(PROMETHEUS_MULTIPROC_DIR)
+
+
+def child_exit(server: Arbiter, worker: ThreadWorker) -> None:
+    if PROMETHEUS_MULTIPROC_DIR:
+        # drops the worker's live gauges (in-flight requests, pool usage) from the aggregate
+        multiprocess.mark_process_dead(worker.pid)
+
+
+def pre_fork(server: Arbiter, worker: ThreadWorker) -> None:
+    if preload_app:
+        gc.freeze()
 
 
 def post_fork(server: Arbiter, worker: ThreadWorker) -> None:
+    if preload_app:
+        gc.enable()
+    # exporters run background threads, which don't survive the fork: they are set up in every worker
     if not OTEL_TRACE_ENABLED:
         return
 
@@ -54,4 +99,11 @@ def post_fork(server: Arbiter, worker: ThreadWorker) -> None:
     span_processor = BatchSpanProcessor(
         OTLPSpanExporter(endpoint=f"{OTEL_COLLECTOR_HOST}:{OTEL_COLLECTOR_PORT}", insecure=True)
     )
+    if OTEL_TAIL_SAMPLING_LATENCY:
+        # imported in the worker, the config is loaded before the app
+        from sessionsvc.biz.tracing import TailSamplingSpanProcessor  # pylint: disable=import-outside-toplevel
+
+        span_processor = TailSamplingSpanProcessor(
+            span_processor, latency_threshold=float(OTEL_TAIL_SAMPLING_LATENCY), ratio=OTEL_TAIL_SAMPLING_RATIO
+        )
     trace.get_tracer_provider().add_span_processor(span_processor)
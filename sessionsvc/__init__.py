@@ -2,27 +2,69 @@ import os
 
 from flask import Flask
 
+from sessionsvc import migrations
 from sessionsvc.api import api
 from sessionsvc.biz import (
+    audit,
+    dcs,
+    dto,
     errors,
+    feed,
     log,
+    metrics,
+    pgnotify,
+    reaper,
+    serialization,
+    session,
+    sqlcount,
+    stats,
+    stats_maintenance,
+    stats_storage,
+    tracing,
 )
 from sessionsvc.biz.sqldb import sqldb
+from sessionsvc.services import appsvc
+from sessionsvc.services.dto import appsvc as dto_appsvc
 
 
-def create_app() -> Flask:
+def create_app(asgi: bool = False) -> Flask:
+    """Creates the WSGI app, or the app served by sessionsvc.asgi (asyncpg db driver) if `asgi` is set."""
     app = Flask(__name__)
     app.config.from_prefixed_env()
+    app.config["ASGI"] = asgi
+    driver = "postgresql+asyncpg" if asgi else "postgresql"
     app.config["SQLALCHEMY_DATABASE_URI"] = (
-        f'postgresql://{os.environ["SQLDB_USERNAME"]}:{os.environ["SQLDB_PASSWORD"]}@{os.environ["SQLDB_HOST"]}:\
+        f'{driver}://{os.environ["SQLDB_USERNAME"]}:{os.environ["SQLDB_PASSWORD"]}@{os.environ["SQLDB_HOST"]}:\
         {os.environ["SQLDB_PORT"]}/{os.environ["SQLDB_DBNAME"]}'
     )
 
     # init extensions
     api.init_app(app)
+    # before sqldb: sets the instrumented connection pool class
+    metrics.init_app(app)
+    tracing.init_app(app)
     sqldb.init_app(app)
+    sqlcount.init_app(app)
     errors.init_app(app)
     log.init_app(app)
+    pgnotify.init_app(app)
+    session.init_app(app)
+    feed.init_app(app)
+    audit.init_app(app)
+    reaper.init_app(app)
+    stats.init_app(app)
+    stats_maintenance.init_app(app)
+    stats_storage.init_app(app)
+    dcs.init_app(app)
+    migrations.init_app(app)
+    appsvc.init_app(app)
+
+    # built now rather than by the first requests of every worker (and shared by workers forked with --preload)
+    serialization.build_schemas(dto, dto_appsvc)
+    # with --preload the app is created in the gunicorn master, forked workers must not reuse its pooled connections
+    with app.app_context():
+        engine = sqldb.engine
+    os.register_at_fork(after_in_child=lambda: engine.dispose(close=False))
 
     app.logger.info("app init completed")
 
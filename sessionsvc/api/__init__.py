@@ -2,28 +2,55 @@ from flask_restful import Api
 
 from sessionsvc.api.session import (
     CloseSession,
+    CloseSessions,
     CreateSession,
+    GetAppSvcClientStats,
+    GetConsumerEvents,
     GetConsumerSessions,
+    GetDcRankingCacheStats,
     GetProducerSessions,
     GetSession,
+    GetSessionCacheStats,
+    GetSessionEvents,
+    GetSessionHistory,
     GetSessions,
+    GetUserDcs,
+    GetUserEvents,
+    GetUserHistory,
+    GetUserRtts,
     GetUserSessions,
     PauseSession,
     StartSession,
     SubmitWebRtcStats,
 )
+from sessionsvc.biz.serialization import output_fast_json
 
 api = Api()
+api.representations["application/json"] = output_fast_json
 
 # setup routing
 api.add_resource(CreateSession, "/sessions/create")  # POST
+api.add_resource(CloseSessions, "/sessions/close")  # POST
 api.add_resource(StartSession, "/sessions/<string:session_id>/start")  # POST
 api.add_resource(PauseSession, "/sessions/<string:session_id>/pause")  # POST
 api.add_resource(CloseSession, "/sessions/<string:session_id>/close")  # POST
 api.add_resource(SubmitWebRtcStats, "/sessions/<string:session_id>/stats")  # POST
 
 api.add_resource(GetSession, "/sessions/<string:session_id>")  # GET
+api.add_resource(GetSessionHistory, "/sessions/<string:session_id>/history")  # GET
 api.add_resource(GetSessions, "/sessions")  # GET
 api.add_resource(GetConsumerSessions, "/consumers/<string:consumer_id>/sessions")  # GET
 api.add_resource(GetProducerSessions, "/producers/<string:producer_id>/sessions")  # GET
 api.add_resource(GetUserSessions, "/users/<string:user_id>/sessions")  # GET
+api.add_resource(GetUserRtts, "/users/<string:user_id>/rtts")  # GET
+api.add_resource(GetUserDcs, "/users/<string:user_id>/dcs")  # GET
+api.add_resource(GetUserHistory, "/users/<string:user_id>/history")  # GET
+
+# session status change feeds (server-sent events)
+api.add_resource(GetSessionEvents, "/sessions/<string:session_id>/events")  # GET
+api.add_resource(GetUserEvents, "/users/<string:user_id>/events")  # GET
+api.add_resource(GetConsumerEvents, "/consumers/<string:consumer_id>/events")  # GET
+
+api.add_resource(GetSessionCacheStats, "/caches/sessions")  # GET
+api.add_resource(GetDcRankingCacheStats, "/caches/dcs")  # GET
+api.add_resource(GetAppSvcClientStats, "/clients/appsvc")  # GET
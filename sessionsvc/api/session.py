@@ -1,45 +1,78 @@
+import typing as t
+from urllib.parse import urlencode
+
 from flask import (
     Response,
     request,
+    stream_with_context,
 )
 from flask_restful import Resource
 
+from sessionsvc.biz.audit import (
+    get_session_history,
+    get_user_history,
+)
+from sessionsvc.biz.dcs import dc_ranker
 from sessionsvc.biz.dto import (
+    CloseSessionsRequestDTO,
+    CloseSessionsResponseDTO,
     CreateSessionRequestDTO,
     CreateSessionResponseDTO,
+    GetHistoryRequestDTO,
+    GetHistoryResponseDTO,
     GetSessionResponseDTO,
+    GetSessionsPageResponseDTO,
+    GetSessionsRequestDTO,
     GetSessionsResponseDTO,
+    GetUserDcsResponseDTO,
+    GetUserRttsResponseDTO,
+    SessionDC,
     StartSessionRequestDTO,
     SubmitWebRtcStatsRequestDTO,
 )
+from sessionsvc.biz.errors import SessionNotFoundException
+from sessionsvc.biz.feed import session_feed
+from sessionsvc.biz.serialization import (
+    dumps,
+    get_schema,
+)
 from sessionsvc.biz.session import (
     close_session,
+    close_sessions,
     create_session,
     get_consumer_sessions,
     get_producer_sessions,
     get_session,
     get_sessions,
     get_user_sessions,
+    iter_sessions,
     pause_session,
+    session_cache,
     start_session,
 )
-from sessionsvc.biz.stats import submit_webrtc_stats
+from sessionsvc.biz.stats import (
+    enqueue_webrtc_stats,
+    get_user_rtts,
+    is_buffered,
+    submit_webrtc_stats,
+)
+from sessionsvc.services import appsvc
 
 
 class CreateSession(Resource):
     def post(self) -> Response:
         """Creates a new session."""
 
-        req: CreateSessionRequestDTO = CreateSessionRequestDTO.Schema().load(data=request.get_json())
+        req: CreateSessionRequestDTO = get_schema(CreateSessionRequestDTO).load(data=request.get_json())
         res = create_session(req)
-        return CreateSessionResponseDTO.Schema().dump(res), 200
+        return get_schema(CreateSessionResponseDTO).dump(res), 200
 
 
 class StartSession(Resource):
     def post(self, session_id: str) -> Response:
         """Starts a new or resumes a paused session."""
 
-        req: StartSessionRequestDTO = StartSessionRequestDTO.Schema().load(data=request.get_json())
+        req: StartSessionRequestDTO = get_schema(StartSessionRequestDTO).load(data=request.get_json())
         start_session(session_id, req)
         return "", 200
 
@@ -60,12 +93,21 @@ class CloseSession(Resource):
         return "", 200
 
 
+class CloseSessions(Resource):
+    def post(self) -> Response:
+        """Closes and removes sessions by ids, node or region, returns per-session outcomes."""
+
+        req: CloseSessionsRequestDTO = get_schema(CloseSessionsRequestDTO).load(data=request.get_json())
+        res = close_sessions(req)
+        return get_schema(CloseSessionsResponseDTO).dump(res), 200
+
+
 class GetSession(Resource):
     def get(self, session_id: str) -> Response:
         """Get existing session."""
 
         res: GetSessionResponseDTO = GetSessionResponseDTO(session=get_session(session_id))
-        return GetSessionResponseDTO.Schema().dump(res), 200
+        return res.to_dict(), 200
 
 
 class GetUserSessions(Resource):
@@ -73,7 +115,7 @@ class GetUserSessions(Resource):
         """Get user sessions."""
 
         res: GetSessionsResponseDTO = GetSessionsResponseDTO(sessions=get_user_sessions(int(user_id)))
-        return GetSessionsResponseDTO.Schema().dump(res), 200
+        return res.to_dict(), 200
 
 
 class GetConsumerSessions(Resource):
@@ -81,7 +123,7 @@ class GetConsumerSessions(Resource):
         """Get consumer sessions."""
 
         res: GetSessionsResponseDTO = GetSessionsResponseDTO(sessions=get_consumer_sessions(consumer_id))
-        return GetSessionsResponseDTO.Schema().dump(res), 200
+        return res.to_dict(), 200
 
 
 class GetProducerSessions(Resource):
@@ -89,21 +131,133 @@ class GetProducerSessions(Resource):
         """Get producer sessions."""
 
         res: GetSessionsResponseDTO = GetSessionsResponseDTO(sessions=get_producer_sessions(producer_id))
-        return GetSessionsResponseDTO.Schema().dump(res), 200
+        return res.to_dict(), 200
+
+
+class GetUserRtts(Resource):
+    def get(self, user_id: str) -> Response:
+        """Get user rtt aggregates per data center region."""
+
+        res: GetUserRttsResponseDTO = GetUserRttsResponseDTO(rtts=get_user_rtts(int(user_id)))
+        return get_schema(GetUserRttsResponseDTO).dump(res), 200
+
+
+class GetUserDcs(Resource):
+    def get(self, user_id: str) -> Response:
+        """Get data center regions ranked by the rtt the user is expected to get, best first."""
+
+        res: GetUserDcsResponseDTO = GetUserDcsResponseDTO(dcs=dc_ranker.get_user_ranking(int(user_id)))
+        return get_schema(GetUserDcsResponseDTO).dump(res), 200
+
+
+class GetSessionHistory(Resource):
+    def get(self, session_id: str) -> Response:
+        """Get session audit trail, newest first."""
+
+        req: GetHistoryRequestDTO = get_schema(GetHistoryRequestDTO).load(data=request.args.to_dict())
+        res: GetHistoryResponseDTO = get_session_history(session_id, req)
+        return get_schema(GetHistoryResponseDTO).dump(res), 200
+
+
+class GetUserHistory(Resource):
+    def get(self, user_id: str) -> Response:
+        """Get audit trail of all user sessions, newest first."""
+
+        req: GetHistoryRequestDTO = get_schema(GetHistoryRequestDTO).load(data=request.args.to_dict())
+        res: GetHistoryResponseDTO = get_user_history(int(user_id), req)
+        return get_schema(GetHistoryResponseDTO).dump(res), 200
 
 
 class SubmitWebRtcStats(Resource):
     def post(self, session_id: str) -> Response:
-        """Submit webrtc stats for a given session."""
+        """Submit webrtc stats for a given session.
 
-        req: SubmitWebRtcStatsRequestDTO = SubmitWebRtcStatsRequestDTO.Schema().load(data=request.get_json())
+        In a buffered ingestion mode stats are validated and queued for a batched write, 202 is returned.
+        """
+
+        req: SubmitWebRtcStatsRequestDTO = get_schema(SubmitWebRtcStatsRequestDTO).load(data=request.get_json())
+        if is_buffered():
+            enqueue_webrtc_stats(session_id, req)
+            return "", 202
         submit_webrtc_stats(session_id, req)
         return "", 200
 
 
 class GetSessions(Resource):
     def get(self) -> Response:
-        """Get all sessions."""
+        """Get sessions matching filters, page by page or streamed as NDJSON (`stream=true`)."""
+
+        req: GetSessionsRequestDTO = get_schema(GetSessionsRequestDTO).load(data=request.args.to_dict())
+        if req.stream:
+
+            def generate() -> t.Iterator[bytes]:
+                for session in iter_sessions(req):
+                    yield dumps(session.to_dict()) + b"\n"
+
+            return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+        res: GetSessionsPageResponseDTO = get_sessions(req)
+        if not res.next_cursor:
+            return res.to_dict(), 200
+        # a page is capped at GET_SESSIONS_MAX_LIMIT even without `limit`, the next page is linked for visibility
+        next_url = f"{request.base_url}?{urlencode(request.args.to_dict() | {'cursor': res.next_cursor})}"
+        return res.to_dict(), 200, {"Link": f'<{next_url}>; rel="next"'}
+
+
+def _event_stream(key: str, value: t.Any, load_snapshot: t.Callable[[], list[SessionDC]]) -> Response:
+    # subscribed before the snapshot is read, so no change in between is missed
+    sub = session_feed.subscribe(key, value)
+    try:
+        snapshot = dumps(GetSessionsResponseDTO(sessions=load_snapshot()).to_dict())
+    except Exception:
+        session_feed.unsubscribe(sub)
+        raise
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return Response(session_feed.stream(sub, snapshot), mimetype="text/event-stream", headers=headers)
+
+
+class GetSessionEvents(Resource):
+    def get(self, session_id: str) -> Response:
+        """Stream session status changes as server-sent events."""
+
+        def load_snapshot() -> list[SessionDC]:
+            try:
+                return [get_session(session_id)]
+            except SessionNotFoundException:
+                return []
+
+        return _event_stream("id", session_id, load_snapshot)
+
+
+class GetUserEvents(Resource):
+    def get(self, user_id: str) -> Response:
+        """Stream status changes of user sessions as server-sent events."""
+
+        return _event_stream("user_id", int(user_id), lambda: get_user_sessions(int(user_id)))
+
+
+class GetConsumerEvents(Resource):
+    def get(self, consumer_id: str) -> Response:
+        """Stream status changes of consumer sessions as server-sent events."""
+
+        return _event_stream("consumer_id", consumer_id, lambda: get_consumer_sessions(consumer_id))
+
+
+class GetSessionCacheStats(Resource):
+    def get(self) -> Response:
+        """Get session cache hit/miss counters."""
+
+        return session_cache.stats(), 200
+
+
+class GetDcRankingCacheStats(Resource):
+    def get(self) -> Response:
+        """Get data center ranking cache hit/miss counters."""
+
+        return dc_ranker.cache.stats(), 200
+
+
+class GetAppSvcClientStats(Resource):
+    def get(self) -> Response:
+        """Get appsvc client connection pool and per-operation latency counters."""
 
-        res: GetSessionsResponseDTO = GetSessionsResponseDTO(sessions=get_sessions())
-        return GetSessionsResponseDTO.Schema().dump(res), 200
+        return appsvc.stats(), 200
@@ -0,0 +1,156 @@
+import asyncio
+import io
+import sys
+import typing as t
+
+from flask import Flask
+from sqlalchemy.util import (
+    await_only,
+    greenlet_spawn,
+)
+
+from sessionsvc import create_app
+from sessionsvc.biz import (
+    aio,
+    audit,
+    stats,
+)
+from sessionsvc.biz.sqldb import sqldb
+from sessionsvc.services import appsvc
+
+Scope = dict[str, t.Any]
+Receive = t.Callable[[], t.Awaitable[dict[str, t.Any]]]
+Send = t.Callable[[dict[str, t.Any]], t.Awaitable[None]]
+
+
+class AsgiAdapter:
+    """Serves a Flask app over ASGI, every request in its own greenlet on the server's event loop.
+
+    Routes, DTOs, error handlers and business logic run unchanged, but their db (asyncpg through SQLAlchemy's greenlet
+    adaptation) and appsvc (httpx) calls wait on the event loop instead of blocking a thread, so one worker serves as
+    many concurrent requests as the db pool and the appsvc bulkheads allow. Code running on the loop must not block
+    it, see sessionsvc.biz.aio.
+    """
+
+    def __init__(self, app: Flask) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] == "websocket":
+            # no websocket routes: the handshake is rejected (the server answers 403)
+            await receive()
+            await send({"type": "websocket.close", "code": 1000})
+            return
+        if scope["type"] != "http":
+            # as the spec asks of unknown scope types
+            raise ValueError(f"unsupported ASGI scope type: {scope['type']}")
+        aio.set_loop(asyncio.get_running_loop())
+        body = bytearray()
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        disconnected = asyncio.Event()
+        watcher = asyncio.ensure_future(self._watch_disconnect(receive, disconnected))
+        try:
+            await greenlet_spawn(self._handle, self._environ(scope, bytes(body)), send, disconnected)
+        finally:
+            watcher.cancel()
+
+    @staticmethod
+    async def _watch_disconnect(receive: Receive, disconnected: asyncio.Event) -> None:
+        while (await receive())["type"] != "http.disconnect":
+            pass
+        disconnected.set()
+
+    @staticmethod
+    def _environ(scope: Scope, body: bytes) -> dict[str, t.Any]:
+        server = scope.get("server") or ("localhost", 80)
+        environ = {
+            "REQUEST_METHOD": scope["method"],
+            "SCRIPT_NAME": scope.get("root_path", "").encode().decode("latin-1"),
+            "PATH_INFO": scope["path"].encode().decode("latin-1"),
+            "QUERY_STRING": scope["query_string"].decode("latin-1"),
+            "SERVER_NAME": server[0],
+            "SERVER_PORT": str(server[1]),
+            "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+            "REMOTE_ADDR": scope["client"][0] if scope.get("client") else "",
+            "CONTENT_LENGTH": str(len(body)),
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": scope.get("scheme", "http"),
+            "wsgi.input": io.BytesIO(body),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": True,
+            "wsgi.run_once": False,
+        }
+        for name, value in scope["headers"]:
+            key = name.decode("latin-1").upper().replace("-", "_")
+            if key == "CONTENT_LENGTH":
+                continue
+            if key != "CONTENT_TYPE":
+                key = f"HTTP_{key}"
+            value = value.decode("latin-1")
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+        return environ
+
+    def _handle(self, environ: dict[str, t.Any], send: Send, disconnected: asyncio.Event) -> None:
+        """Runs the WSGI app in a greenlet, streaming its response out through `send` until the client disconnects
+        (e.g. from a session feed)."""
+        start: dict[str, t.Any] = {}
+
+        def start_response(status: str, headers: list[tuple[str, str]], exc_info: t.Any = None) -> None:
+            if exc_info and start.get("sent"):
+                # error after the response has started (PEP 3333): too late to replace it, abort
+                raise exc_info[1].with_traceback(exc_info[2])
+            start["status"] = int(status.split(" ", 1)[0])
+            start["headers"] = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers]
+
+        def send_start() -> None:
+            await_only(send({"type": "http.response.start", "status": start["status"], "headers": start["headers"]}))
+            start["sent"] = True
+
+        result = self.app(environ, start_response)
+        try:
+            for chunk in result:
+                if disconnected.is_set():
+                    return
+                if not start.get("sent"):
+                    send_start()
+                if chunk:
+                    await_only(send({"type": "http.response.body", "body": chunk, "more_body": True}))
+            if not start.get("sent"):
+                send_start()
+            await_only(send({"type": "http.response.body", "body": b"", "more_body": False}))
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+
+    async def _lifespan(self, receive: Receive, send: Send) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                aio.set_loop(asyncio.get_running_loop())
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                # writers flush through the loop (see aio.call), they are closed from another thread while it runs
+                await asyncio.to_thread(audit.audit_writer.close)
+                await asyncio.to_thread(stats.stats_writer.close)
+                await greenlet_spawn(self._close_connections)
+                aio.set_loop(None)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def _close_connections(self) -> None:
+        appsvc.http_client.close_async_session()
+        with self.app.app_context():
+            sqldb.engine.dispose()
+
+
+def create_asgi_app() -> AsgiAdapter:
+    """ASGI entry point, e.g. `gunicorn -k uvicorn.workers.UvicornWorker 'sessionsvc.asgi:create_asgi_app()'`."""
+    return AsgiAdapter(create_app(asgi=True))
@@ -0,0 +1,107 @@
+import asyncio
+import contextvars
+import threading
+import time
+import typing as t
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy.util import (
+    await_only,
+    greenlet_spawn,
+)
+from sqlalchemy.util.concurrency import in_greenlet
+
+from sessionsvc.biz.tracing import with_current_context
+
+T = t.TypeVar("T")
+R = t.TypeVar("R")
+
+# event loop of the ASGI server (see sessionsvc.asgi), None when serving WSGI
+_loop: t.Optional[asyncio.AbstractEventLoop] = None
+
+
+def set_loop(loop: t.Optional[asyncio.AbstractEventLoop]) -> None:
+    global _loop  # pylint: disable=global-statement
+    _loop = loop
+
+
+def in_event_loop() -> bool:
+    """Whether the caller runs in a greenlet on the ASGI server event loop, where blocking-style db and appsvc calls
+    wait on the loop instead of blocking the thread (and must not block it otherwise)."""
+    return _loop is not None and in_greenlet()
+
+
+def wait(awaitable: t.Awaitable[T]) -> T:
+    """Waits for an awaitable from sync code running on the event loop (see in_event_loop)."""
+    return await_only(awaitable)
+
+
+def sleep(seconds: float) -> None:
+    if in_event_loop():
+        await_only(asyncio.sleep(seconds))
+    else:
+        time.sleep(seconds)
+
+
+class Event:
+    """threading.Event whose waits don't block the event loop when created on it (see in_event_loop).
+
+    Must be waited on in the serving mode it was created in, may be set from any thread.
+    """
+
+    def __init__(self) -> None:
+        self._loop = _loop if in_event_loop() else None
+        self._event: t.Union[asyncio.Event, threading.Event] = asyncio.Event() if self._loop else threading.Event()
+
+    def set(self) -> None:
+        if self._loop:
+            self._loop.call_soon_threadsafe(self._event.set)
+        else:
+            self._event.set()
+
+    def clear(self) -> None:
+        self._event.clear()
+
+    def wait(self, timeout: float) -> bool:
+        """Returns whether the event was set within `timeout` seconds."""
+        if not self._loop:
+            return self._event.wait(timeout)
+        try:
+            await_only(asyncio.wait_for(self._event.wait(), timeout))
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+def call(func: t.Callable[..., R], *args: t.Any) -> R:
+    """Calls func from a background thread so that its db and appsvc calls work in both serving modes: directly when
+    serving WSGI, in a greenlet on the ASGI server event loop (blocking the calling thread until it's done) otherwise.
+    The caller's context variables (e.g. trace context) are kept.
+    """
+    if _loop is None or not _loop.is_running() or in_greenlet():
+        return func(*args)
+    ctx = contextvars.copy_context()
+    return asyncio.run_coroutine_threadsafe(greenlet_spawn(ctx.run, func, *args), _loop).result()
+
+
+def map_concurrently(
+    func: t.Callable[[T], R], items: t.Sequence[T], max_concurrency: int, name: str = "map"
+) -> list[R]:
+    """Calls func for every item with at most `max_concurrency` calls running at once, returns results in order.
+
+    Calls run in threads when serving WSGI and in greenlets on the event loop in ASGI mode; they are traced as part
+    of the caller's trace.
+    """
+    if not items:
+        return []
+    func = with_current_context(func)
+    if not in_event_loop():
+        with ThreadPoolExecutor(max_workers=min(max_concurrency, len(items)), thread_name_prefix=name) as pool:
+            return list(pool.map(func, items))
+    slots = asyncio.Semaphore(max_concurrency)
+
+    async def run(item: T) -> R:
+        async with slots:
+            return await greenlet_spawn(func, item)
+
+    return await_only(asyncio.gather(*(run(item) for item in items)))
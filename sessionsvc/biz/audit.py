@@ -0,0 +1,107 @@
+import datetime
+import logging
+import typing as t
+from dataclasses import (
+    asdict,
+    dataclass,
+)
+
+from flask import Flask
+from sqlalchemy import insert
+
+from sessionsvc.biz.batch_writer import BatchWriter
+from sessionsvc.biz.dto import (
+    GetHistoryRequestDTO,
+    GetHistoryResponseDTO,
+    SessionDC,
+    SessionLogDC,
+    SessionOp,
+    SessionStatus,
+)
+from sessionsvc.biz.errors import WriterQueueFullException
+from sessionsvc.biz.models import SessionsLogDAO
+from sessionsvc.biz.serialization import get_schema
+from sessionsvc.biz.sqldb import sqldb
+
+log = logging.getLogger("sessionsvc")
+
+
+@dataclass
+class SessionLogEntry:
+    """Audit trail row, container and ws_conn are kept in their sessions.sessions column format."""
+
+    app_release_uuid: str
+    container: t.Optional[dict]
+    created: datetime.datetime
+    op: str
+    session_id: str
+    status: str
+    user_id: int
+    ws_conn: dict
+
+
+def _write_entries(entries: list[SessionLogEntry]) -> None:
+    sqldb.session.execute(insert(SessionsLogDAO), [asdict(e) for e in entries])
+    sqldb.session.commit()
+
+
+audit_writer = BatchWriter("audit", flush=_write_entries)
+# a full audit queue must not fail (or slow down) session operations which already took place
+audit_writer.put_timeout = 0.0
+
+
+def init_app(app: Flask) -> None:
+    audit_writer.init_app(app)
+
+
+def record(op: SessionOp, row: t.Any, status: t.Optional[SessionStatus] = None) -> None:
+    """Queues an audit trail entry; `row` is a sessions.sessions row as of right after `op` (`status` overrides its
+    status, e.g. for deleted rows).
+
+    Entries are written by a background batch writer, off the request path. The event time is taken here.
+    """
+    entry = SessionLogEntry(
+        app_release_uuid=row.app_release_uuid,
+        container=row.container,
+        created=datetime.datetime.utcnow(),
+        op=op.value,
+        session_id=row.id,
+        status=status.value if status else row.status,
+        user_id=row.user_id,
+        ws_conn=row.ws_conn,
+    )
+    try:
+        audit_writer.put(entry)
+    except WriterQueueFullException:
+        log.warning("audit entry dropped (queue is full): %s %s", op.value, row.id)
+
+
+def _from_dao(dao: SessionsLogDAO) -> SessionLogDC:
+    return SessionLogDC(
+        id=dao.id,
+        app_release_uuid=dao.app_release_uuid,
+        container=get_schema(SessionDC.Container).load(dao.container) if dao.container else None,
+        created=dao.created.replace(tzinfo=datetime.timezone.utc),
+        op=SessionOp(dao.op) if dao.op else None,
+        session_id=dao.session_id,
+        status=SessionStatus(dao.status),
+        user_id=dao.user_id,
+        ws_conn=get_schema(SessionDC.WsConn).load(dao.ws_conn),
+    )
+
+
+def _get_history(criteria: t.Any, req: GetHistoryRequestDTO) -> GetHistoryResponseDTO:
+    query = sqldb.session.query(SessionsLogDAO).filter(criteria)
+    if req.cursor is not None:
+        query = query.filter(SessionsLogDAO.id < req.cursor)
+    rows = query.order_by(SessionsLogDAO.id.desc()).limit(req.limit + 1).all()
+    next_cursor = rows[req.limit - 1].id if len(rows) > req.limit else None
+    return GetHistoryResponseDTO(entries=[_from_dao(r) for r in rows[: req.limit]], next_cursor=next_cursor)
+
+
+def get_session_history(session_id: str, req: GetHistoryRequestDTO) -> GetHistoryResponseDTO:
+    return _get_history(SessionsLogDAO.session_id == session_id, req)
+
+
+def get_user_history(user_id: int, req: GetHistoryRequestDTO) -> GetHistoryResponseDTO:
+    return _get_history(SessionsLogDAO.user_id == user_id, req)
@@ -0,0 +1,155 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+import typing as t
+
+from flask import Flask
+
+from sessionsvc.biz import aio
+from sessionsvc.biz.errors import WriterQueueFullException
+
+log = logging.getLogger("sessionsvc")
+
+T = t.TypeVar("T")
+
+
+class BatchWriter(t.Generic[T]):
+    """Bounded per-worker queue drained by a background flusher thread.
+
+    Items are accumulated and handed over to `flush` either when `batch_size` items are collected or when
+    `flush_interval` seconds passed since the first item of the batch was taken, whichever comes first.
+    `flush` is always called inside the app context (on the event loop in ASGI mode, see aio.call), so it may use
+    `sqldb.session` freely.
+
+    A failed flush is retried up to `retries` times with an exponential backoff starting at `retry_delay` seconds,
+    while the queue fills up behind it (backpressure), so `flush` must be a single transaction. After the last attempt
+    the batch is dropped.
+
+    Queue and thread are (re)created lazily in the process that submits the first item, so the writer is safe to
+    configure before gunicorn forks its workers.
+
+    Config (all optional, `<name>` is upper-cased writer name, e.g. FLASK_STATS_WRITER_QUEUE_SIZE):
+        <name>_WRITER_QUEUE_SIZE: max number of buffered items per worker
+        <name>_WRITER_BATCH_SIZE: max number of items per flush
+        <name>_WRITER_FLUSH_INTERVAL: max seconds an item may wait in the buffer
+        <name>_WRITER_PUT_TIMEOUT: seconds to block a producer on a full queue before rejecting the item
+        <name>_WRITER_RETRIES, <name>_WRITER_RETRY_DELAY: attempts after a failed flush and seconds before the first
+    """
+
+    def __init__(self, name: str, flush: t.Callable[[list[T]], None]) -> None:
+        self.name = name
+        self.queue_size = 10000
+        self.batch_size = 500
+        self.flush_interval = 1.0
+        self.put_timeout = 0.1
+        self.retries = 3
+        self.retry_delay = 0.5
+        self._flush = flush
+        self._app: t.Optional[Flask] = None
+        self._queue: t.Optional[queue.Queue] = None
+        self._thread: t.Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._pid: t.Optional[int] = None
+        self._lock = threading.Lock()
+        self.flushed = 0
+        self.dropped = 0
+        self.rejected = 0
+
+    def init_app(self, app: Flask) -> None:
+        prefix = f"{self.name.upper()}_WRITER_"
+        self.queue_size = int(app.config.get(f"{prefix}QUEUE_SIZE", self.queue_size))
+        self.batch_size = int(app.config.get(f"{prefix}BATCH_SIZE", self.batch_size))
+        self.flush_interval = float(app.config.get(f"{prefix}FLUSH_INTERVAL", self.flush_interval))
+        self.put_timeout = float(app.config.get(f"{prefix}PUT_TIMEOUT", self.put_timeout))
+        self.retries = int(app.config.get(f"{prefix}RETRIES", self.retries))
+        self.retry_delay = float(app.config.get(f"{prefix}RETRY_DELAY", self.retry_delay))
+        self._app = app
+        atexit.register(self.close)
+
+    @property
+    def initialized(self) -> bool:
+        return self._app is not None
+
+    def put(self, item: T) -> None:
+        """Buffers an item, blocking up to `put_timeout` seconds when the queue is full (backpressure)."""
+        q = self._ensure_started()
+        # waiting on the event loop would also hold up the flusher, which writes through it
+        timeout = 0 if aio.in_event_loop() else self.put_timeout
+        try:
+            q.put(item, timeout=timeout)
+        except queue.Full as e:
+            self.rejected += 1
+            raise WriterQueueFullException(f"{self.name} writer queue is full") from e
+
+    def qsize(self) -> int:
+        return self._queue.qsize() if self._queue and self._pid == os.getpid() else 0
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Stops the flusher and writes out everything still buffered."""
+        if not self._thread or self._pid != os.getpid():
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _ensure_started(self) -> queue.Queue:
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    if not self._app:
+                        raise RuntimeError(f"{self.name} writer is not initialized, call init_app first")
+                    self._queue = queue.Queue(maxsize=self.queue_size)
+                    self._stop = threading.Event()
+                    self._thread = threading.Thread(target=self._run, name=f"{self.name}-writer", daemon=True)
+                    self._thread.start()
+                    self._pid = pid
+        return self._queue
+
+    def _take_batch(self) -> list[T]:
+        batch: list[T] = []
+        deadline = None
+        while len(batch) < self.batch_size:
+            timeout = self.flush_interval if deadline is None else deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                if batch or self._stop.is_set():
+                    break
+                continue
+            if deadline is None:
+                deadline = time.monotonic() + self.flush_interval
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._take_batch()
+            if batch:
+                self._write_with_retries(batch)
+            elif self._stop.is_set():
+                return
+
+    def _write_with_retries(self, batch: list[T]) -> None:
+        for attempt in range(self.retries + 1):
+            if aio.call(self._write, batch):
+                self.flushed += len(batch)
+                return
+            if attempt < self.retries:
+                # sleeps in the flusher thread, not on the event loop; cut short on close
+                self._stop.wait(self.retry_delay * 2**attempt)
+        self.dropped += len(batch)
+        log.error("%s writer dropped %d items after %d attempts", self.name, len(batch), self.retries + 1)
+
+    def _write(self, batch: list[T]) -> bool:
+        with self._app.app_context():
+            try:
+                self._flush(batch)
+                return True
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                log.exception("%s writer failed to flush %d items: %s", self.name, len(batch), e)
+                return False
@@ -0,0 +1,86 @@
+import threading
+import time
+import typing as t
+from collections import OrderedDict
+
+K = t.TypeVar("K")
+V = t.TypeVar("V")
+
+
+class TTLCache(t.Generic[K, V]):
+    """Thread-safe, size-bounded (LRU) in-process cache with a per-entry TTL.
+
+    Cached values are shared between threads, callers must treat them as read-only.
+
+    Every invalidation bumps `generation` and stamps the key invalidated with it; a reader should capture
+    `generation` before loading a value from the db and pass it to `set`, so a value loaded concurrently with an
+    invalidation of its key (or a `clear`) is never cached, while invalidations of other keys don't get in the way.
+    Stamps of the last `maxsize` invalidated keys are kept, a key whose stamp has been evicted is considered
+    invalidated by the last eviction.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 10.0) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._data: OrderedDict[K, tuple[float, V]] = OrderedDict()
+        self._invalidated: OrderedDict[K, int] = OrderedDict()
+        # values loaded before this generation are never cached (set by clear and stamp evictions)
+        self._stale_before = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0 and self.ttl > 0
+
+    def get(self, key: K) -> t.Optional[V]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: K, value: V, generation: int) -> None:
+        with self._lock:
+            if generation < self._invalidated.get(key, self._stale_before):
+                return
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key: K) -> None:
+        with self._lock:
+            self.generation += 1
+            self.invalidations += 1
+            self._data.pop(key, None)
+            self._invalidated[key] = self.generation
+            self._invalidated.move_to_end(key)
+            while len(self._invalidated) > max(self.maxsize, 1):
+                self._stale_before = self._invalidated.popitem(last=False)[1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self.generation += 1
+            self._data.clear()
+            self._invalidated.clear()
+            self._stale_before = self.generation
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+            }
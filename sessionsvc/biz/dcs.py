@@ -0,0 +1,176 @@
+import datetime
+import logging
+import threading
+import time
+import typing as t
+
+from flask import Flask
+from sqlalchemy import (
+    func,
+    select,
+)
+from sqlalchemy.dialects.postgresql import JSON
+
+from sessionsvc.biz import aio
+from sessionsvc.biz.cache import TTLCache
+from sessionsvc.biz.dto import (
+    DcRankDC,
+    DcRttSource,
+)
+from sessionsvc.biz.models import UsersDcsRttsDAO
+from sessionsvc.biz.sqldb import sqldb
+from sessionsvc.services.dto.appsvc import DcRegion
+
+log = logging.getLogger("sessionsvc")
+
+# approximate RTTs between regions (seconds): a user close to one region is about that much farther from the others
+INTER_REGION_RTT: dict[frozenset[DcRegion], float] = {
+    frozenset({DcRegion.EU_CENTRAL_1, DcRegion.US_EAST_1}): 0.09,
+    frozenset({DcRegion.EU_CENTRAL_1, DcRegion.US_WEST_1}): 0.15,
+    frozenset({DcRegion.US_EAST_1, DcRegion.US_WEST_1}): 0.065,
+}
+# of region pairs missing above (e.g. a new region), as far as the farthest known pair
+DEFAULT_INTER_REGION_RTT = max(INTER_REGION_RTT.values())
+# aggregates of retired regions are ignored
+_REGIONS = frozenset(region.value for region in DcRegion)
+
+
+class DcRanker:
+    """Orders data center regions by the RTT a user is expected to get, lowest first.
+
+    A measured region's RTT is the user's recent RTT EWMA (stats.users_dcs_rtts aggregates updated within `max_age`
+    seconds) shrunk towards the median RTT of all users to the region, which counts as `prior_weight` samples. Other
+    regions are estimated from the user's best measured region plus the distance between the regions (geo), or by the
+    population median for users without recent samples. Rankings are cached for `cache.ttl` seconds.
+    """
+
+    def __init__(self) -> None:
+        self.cache: TTLCache[int, list[DcRankDC]] = TTLCache(ttl=300.0)
+        self.max_age = 7 * 86400.0
+        self.prior_weight = 10.0
+        self.population_ttl = 600.0
+        self._app: t.Optional[Flask] = None
+        self._population: dict[DcRegion, float] = {}
+        self._population_expires = 0.0
+        self._population_loading = False
+        self._lock = threading.Lock()
+
+    def init_app(self, app: Flask) -> None:
+        """Configures the ranking.
+
+        FLASK_DC_RANKING_CACHE_SIZE, FLASK_DC_RANKING_CACHE_TTL: rankings cache size and ttl (0 disables the cache)
+        FLASK_DC_RANKING_MAX_AGE: seconds, older user rtt aggregates are ignored
+        FLASK_DC_RANKING_PRIOR_WEIGHT: number of samples the prior counts for
+        FLASK_DC_RANKING_POPULATION_TTL: seconds between reloads of the population medians
+        """
+        self.cache.maxsize = int(app.config.get("DC_RANKING_CACHE_SIZE", self.cache.maxsize))
+        self.cache.ttl = float(app.config.get("DC_RANKING_CACHE_TTL", self.cache.ttl))
+        self.max_age = float(app.config.get("DC_RANKING_MAX_AGE", self.max_age))
+        self.prior_weight = float(app.config.get("DC_RANKING_PRIOR_WEIGHT", self.prior_weight))
+        self.population_ttl = float(app.config.get("DC_RANKING_POPULATION_TTL", self.population_ttl))
+        self._app = app
+
+    def _cutoff(self) -> t.Any:
+        now = func.timezone("utc", func.now())  # pylint: disable=not-callable
+        return now - datetime.timedelta(seconds=self.max_age)
+
+    def user_rtts_column(self, user_id: int) -> t.Any:
+        """Scalar subquery of the user's recent rtt aggregates (a json list), to be selected along with other columns
+        (e.g. RETURNING of the session insert) instead of a separate round trip; see rank_user."""
+        rtts = func.json_agg(
+            func.json_build_object(
+                "region", UsersDcsRttsDAO.region, "samples", UsersDcsRttsDAO.samples, "ewma", UsersDcsRttsDAO.ewma
+            ),
+            type_=JSON,
+        )
+        stmt = select(rtts).where(UsersDcsRttsDAO.user_id == user_id, UsersDcsRttsDAO.updated > self._cutoff())
+        return stmt.scalar_subquery().label("user_rtts")
+
+    def cached(self, user_id: int) -> t.Optional[list[DcRankDC]]:
+        return self.cache.get(user_id) if self.cache.enabled else None
+
+    def rank_user(self, user_id: int, user_rtts: t.Optional[list[dict]], generation: int) -> list[DcRankDC]:
+        """Ranks and caches regions of the user from a user_rtts_column value; `generation` is the cache generation
+        captured before the value was selected."""
+        ranking = self.rank({r["region"]: (r["samples"], r["ewma"]) for r in user_rtts or ()}, self.population())
+        if self.cache.enabled:
+            self.cache.set(user_id, ranking, generation)
+        return ranking
+
+    def get_user_ranking(self, user_id: int) -> list[DcRankDC]:
+        ranking = self.cached(user_id)
+        if ranking is None:
+            generation = self.cache.generation
+            user_rtts = sqldb.session.execute(select(self.user_rtts_column(user_id))).scalar()
+            ranking = self.rank_user(user_id, user_rtts, generation)
+        return ranking
+
+    def rank(self, user: dict[str, tuple[int, float]], population: dict[DcRegion, float]) -> list[DcRankDC]:
+        """Ranks all regions from the user's (samples, rtt ewma) per region and the population medians; regions without
+        an estimate come last."""
+        estimates: dict[DcRegion, DcRankDC] = {}
+        for region, (samples, rtt) in user.items():
+            if region not in _REGIONS:
+                continue
+            region = DcRegion(region)
+            if region in population:
+                rtt = (samples * rtt + self.prior_weight * population[region]) / (samples + self.prior_weight)
+            estimates[region] = DcRankDC(region=region, rtt=rtt, samples=samples, source=DcRttSource.USER)
+        measured = list(estimates.values())
+        for region in DcRegion:
+            if region in estimates:
+                continue
+            if measured:
+                rtt = min(
+                    m.rtt + INTER_REGION_RTT.get(frozenset({m.region, region}), DEFAULT_INTER_REGION_RTT)
+                    for m in measured
+                )
+                estimates[region] = DcRankDC(region=region, rtt=rtt, samples=0, source=DcRttSource.GEO)
+            elif region in population:
+                estimates[region] = DcRankDC(
+                    region=region, rtt=population[region], samples=0, source=DcRttSource.POPULATION
+                )
+            else:
+                estimates[region] = DcRankDC(region=region, rtt=None, samples=0, source=DcRttSource.NONE)
+        order = list(DcRegion)
+        return sorted(estimates.values(), key=lambda r: (r.rtt is None, r.rtt or 0.0, order.index(r.region)))
+
+    def population(self) -> dict[DcRegion, float]:
+        """Median recent RTT per region over all users; never waits for the db: expired medians are reloaded in a
+        background thread (empty until the first load)."""
+        if self._population_expires < time.monotonic() and self._app:
+            with self._lock:
+                if not self._population_loading:
+                    self._population_loading = True
+                    threading.Thread(target=aio.call, args=(self._load_population,), daemon=True).start()
+        return self._population
+
+    def _load_population(self) -> None:
+        try:
+            with self._app.app_context():
+                median = func.percentile_cont(0.5).within_group(UsersDcsRttsDAO.ewma)  # pylint: disable=not-callable
+                rows = sqldb.session.execute(
+                    select(UsersDcsRttsDAO.region, median)
+                    .where(UsersDcsRttsDAO.updated > self._cutoff())
+                    .group_by(UsersDcsRttsDAO.region)
+                ).all()
+            self._population = {DcRegion(r[0]): r[1] for r in rows if r[0] in _REGIONS}
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            log.exception("dc ranking population medians failed to load: %s", e)
+        finally:
+            self._population_expires = time.monotonic() + self.population_ttl
+            self._population_loading = False
+
+
+def preferred_dcs(ranking: list[DcRankDC]) -> list[str]:
+    """Regions to pass to appsvc as preferred_dcs, empty if none has an estimate (appsvc picks the region then)."""
+    if all(r.rtt is None for r in ranking):
+        return []
+    return [r.region.value for r in ranking]
+
+
+dc_ranker = DcRanker()
+
+
+def init_app(app: Flask) -> None:
+    dc_ranker.init_app(app)
@@ -3,7 +3,10 @@ import typing as t
 from dataclasses import field
 from enum import StrEnum
 
-from marshmallow import Schema
+from marshmallow import (
+    Schema,
+    validate,
+)
 from marshmallow_dataclass import dataclass
 
 from sessionsvc.biz.models import SessionDAO
@@ -15,6 +18,34 @@ class SessionStatus(StrEnum):
     ACTIVE = "active"
     PAUSED = "paused"
     CLOSED = "closed"
+    FAILED = "failed"  # app launch failed (async creation mode), session must be closed
+
+
+class SessionOp(StrEnum):
+    """Session operations recorded in the audit trail."""
+
+    CREATE = "create"
+    START = "start"
+    PAUSE = "pause"
+    RESUME = "resume"
+    CLOSE = "close"
+    FAIL = "fail"  # app launch failed
+    REVERT = "revert"  # appsvc call of a pause/close failed, previous status is restored
+    EXPIRE = "expire"  # session outlived its status ttl and was closed by the reaper
+
+
+class SessionsOrderBy(StrEnum):
+    ID = "id"
+    UPDATED = "updated"
+
+
+class DcRttSource(StrEnum):
+    """What a data center rank estimate is based on (see sessionsvc.biz.dcs)."""
+
+    USER = "user"  # user's recent rtt samples to the region (shrunk towards the prior)
+    GEO = "geo"  # user's rtt to another region plus the distance between the regions
+    POPULATION = "population"  # median rtt of all users to the region
+    NONE = "none"  # no estimate
 
 
 @dataclass
@@ -47,16 +78,57 @@ class SessionDC:
 
     @classmethod
     def from_sessiondao(cls, sessiondao: SessionDAO) -> t.Self:
+        # hot path (every listed row): builds nested objects directly instead of going through their schemas,
+        # container and ws_conn columns are only ever written from SessionDC.Container / SessionDC.WsConn dumps
+        container = sessiondao.container
+        ws_conn = sessiondao.ws_conn
         return cls(
             id=sessiondao.id,
             app_release_uuid=sessiondao.app_release_uuid,
-            container=SessionDC.Container.Schema().load(data=sessiondao.container) if sessiondao.container else None,
+            container=(
+                SessionDC.Container(
+                    id=container["id"],
+                    node_id=container["node_id"],
+                    region=DcRegion[container["region"]],
+                )
+                if container
+                else None
+            ),
             status=SessionStatus(sessiondao.status),
             user_id=sessiondao.user_id,
-            ws_conn=SessionDC.WsConn.Schema().load(data=sessiondao.ws_conn),
+            ws_conn=SessionDC.WsConn(
+                id=ws_conn["id"],
+                consumer_id=ws_conn["consumer_id"],
+                producer_id=ws_conn.get("producer_id"),
+            ),
             updated=sessiondao.updated.replace(tzinfo=datetime.timezone.utc),
         )
 
+    def to_dict(self) -> dict:
+        """Same as SessionDC.Schema().dump(self), without the per-field marshmallow overhead."""
+        container = self.container
+        return {
+            "app_release_uuid": self.app_release_uuid,
+            "container": (
+                {
+                    "id": container.id,
+                    "node_id": container.node_id,
+                    "region": container.region.name,
+                }
+                if container
+                else None
+            ),
+            "updated": self.updated.isoformat(),
+            "user_id": self.user_id,
+            "ws_conn": {
+                "id": self.ws_conn.id,
+                "consumer_id": self.ws_conn.consumer_id,
+                "producer_id": self.ws_conn.producer_id,
+            },
+            "id": self.id,
+            "status": self.status.value if self.status else None,
+        }
+
 
 @dataclass
 class CreateSessionRequestDTO:
@@ -98,14 +170,141 @@ class GetSessionResponseDTO:
     session: SessionDC
     Schema: t.ClassVar[t.Type[Schema]] = Schema  # pylint: disable=invalid-name
 
+    def to_dict(self) -> dict:
+        return {"session": self.session.to_dict()}
+
 
 @dataclass
 class GetSessionsResponseDTO:
     sessions: list[SessionDC]
     Schema: t.ClassVar[t.Type[Schema]] = Schema  # pylint: disable=invalid-name
 
+    def to_dict(self) -> dict:
+        return {"sessions": [s.to_dict() for s in self.sessions]}
+
+
+@dataclass
+class GetSessionsRequestDTO:
+    """Filters and keyset pagination parameters of the GET /sessions."""
+
+    app_release_uuid: t.Optional[str] = None
+    cursor: t.Optional[str] = None  # opaque, taken from the `next_cursor` of the previous page
+    limit: t.Optional[int] = field(default=None, metadata={"validate": validate.Range(min=1, max=1000)})
+    node_id: t.Optional[str] = None
+    order_by: SessionsOrderBy = field(default=SessionsOrderBy.ID, metadata={"by_value": True})
+    region: t.Optional[DcRegion] = None
+    status: t.Optional[SessionStatus] = field(default=None, metadata={"by_value": True})
+    stream: bool = False  # stream all matching sessions as NDJSON instead of returning a page
+    user_id: t.Optional[int] = None
+    Schema: t.ClassVar[t.Type[Schema]] = Schema  # pylint: disable=invalid-name
+
+
+@dataclass
+class GetSessionsPageResponseDTO:
+    sessions: list[SessionDC]
+    next_cursor: t.Optional[str] = None  # None if there are no more sessions
+    Schema: t.ClassVar[t.Type[Schema]] = Schema  # pylint: disable=invalid-name
+
+    def to_dict(self) -> dict:
+        return {"sessions": [s.to_dict() for s in self.sessions], "next_cursor": self.next_cursor}
+
+
+@dataclass
+class CloseSessionsRequestDTO:
+    """Sessions to close in bulk (e.g. to drain a node or a region), exactly one of the criteria must be set."""
+
+    ids: t.Optional[list[str]] = field(default=None, metadata={"validate": validate.Length(min=1, max=1000)})
+    node_id: t.Optional[str] = None
+    region: t.Optional[DcRegion] = None
+    Schema: t.ClassVar[t.Type[Schema]] = Schema  # pylint: disable=invalid-name
+
+
+class CloseOutcome(StrEnum):
+    CLOSED = "closed"
+    NOT_FOUND = "not_found"  # missing or being closed already
+    FAILED = "failed"  # stop_app failed, session status is restored
+
+
+@dataclass
+class CloseSessionsResponseDTO:
+    @dataclass
+    class Result:
+        id: str
+        outcome: CloseOutcome = field(metadata={"by_value": True})
+        error: t.Optional[str] = None
+        Schema: t.ClassVar[t.Type[Schema]] = Schema  # pylint: disable=invalid-name
+
+    results: list[Result]
+    Schema: t.ClassVar[t.Type[Schema]] = Schema  # pylint: disable=invalid-name
+
+
+@dataclass
+class SessionLogDC:
+    """Session audit trail entry: session state right after `op` was applied."""
+
+    id: int
+    app_release_uuid: str
+    container: t.Optional[SessionDC.Container]
+    created: datetime.datetime
+    op: t.Optional[SessionOp] = field(metadata={"by_value": True})
+    session_id: str
+    status: SessionStatus = field(metadata={"by_value": True})
+    user_id: int
+    ws_conn: SessionDC.WsConn
+    Schema: t.ClassVar[t.Type[Schema]] = Schema  # pylint: disable=invalid-name
+
+
+@dataclass
+class GetHistoryRequestDTO:
+    """Keyset pagination parameters of the session/user history, entries are returned newest first."""
+
+    cursor: t.Optional[int] = None  # taken from the `next_cursor` of the previous page
+    limit: int = field(default=100, metadata={"validate": validate.Range(min=1, max=1000)})
+    Schema: t.ClassVar[t.Type[Schema]] = Schema  # pylint: disable=invalid-name
+
+
+@dataclass
+class GetHistoryResponseDTO:
+    entries: list[SessionLogDC]
+    next_cursor: t.Optional[int] = None  # None if there are no more entries
+    Schema: t.ClassVar[t.Type[Schema]] = Schema  # pylint: disable=invalid-name
+
 
 @dataclass
 class SubmitWebRtcStatsRequestDTO:
     stats: str  # json-encoded stats structure
     Schema: t.ClassVar[t.Type[Schema]] = Schema  # pylint: disable=invalid-name
+
+
+@dataclass
+class UserDcRttDC:
+    """RTT aggregate (seconds) of a user for a given data center region."""
+
+    region: str
+    samples: int
+    ewma: float
+    min: float
+    p50: t.Optional[float]
+    p95: t.Optional[float]
+
+
+@dataclass
+class GetUserRttsResponseDTO:
+    rtts: list[UserDcRttDC]
+    Schema: t.ClassVar[t.Type[Schema]] = Schema  # pylint: disable=invalid-name
+
+
+@dataclass
+class DcRankDC:
+    """Data center region with the RTT (seconds) a user is expected to get from it."""
+
+    region: DcRegion = field(metadata={"by_value": True})
+    rtt: t.Optional[float]
+    samples: int  # user's recent samples to the region
+    source: DcRttSource = field(metadata={"by_value": True})
+
+
+@dataclass
+class GetUserDcsResponseDTO:
+    dcs: list[DcRankDC]  # best first
+    Schema: t.ClassVar[t.Type[Schema]] = Schema  # pylint: disable=invalid-name
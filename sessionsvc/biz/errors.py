@@ -10,10 +10,16 @@ from marshmallow import ValidationError
 from werkzeug.exceptions import HTTPException
 
 ERROR_APPSVC = (1409, "appsvc exception")
+ERROR_APPSVC_BUSY = (1503, "too many concurrent appsvc calls, try again later")
+ERROR_APPSVC_UNAVAILABLE = (1502, "appsvc is unavailable, try again later")
 ERROR_SESSION_NOT_FOUND = (1404, "session not found")
 ERROR_SESSION_OP = (1409, "session operational error")
+ERROR_SESSION_ILLEGAL_TRANSITION = (1412, "illegal session status transition")
 ERROR_SESSIONS_QUOTA_LIMIT_EXCEEDED = (1429, "sessions quota limit exceeded for user")
 ERROR_UNKNOWN = (1500, "unknown error")
+ERROR_WRITER_QUEUE_FULL = (1504, "writer queue is full, try again later")
+ERROR_EXECUTOR_QUEUE_FULL = (1505, "too many pending operations, try again later")
+ERROR_FEED_BUSY = (1506, "too many session feed subscribers, try again later")
 
 log = logging.getLogger("sessionsvc")
 
@@ -39,6 +45,13 @@ class SessionNotFoundException(BizException):
         super().__init__(code, message)
 
 
+class SessionIllegalTransitionException(BizException):
+    def __init__(self, message: t.Optional[t.Any] = None) -> None:
+        code = ERROR_SESSION_ILLEGAL_TRANSITION[0]
+        message = message or ERROR_SESSION_ILLEGAL_TRANSITION[1]
+        super().__init__(code, message)
+
+
 class SessionsQuotaLimitExceededException(BizException):
     def __init__(self) -> None:
         code = ERROR_SESSIONS_QUOTA_LIMIT_EXCEEDED[0]
@@ -53,6 +66,41 @@ class AppSvcException(BizException):
         super().__init__(code, message)
 
 
+class AppSvcUnavailableException(BizException):
+    def __init__(self, message: t.Optional[t.Any] = None) -> None:
+        code = ERROR_APPSVC_UNAVAILABLE[0]
+        message = message or ERROR_APPSVC_UNAVAILABLE[1]
+        super().__init__(code, message)
+
+
+class AppSvcBusyException(BizException):
+    def __init__(self, message: t.Optional[t.Any] = None) -> None:
+        code = ERROR_APPSVC_BUSY[0]
+        message = message or ERROR_APPSVC_BUSY[1]
+        super().__init__(code, message)
+
+
+class WriterQueueFullException(BizException):
+    def __init__(self, message: t.Optional[t.Any] = None) -> None:
+        code = ERROR_WRITER_QUEUE_FULL[0]
+        message = message or ERROR_WRITER_QUEUE_FULL[1]
+        super().__init__(code, message)
+
+
+class ExecutorQueueFullException(BizException):
+    def __init__(self, message: t.Optional[t.Any] = None) -> None:
+        code = ERROR_EXECUTOR_QUEUE_FULL[0]
+        message = message or ERROR_EXECUTOR_QUEUE_FULL[1]
+        super().__init__(code, message)
+
+
+class FeedBusyException(BizException):
+    def __init__(self, message: t.Optional[t.Any] = None) -> None:
+        code = ERROR_FEED_BUSY[0]
+        message = message or ERROR_FEED_BUSY[1]
+        super().__init__(code, message)
+
+
 def init_app(app: Flask) -> None:
     """Inits error handlers.
 
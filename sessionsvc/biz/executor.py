@@ -0,0 +1,89 @@
+import logging
+import os
+import threading
+import typing as t
+from concurrent.futures import (
+    Future,
+    ThreadPoolExecutor,
+)
+
+from flask import (
+    Flask,
+    current_app,
+)
+
+from sessionsvc.biz import aio
+from sessionsvc.biz.errors import ExecutorQueueFullException
+from sessionsvc.biz.tracing import with_current_context
+
+log = logging.getLogger("sessionsvc")
+
+
+class BoundedExecutor:
+    """Per-worker thread pool with a bounded backlog, running submitted jobs inside the app context (on the event loop
+    in ASGI mode, see aio.call).
+
+    At most `max_workers` jobs run concurrently and at most `max_pending` more may wait for a free thread; beyond that
+    `submit` fails fast with ExecutorQueueFullException instead of queueing without limit.
+
+    Config (`<name>` is upper-cased executor name, e.g. FLASK_LAUNCH_EXECUTOR_MAX_WORKERS):
+        <name>_EXECUTOR_MAX_WORKERS: max number of concurrently running jobs
+        <name>_EXECUTOR_MAX_PENDING: max number of jobs waiting for a free thread
+    """
+
+    def __init__(self, name: str, max_workers: int = 4, max_pending: int = 100) -> None:
+        self.name = name
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor: t.Optional[ThreadPoolExecutor] = None
+        self._slots: t.Optional[threading.BoundedSemaphore] = None
+        self._pid: t.Optional[int] = None
+        self._lock = threading.Lock()
+        self._app_initialized = False
+        self.rejected = 0
+
+    def init_app(self, app: Flask) -> None:
+        prefix = f"{self.name.upper()}_EXECUTOR_"
+        self.max_workers = int(app.config.get(f"{prefix}MAX_WORKERS", self.max_workers))
+        self.max_pending = int(app.config.get(f"{prefix}MAX_PENDING", self.max_pending))
+        self._app_initialized = True
+
+    @property
+    def initialized(self) -> bool:
+        return self._app_initialized
+
+    def submit(self, func: t.Callable[..., t.Any], *args: t.Any, **kwargs: t.Any) -> Future:
+        executor, slots = self._ensure_started()
+        # the slot is released by the job when it's done, in another thread
+        if not slots.acquire(blocking=False):  # pylint: disable=consider-using-with
+            self.rejected += 1
+            raise ExecutorQueueFullException(f"{self.name} executor queue is full")
+        app = current_app._get_current_object()  # pylint: disable=protected-access
+
+        def run_in_app_context() -> t.Any:
+            with app.app_context():
+                return func(*args, **kwargs)
+
+        # jobs are traced as part of the submitting request
+        @with_current_context
+        def run() -> t.Any:
+            try:
+                return aio.call(run_in_app_context)
+            finally:
+                slots.release()
+
+        try:
+            return executor.submit(run)
+        except BaseException:
+            slots.release()
+            raise
+
+    def _ensure_started(self) -> tuple[ThreadPoolExecutor, threading.BoundedSemaphore]:
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+                    self._slots = threading.BoundedSemaphore(self.max_workers + self.max_pending)
+                    self._pid = pid
+        return self._executor, self._slots
@@ -0,0 +1,163 @@
+import collections
+import json
+import threading
+import time
+import typing as t
+
+from flask import Flask
+
+from sessionsvc.biz import (
+    aio,
+    metrics,
+)
+from sessionsvc.biz.errors import FeedBusyException
+from sessionsvc.biz.pgnotify import (
+    CHANNEL_SESSIONS,
+    pg_listener,
+)
+
+# fields of the sessions.sessions_notify payload a feed can be keyed by
+FEED_KEYS = ("id", "user_id", "consumer_id")
+
+# event telling subscribers that events may have been missed, current state must be re-read
+RESYNC_EVENT = {"op": "resync"}
+
+
+class Subscription:
+    """Session status changes matching `key` == `value`, queued by the listener thread.
+
+    When more than `max_pending` events are pending (or the listener reconnected), they are replaced by a
+    RESYNC_EVENT.
+    """
+
+    def __init__(self, key: str, value: str, max_pending: int) -> None:
+        self.key = key
+        self.value = value
+        self.max_pending = max_pending
+        self._events: collections.deque[dict[str, t.Any]] = collections.deque()
+        self._ready = aio.Event()
+
+    def push(self, event: dict[str, t.Any]) -> None:
+        if event is RESYNC_EVENT or len(self._events) >= self.max_pending:
+            self._events.clear()
+            event = RESYNC_EVENT
+        self._events.append(event)
+        self._ready.set()
+
+    def next(self, timeout: float) -> list[dict[str, t.Any]]:
+        """Waits up to `timeout` seconds for events, returns all pending ones (empty list on timeout)."""
+        deadline = time.monotonic() + timeout
+        while not self._events:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self._ready.wait(remaining):
+                return []
+            self._ready.clear()
+        events = []
+        while self._events:
+            events.append(self._events.popleft())
+        return events
+
+
+class EventStream:
+    """Server-sent events response body of a subscription: `snapshot` of the current sessions first, then `status`
+    events (sessions.sessions_notify payloads, `closed` once deleted; changes already in the snapshot may be repeated)
+    and `resync` events, with heartbeat comments in between. Ends after `max_duration` seconds, clients reconnect; the
+    subscription is dropped on close.
+    """
+
+    def __init__(self, feed: "SessionFeed", sub: Subscription, snapshot: bytes) -> None:
+        self._feed = feed
+        self._sub = sub
+        self._snapshot = snapshot
+
+    @staticmethod
+    def _event(name: str, data: bytes) -> bytes:
+        return b"event: " + name.encode() + b"\ndata: " + data + b"\n\n"
+
+    def __iter__(self) -> t.Iterator[bytes]:
+        # rendered without the app context, which is gone once the response is being streamed
+        yield self._event("snapshot", self._snapshot)
+        deadline = time.monotonic() + self._feed.max_duration
+        while (remaining := deadline - time.monotonic()) > 0:
+            events = self._sub.next(min(self._feed.heartbeat_interval, remaining))
+            if not events:
+                yield b": heartbeat\n\n"
+            for event in events:
+                yield self._event("resync" if event is RESYNC_EVENT else "status", json.dumps(event).encode())
+
+    def close(self) -> None:
+        self._feed.unsubscribe(self._sub)
+
+
+class SessionFeed:
+    """Fans session status changes out of the worker's LISTEN connection (see pgnotify) to subscribed clients.
+
+    Subscriptions wait on the event loop in ASGI mode; in WSGI mode every one holds a worker thread.
+    """
+
+    def __init__(self) -> None:
+        self._subscriptions: dict[tuple[str, str], set[Subscription]] = {}
+        self._lock = threading.Lock()
+        self.max_subscribers = 0
+        self.max_pending = 100
+        self.heartbeat_interval = 15.0
+        self.max_duration = 300.0
+
+    def init_app(self, app: Flask) -> None:
+        """Configures the feed.
+
+        FLASK_SESSION_FEED_MAX_SUBSCRIBERS: max open streams per worker (1000 in ASGI mode, 2 in WSGI mode)
+        FLASK_SESSION_FEED_HEARTBEAT_INTERVAL, FLASK_SESSION_FEED_MAX_DURATION: seconds
+        """
+        default_max_subscribers = 1000 if app.config.get("ASGI") else 2
+        self.max_subscribers = int(app.config.get("SESSION_FEED_MAX_SUBSCRIBERS", default_max_subscribers))
+        self.heartbeat_interval = float(app.config.get("SESSION_FEED_HEARTBEAT_INTERVAL", self.heartbeat_interval))
+        self.max_duration = float(app.config.get("SESSION_FEED_MAX_DURATION", self.max_duration))
+        pg_listener.subscribe(CHANNEL_SESSIONS, self._on_notify)
+
+    @property
+    def subscribers(self) -> int:
+        return sum(len(subs) for subs in self._subscriptions.values())
+
+    def subscribe(self, key: str, value: t.Any) -> Subscription:
+        """Subscribes to changes of sessions with `key` (one of FEED_KEYS) equal to `value`."""
+        pg_listener.ensure_started()
+        sub = Subscription(key, str(value), self.max_pending)
+        with self._lock:
+            if self.subscribers >= self.max_subscribers:
+                raise FeedBusyException()
+            self._subscriptions.setdefault((sub.key, sub.value), set()).add(sub)
+        metrics.feed_subscribers.inc()
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        with self._lock:
+            subs = self._subscriptions.get((sub.key, sub.value), set())
+            if sub not in subs:
+                return
+            subs.discard(sub)
+            if not subs:
+                del self._subscriptions[(sub.key, sub.value)]
+        metrics.feed_subscribers.dec()
+
+    def stream(self, sub: Subscription, snapshot: bytes) -> EventStream:
+        return EventStream(self, sub, snapshot)
+
+    def _on_notify(self, payload: t.Optional[str]) -> None:
+        with self._lock:
+            if payload is None:
+                targets = [sub for subs in self._subscriptions.values() for sub in subs]
+                event = RESYNC_EVENT
+            else:
+                event = json.loads(payload)
+                keys = [(key, str(event[key])) for key in FEED_KEYS if event.get(key) is not None]
+                targets = [sub for key in keys for sub in self._subscriptions.get(key, ())]
+        for sub in targets:
+            sub.push(event)
+
+
+session_feed = SessionFeed()
+
+
+def init_app(app: Flask) -> None:
+    session_feed.init_app(app)
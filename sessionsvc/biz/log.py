@@ -1,31 +1,230 @@
+import atexit
+import copy
+import dataclasses
+import datetime
+import json
 import logging
+import os
+import queue
+import random
+import reprlib
+import threading
+import typing as t
+from logging.handlers import (
+    QueueHandler,
+    QueueListener,
+)
 
 from flask import Flask
+from opentelemetry import trace
 
+TEXT_FORMAT = "[%(asctime)s] [%(name)s] [%(levelname)s] %(message)s"
 
-def init_app(app: Flask) -> None:
-    # log setup
-    # TODO: use app.config["DEBUG"] flag for log_level
-    log_level = logging.DEBUG
 
-    handler = logging.StreamHandler()
-    handler.setFormatter(logging.Formatter("[%(asctime)s] [%(name)s] [%(levelname)s] %(message)s"))
+def log_fields(**fields: t.Any) -> dict[str, t.Any]:
+    """Structured fields of a log record: `log.debug("msg", extra=log_fields(session_id=..., result=...))`.
+
+    Values are only turned into strings (capped at FLASK_LOG_FIELD_MAX_LENGTH) if the record is actually emitted,
+    callables are called at that point too.
+    """
+    return {"fields": fields}
+
+
+class DebugSampler(logging.Filter):
+    """Passes a `rate` fraction of DEBUG records, records of higher levels always pass."""
+
+    def __init__(self, rate: float) -> None:
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        # sampling decision, not security sensitive
+        return record.levelno > logging.DEBUG or random.random() < self.rate  # nosec B311
+
+
+class _CappedRepr(reprlib.Repr):
+    """reprlib.Repr which renders dataclasses field by field and stops rendering once `maxlength` characters were
+    produced (the default dataclass repr renders everything, including nested lists, before it can be cut).
+
+    Keeps per-call state, use a new instance for every value.
+    """
+
+    _containers = (list, tuple, dict, set, frozenset)
+
+    def __init__(self, maxlength: int) -> None:
+        super().__init__()
+        self.maxstring = self.maxother = self.maxlength = maxlength
+        self._remaining = maxlength
+
+    def repr1(self, x: t.Any, level: int) -> str:
+        if self._remaining <= 0:
+            return "..."
+        if not dataclasses.is_dataclass(x) or isinstance(x, type):
+            text = super().repr1(x, level)
+            if not isinstance(x, self._containers):
+                self._remaining -= len(text)
+            return text
+        if level <= 0:
+            return f"{type(x).__name__}(...)"
+        rendered = []
+        for field in dataclasses.fields(x):
+            if self._remaining <= 0:
+                rendered.append("...")
+                break
+            rendered.append(f"{field.name}={self.repr1(getattr(x, field.name), level - 1)}")
+        return f"{type(x).__name__}({', '.join(rendered)})"
+
+
+class _Listener(QueueListener):
+    def enqueue_sentinel(self) -> None:
+        # waits for room in a full queue instead of failing
+        self.queue.put(self._sentinel)
+
+
+class AsyncHandler(QueueHandler):
+    """Hands records over to a per-process listener thread which formats and writes them with `target`.
+
+    The request thread only renders the message and the capped fields (plus the current trace and span ids), so a
+    slow stream never blocks it; records are dropped and counted when the queue is full.
+    """
 
-    app.logger.handlers.clear()
-    app.logger.addHandler(handler)
-    app.logger.setLevel(log_level)
+    def __init__(self, target: logging.Handler, queue_size: int = 10000, field_max_length: int = 200) -> None:
+        super().__init__(queue.Queue(queue_size))
+        self.target = target
+        self.field_max_length = field_max_length
+        self._exc_formatter = logging.Formatter()
+        self._listener: t.Optional[_Listener] = None
+        self._pid: t.Optional[int] = None
+        self._lock = threading.Lock()
+        self.dropped = 0
 
-    app_log = logging.getLogger("sessionsvc")
-    app_log.handlers.clear()
-    app_log.addHandler(handler)
-    app_log.setLevel(log_level)
-    app_log.propagate = False
+    def ensure_started(self) -> None:
+        """Starts the listener thread in the current process (no-op if already running)."""
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid != pid:
+                # a queue inherited from the parent process may be left locked by its listener thread
+                self.queue = queue.Queue(self.queue.maxsize)
+                self._listener = _Listener(self.queue, self.target, respect_handler_level=True)
+                self._listener.start()
+                self._pid = pid
 
-    root_log = logging.getLogger()
-    root_log.handlers.clear()
-    root_log.addHandler(handler)
-    root_log.setLevel(log_level)
-    root_log.propagate = False
+    def stop(self) -> None:
+        """Writes out the queued records and stops the listener thread."""
+        with self._lock:
+            if self._listener is not None and self._pid == os.getpid():
+                self._listener.stop()
+            self._listener = None
+            self._pid = None
+
+    def _cap(self, value: t.Any) -> t.Any:
+        if callable(value):
+            value = value()
+        if value is None or isinstance(value, (bool, int, float)):
+            return value
+        text = value if isinstance(value, str) else _CappedRepr(self.field_max_length).repr(value)
+        if len(text) > self.field_max_length:
+            return text[: self.field_max_length] + "..."
+        return text
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # args and tracebacks may reference objects which the request thread keeps using
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = self._exc_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        fields = {k: self._cap(v) for k, v in getattr(record, "fields", {}).items()}
+        span_context = trace.get_current_span().get_span_context()
+        if span_context.is_valid:
+            fields["trace_id"] = format(span_context.trace_id, "032x")
+            fields["span_id"] = format(span_context.span_id, "016x")
+        record.fields = fields
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        self.ensure_started()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """One json object per record: ts, level, logger, msg and the record's structured fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in getattr(record, "fields", {}).items():
+            entry.setdefault(key, value)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """TEXT_FORMAT followed by the record's structured fields as `key=value` pairs."""
+
+    def __init__(self) -> None:
+        super().__init__(TEXT_FORMAT)
+
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        text = super().formatMessage(record)
+        fields = getattr(record, "fields", None)
+        if not fields:
+            return text
+        return text + " " + " ".join(f"{k}={v}" for k, v in fields.items())
+
+
+def init_app(app: Flask) -> None:
+    """Sets up the sessionsvc, flask and root loggers to write through an AsyncHandler.
+
+    Config:
+        FLASK_LOG_LEVEL: level name, DEBUG if FLASK_DEBUG is set, INFO otherwise
+        FLASK_LOG_FORMAT: json (default) or text
+        FLASK_LOG_QUEUE_SIZE: max records waiting to be written, extra records are dropped
+        FLASK_LOG_DEBUG_SAMPLE_RATE: fraction of DEBUG records written (1.0 writes all of them)
+        FLASK_LOG_FIELD_MAX_LENGTH: structured field values are cut at this length
+    """
+    log_level = str(app.config.get("LOG_LEVEL", "DEBUG" if app.debug else "INFO")).upper()
+
+    stream_handler = logging.StreamHandler()
+    if app.config.get("LOG_FORMAT", "json") == "text":
+        stream_handler.setFormatter(TextFormatter())
+    else:
+        stream_handler.setFormatter(JsonFormatter())
+    handler = AsyncHandler(
+        stream_handler,
+        queue_size=int(app.config.get("LOG_QUEUE_SIZE", 10000)),
+        field_max_length=int(app.config.get("LOG_FIELD_MAX_LENGTH", 200)),
+    )
+    sample_rate = float(app.config.get("LOG_DEBUG_SAMPLE_RATE", 1.0))
+    if sample_rate < 1:
+        handler.addFilter(DebugSampler(sample_rate))
+
+    # app.logger is the sessionsvc logger
+    for logger in dict.fromkeys((app.logger, logging.getLogger("sessionsvc"), logging.getLogger())):
+        for previous in logger.handlers:
+            if isinstance(previous, AsyncHandler):
+                previous.stop()
+        logger.handlers.clear()
+        logger.addHandler(handler)
+        logger.setLevel(log_level)
+        logger.propagate = False
 
     # talkative modules:
-    logging.getLogger("urllib3").setLevel(logging.INFO)
+    logging.getLogger("urllib3").setLevel(max(logging.getLogger().level, logging.INFO))
+    logging.getLogger("httpx").setLevel(max(logging.getLogger().level, logging.WARNING))
+
+    # pending records are written out on interpreter exit
+    atexit.register(handler.stop)
@@ -0,0 +1,212 @@
+import os
+import time
+import typing as t
+
+from flask import (
+    Flask,
+    Response,
+    g,
+    request,
+)
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy import (
+    Engine,
+    event,
+    func,
+)
+from sqlalchemy.pool import (
+    AsyncAdaptedQueuePool,
+    QueuePool,
+)
+
+from sessionsvc.biz.models import SessionDAO
+from sessionsvc.biz.sqldb import sqldb
+
+# gunicorn workers write their samples into files of this directory, /metrics aggregates them (see
+# runtime/conf/gunicorn.config.py); metrics are per process when it's not set
+MULTIPROC_DIR_ENV = "PROMETHEUS_MULTIPROC_DIR"
+
+# latencies of the service requests and its db and appsvc calls, seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+http_request_duration = Histogram(
+    "sessionsvc_http_request_duration_seconds",
+    "HTTP request latency by route.",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+http_requests_in_flight = Gauge(
+    "sessionsvc_http_requests_in_flight",
+    "HTTP requests being served by route, summed over live workers.",
+    ["method", "route"],
+    multiprocess_mode="livesum",
+)
+db_pool_checkout_duration = Histogram(
+    "sessionsvc_db_pool_checkout_duration_seconds",
+    "Time spent waiting for a db connection from the pool (including connecting).",
+    buckets=LATENCY_BUCKETS,
+)
+db_pool_checked_out = Gauge(
+    "sessionsvc_db_pool_checked_out",
+    "Db connections in use, per worker.",
+    multiprocess_mode="liveall",
+)
+db_pool_size = Gauge(
+    "sessionsvc_db_pool_size",
+    "Db connection pool size (without overflow), per worker.",
+    multiprocess_mode="liveall",
+)
+db_statement_duration = Histogram(
+    "sessionsvc_db_statement_duration_seconds",
+    "Db statement latency by statement type.",
+    ["operation"],
+    buckets=LATENCY_BUCKETS,
+)
+appsvc_request_duration = Histogram(
+    "sessionsvc_appsvc_request_duration_seconds",
+    "appsvc call latency by operation.",
+    ["op"],
+    buckets=LATENCY_BUCKETS,
+)
+appsvc_errors = Counter(
+    "sessionsvc_appsvc_errors",
+    "Failed appsvc calls by operation and reason (busy, unavailable, http, exception).",
+    ["op", "reason"],
+)
+stats_samples = Counter(
+    "sessionsvc_stats_samples",
+    "Webrtc stats samples by ingestion result (accepted, rejected, written).",
+    ["result"],
+)
+feed_subscribers = Gauge(
+    "sessionsvc_feed_subscribers",
+    "Open session feed streams, summed over live workers.",
+    multiprocess_mode="livesum",
+)
+
+# statement types reported by db_statement_duration, anything else is reported as `other`
+DB_OPERATIONS = frozenset({"SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "BEGIN", "COMMIT", "ROLLBACK"})
+
+
+class _TimedPoolMixin:
+    """Reports pool usage and how long connection checkouts take (waiting on an exhausted pool)."""
+
+    def _do_get(self) -> t.Any:
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            db_pool_checkout_duration.observe(time.perf_counter() - start)
+            db_pool_size.set(self.size())
+            db_pool_checked_out.set(self.checkedout())
+
+    def _do_return_conn(self, record: t.Any) -> None:
+        super()._do_return_conn(record)
+        db_pool_checked_out.set(self.checkedout())
+
+
+class TimedQueuePool(_TimedPoolMixin, QueuePool):
+    """QueuePool of the psycopg2 engine (WSGI mode)."""
+
+
+class TimedAsyncAdaptedQueuePool(_TimedPoolMixin, AsyncAdaptedQueuePool):
+    """TimedQueuePool of the asyncpg engine (ASGI mode): checkouts wait on the event loop."""
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn: t.Any, *args: t.Any) -> None:  # pylint: disable=unused-argument
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(
+    conn: t.Any, cursor: t.Any, statement: str, *args: t.Any  # pylint: disable=unused-argument
+) -> None:
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    words = statement[:16].split(None, 1)
+    operation = words[0].upper() if words else ""
+    db_statement_duration.labels(operation if operation in DB_OPERATIONS else "other").observe(elapsed)
+
+
+@event.listens_for(Engine, "handle_error")
+def _on_error(context: t.Any) -> None:
+    if context.connection is not None and context.connection.info.get("query_start"):
+        context.connection.info["query_start"].pop()
+
+
+class SessionsCollector:
+    """Session counts by status and region, queried from the db on scrape (same for every worker)."""
+
+    @staticmethod
+    def _family() -> GaugeMetricFamily:
+        return GaugeMetricFamily("sessionsvc_sessions", "Sessions by status and region.", labels=["status", "region"])
+
+    def describe(self) -> t.Iterable[GaugeMetricFamily]:
+        return [self._family()]
+
+    def collect(self) -> t.Iterable[GaugeMetricFamily]:
+        metric = self._family()
+        region = SessionDAO.container["region"].astext
+        total = func.count()  # pylint: disable=not-callable
+        counts = sqldb.session.query(SessionDAO.status, region, total).group_by(SessionDAO.status, region)
+        for status, region_name, count in counts.all():
+            metric.add_metric([status, region_name or ""], count)
+        sqldb.session.rollback()
+        yield metric
+
+
+sessions_collector = SessionsCollector()
+REGISTRY.register(sessions_collector)
+
+
+def _route() -> str:
+    return request.url_rule.rule if request.url_rule else "unmatched"
+
+
+def _registry() -> CollectorRegistry:
+    if MULTIPROC_DIR_ENV not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    registry.register(sessions_collector)
+    return registry
+
+
+def init_app(app: Flask) -> None:
+    """Serves prometheus metrics at /metrics.
+
+    Must be called before sqldb.init_app: connection pool metrics require the Timed*QueuePool pool classes.
+    """
+    poolclass = TimedAsyncAdaptedQueuePool if app.config.get("ASGI") else TimedQueuePool
+    app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", {}).setdefault("poolclass", poolclass)
+
+    @app.before_request
+    def start_request_timer() -> None:
+        g.metrics_start = time.perf_counter()
+        http_requests_in_flight.labels(request.method, _route()).inc()
+
+    @app.after_request
+    def observe_request(response: Response) -> Response:
+        if "metrics_start" in g:
+            elapsed = time.perf_counter() - g.metrics_start
+            http_request_duration.labels(request.method, _route(), response.status_code).observe(elapsed)
+        return response
+
+    @app.teardown_request
+    def end_request(exc: t.Optional[BaseException]) -> None:  # pylint: disable=unused-argument
+        if "metrics_start" in g:
+            http_requests_in_flight.labels(request.method, _route()).dec()
+
+    @app.route("/metrics")
+    def metrics() -> Response:
+        return Response(generate_latest(_registry()), content_type=CONTENT_TYPE_LATEST)
@@ -1,22 +1,44 @@
+import functools
 import logging
+import time
 import typing as t
 
+from sessionsvc.biz.log import log_fields
+
 log = logging.getLogger("sessionsvc")
 
+F = t.TypeVar("F", bound=t.Callable[..., t.Any])
 
-@t.no_type_check
-def log_input_output(func):
-    def wrap(*args, **kwargs):
-        # Log the function name and arguments
-        log.debug("calling %s with args: %s, kwargs: %s", func.__name__, args, kwargs)
 
-        # Call the original function
-        result = func(*args, **kwargs)
+def log_call(func: F) -> F:
+    """Logs calls of func at debug level with their arguments, result (or exception) and duration.
 
-        # Log the return value
-        log.debug("%s returned: %s", func.__name__, repr(result))
+    Costs a level check only when debug logging is off; arguments and results are size-capped and only rendered for
+    records which are actually written (see sessionsvc.biz.log.AsyncHandler).
+    """
 
-        # Return the result
+    @functools.wraps(func)
+    def wrapper(*args: t.Any, **kwargs: t.Any) -> t.Any:
+        if not log.isEnabledFor(logging.DEBUG):
+            return func(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            duration_ms = round((time.perf_counter() - start) * 1000, 3)
+            log.debug(
+                "%s raised %s",
+                func.__name__,
+                type(e).__name__,
+                extra=log_fields(args=args, kwargs=kwargs, error=e, duration_ms=duration_ms),
+            )
+            raise
+        duration_ms = round((time.perf_counter() - start) * 1000, 3)
+        log.debug(
+            "%s returned",
+            func.__name__,
+            extra=log_fields(args=args, kwargs=kwargs, result=result, duration_ms=duration_ms),
+        )
         return result
 
-    return wrap
+    return t.cast(F, wrapper)
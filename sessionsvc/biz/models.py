@@ -1,11 +1,18 @@
 from sqlalchemy import (
+    REAL,
     TIMESTAMP,
     BigInteger,
     Column,
     FetchedValue,
+    Float,
+    Integer,
+    LargeBinary,
     String,
 )
-from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.dialects.postgresql import (
+    ARRAY,
+    JSONB,
+)
 
 from sessionsvc.biz.sqldb import sqldb
 
@@ -28,6 +35,8 @@ class SessionsLogDAO(sqldb.Model):
     id = Column(BigInteger, primary_key=True)
     app_release_uuid = Column(String, nullable=False)
     container = Column(JSONB)
+    created = Column(TIMESTAMP, nullable=False)
+    op = Column(String)
     session_id = Column(String, nullable=False)  # sessions.id
     status = Column(String, nullable=False)
     user_id = Column(BigInteger, nullable=False)
@@ -35,14 +44,46 @@ class SessionsLogDAO(sqldb.Model):
 
 
 class WebRTCStatsLogsDAO(sqldb.Model):
+    """Raw stats submissions, partitioned by day on `created` (see sessionsvc.biz.stats_maintenance)."""
+
     __tablename__ = "webrtc_stats_logs"
     __table_args__ = {"schema": "stats"}
-    id = Column(BigInteger, primary_key=True)
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
     app_release_uuid = Column(String, nullable=False)
+    created = Column(TIMESTAMP, primary_key=True, server_default=FetchedValue())
     region = Column(String, nullable=False)
     session_id = Column(String, nullable=False)  # sessions.id
-    stats = Column(JSONB)
+    stats = Column(JSONB)  # submissions stored before the typed columns, until converted
+    user_id = Column(BigInteger)
+    # see sessionsvc.biz.stats_storage
+    rtt = Column(REAL)
+    jitter = Column(REAL)
+    packets_lost = Column(Integer)
+    frames_decoded = Column(Integer)
+    frames_dropped = Column(Integer)
+    bytes_received = Column(BigInteger)
+    codec = Column(String)
+    stats_extra = Column(LargeBinary)
+
+
+class WebRTCStatsRollupDAO(sqldb.Model):
+    """Hourly aggregates of a session's stats submissions (see sessionsvc.biz.stats_maintenance)."""
+
+    __tablename__ = "webrtc_stats_rollups"
+    __table_args__ = {"schema": "stats"}
+    bucket = Column(TIMESTAMP, primary_key=True)
+    session_id = Column(String, primary_key=True)
+    app_release_uuid = Column(String, nullable=False)
+    region = Column(String, nullable=False)
     user_id = Column(BigInteger)
+    samples = Column(Integer, nullable=False)
+    rtt_avg = Column(Float)
+    rtt_p95 = Column(Float)
+    rtt_max = Column(Float)
+    jitter_avg = Column(Float)
+    jitter_max = Column(Float)
+    packets_lost = Column(BigInteger)
+    bitrate_avg = Column(Float)
 
 
 class UsersDcsDAO(sqldb.Model):
@@ -51,3 +92,18 @@ class UsersDcsDAO(sqldb.Model):
     id = Column(BigInteger, primary_key=True)
     dcs = Column(JSONB)
     user_id = Column(BigInteger)
+
+
+class UsersDcsRttsDAO(sqldb.Model):
+    """Streaming RTT aggregate per user and region (see sessionsvc.biz.rtt)."""
+
+    __tablename__ = "users_dcs_rtts"
+    __table_args__ = {"schema": "stats"}
+    id = Column(BigInteger, primary_key=True)
+    ewma = Column(Float, nullable=False)
+    hist = Column(ARRAY(Integer), nullable=False)
+    min_rtt = Column(Float, nullable=False)
+    region = Column(String, nullable=False)
+    samples = Column(BigInteger, nullable=False)
+    updated = Column(TIMESTAMP, server_default=FetchedValue())
+    user_id = Column(BigInteger, nullable=False)
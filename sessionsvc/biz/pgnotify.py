@@ -0,0 +1,107 @@
+import logging
+import os
+import select
+import threading
+import typing as t
+
+import psycopg2
+from flask import Flask
+from sqlalchemy import Engine
+from sqlalchemy.dialects.postgresql.psycopg2 import PGDialect_psycopg2
+
+from sessionsvc.biz.sqldb import sqldb
+
+log = logging.getLogger("sessionsvc")
+
+# emitted by the sessions.sessions_notify trigger (see sessionsvc/migrations), payload is a json-encoded row summary
+CHANNEL_SESSIONS = "sessions_sessions"
+
+RECONNECT_DELAY = 5.0
+
+
+class PgListener:
+    """One LISTEN connection per worker process, dispatching notifications to subscribed callbacks.
+
+    Callbacks are invoked from the listener thread. Whenever the connection is (re)established, subscribers are
+    called with a `None` payload: notifications may have been missed meanwhile and any derived state must be reset.
+    """
+
+    def __init__(self) -> None:
+        self._engine: t.Optional[Engine] = None
+        self._subscribers: dict[str, list[t.Callable[[t.Optional[str]], None]]] = {}
+        self._pid: t.Optional[int] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.connected = False
+
+    def init_app(self, app: Flask) -> None:
+        with app.app_context():
+            self._engine = sqldb.engine
+
+    def subscribe(self, channel: str, callback: t.Callable[[t.Optional[str]], None]) -> None:
+        self._subscribers.setdefault(channel, []).append(callback)
+
+    def ensure_started(self) -> None:
+        """Starts the listener thread in the current process (no-op if already running)."""
+        pid = os.getpid()
+        if self._pid == pid or not self._engine:
+            return
+        with self._lock:
+            if self._pid != pid:
+                self.connected = False
+                self._stop = threading.Event()
+                threading.Thread(target=self._run, name="pg-listener", daemon=True).start()
+                self._pid = pid
+
+    def close(self) -> None:
+        self._stop.set()
+
+    def _connect(self) -> t.Any:
+        # notifications are polled with psycopg2 whichever driver the engine uses (asyncpg in ASGI mode)
+        cargs, cparams = PGDialect_psycopg2().create_connect_args(self._engine.url)
+        conn = psycopg2.connect(*cargs, **cparams)
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            for channel in self._subscribers:
+                cur.execute(f'LISTEN "{channel}"')
+        return conn
+
+    def _dispatch(self, channel: str, payload: t.Optional[str]) -> None:
+        for callback in self._subscribers.get(channel, []):
+            try:
+                callback(payload)
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                log.exception("pg listener callback failed (channel: %s): %s", channel, e)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = self._connect()
+                for channel in self._subscribers:
+                    self._dispatch(channel, None)
+                self.connected = True
+                while not self._stop.is_set():
+                    if select.select([conn], [], [], RECONNECT_DELAY) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        self._dispatch(notify.channel, notify.payload)
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                log.warning("pg listener connection lost: %s", e)
+            finally:
+                self.connected = False
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception as e:  # pylint: disable=broad-exception-caught
+                        log.warning("pg listener connection close failed: %s", e)
+            self._stop.wait(RECONNECT_DELAY)
+
+
+pg_listener = PgListener()
+
+
+def init_app(app: Flask) -> None:
+    pg_listener.init_app(app)
@@ -0,0 +1,179 @@
+import datetime
+import json
+import logging
+import threading
+import time
+import typing as t
+
+import click
+from flask import Flask
+from sqlalchemy import (
+    delete,
+    func,
+    select,
+    text,
+    update,
+)
+from sqlalchemy.engine import Row
+
+from sessionsvc.biz import audit
+from sessionsvc.biz.dto import (
+    SessionOp,
+    SessionStatus,
+)
+from sessionsvc.biz.models import SessionDAO
+from sessionsvc.biz.session import (
+    session_cache,
+    stop_apps,
+)
+from sessionsvc.biz.sqldb import sqldb
+from sessionsvc.services import appsvc
+
+log = logging.getLogger("sessionsvc")
+
+# only one reaper pass runs at a time across all pods, the others skip it
+REAPER_LOCK_ID = 0x5E551076
+
+
+class SessionReaper:
+    """Closes sessions which stayed in a status longer than its ttl and stops their apps.
+
+    Expired sessions are claimed in batches (switched to CLOSED with FOR UPDATE SKIP LOCKED, so racing requests are
+    never blocked), their apps are stopped with at most `stop_concurrency` parallel appsvc calls and the rows are
+    deleted. Sessions whose app couldn't be stopped stay CLOSED and are retried once the CLOSED ttl expires.
+
+    Config (seconds, 0 disables reaping of the status):
+        FLASK_REAPER_<STATUS>_TTL: max age of a session in the status, counted from its last update
+        FLASK_REAPER_BATCH_SIZE: max number of sessions claimed at once
+        FLASK_REAPER_STOP_CONCURRENCY: max number of concurrent stop_app calls
+    """
+
+    def __init__(self) -> None:
+        self.ttls: dict[SessionStatus, float] = {
+            # run_app failed before the container was set, or the session was never started
+            SessionStatus.PENDING: 600,
+            # activity of started sessions isn't tracked in the row, they are closed by clients
+            SessionStatus.ACTIVE: 0,
+            SessionStatus.PAUSED: 24 * 3600,
+            SessionStatus.FAILED: 600,
+            # close_session or a previous pass failed to stop the app
+            SessionStatus.CLOSED: 300,
+        }
+        self.batch_size = 100
+        # stop calls above the appsvc bulkhead limit would be rejected
+        self.stop_concurrency = appsvc.MAX_CONCURRENCY["stop"]
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.skipped = 0
+        self.reclaimed: dict[str, int] = {s.value: 0 for s in SessionStatus}
+        self.stop_failed = 0
+        self.last_run_duration = 0.0
+
+    def init_app(self, app: Flask) -> None:
+        for status in SessionStatus:
+            self.ttls[status] = float(app.config.get(f"REAPER_{status.name}_TTL", self.ttls[status]))
+        self.batch_size = int(app.config.get("REAPER_BATCH_SIZE", self.batch_size))
+        self.stop_concurrency = int(app.config.get("REAPER_STOP_CONCURRENCY", self.stop_concurrency))
+
+    def run(self) -> t.Optional[dict[str, int]]:
+        """Reaps all expired sessions, returns the number of sessions reclaimed per status (None if another pass is
+        running elsewhere)."""
+        with sqldb.engine.connect() as lock_conn:
+            if not lock_conn.execute(text("SELECT pg_try_advisory_lock(:id)"), {"id": REAPER_LOCK_ID}).scalar():
+                self.skipped += 1
+                return None
+            try:
+                started = time.monotonic()
+                reclaimed = {}
+                for status, ttl in self.ttls.items():
+                    if ttl > 0:
+                        reclaimed[status.value] = self._reap(status, ttl)
+                with self._lock:
+                    self.runs += 1
+                    self.last_run_duration = time.monotonic() - started
+                    for status, count in reclaimed.items():
+                        self.reclaimed[status] += count
+                return reclaimed
+            finally:
+                lock_conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": REAPER_LOCK_ID})
+                lock_conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "runs": self.runs,
+                "skipped": self.skipped,
+                "reclaimed": dict(self.reclaimed),
+                "stop_failed": self.stop_failed,
+                "last_run_duration": self.last_run_duration,
+            }
+
+    def _reap(self, status: SessionStatus, ttl: float) -> int:
+        reclaimed = 0
+        while True:
+            claimed = self._claim(status, ttl)
+            stopped = self._stop_apps(claimed)
+            reclaimed += self._delete(stopped)
+            if len(claimed) < self.batch_size:
+                return reclaimed
+
+    def _claim(self, status: SessionStatus, ttl: float) -> list[Row]:
+        cutoff = func.timezone("utc", func.now()) - datetime.timedelta(seconds=ttl)  # pylint: disable=not-callable
+        expired = (
+            select(SessionDAO.id)
+            .where(SessionDAO.status == status.value, SessionDAO.updated < cutoff)
+            .order_by(SessionDAO.updated)
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        # claimed CLOSED rows get a fresh `updated` and are not picked again by this pass
+        stmt = (
+            update(SessionDAO)
+            .where(SessionDAO.id.in_(expired), SessionDAO.status == status.value)
+            .values(status=SessionStatus.CLOSED.value)
+            .returning(*SessionDAO.__table__.c)
+        )
+        rows = sqldb.session.connection().execute(stmt).all()
+        sqldb.session.commit()
+        for row in rows:
+            session_cache.invalidate(row.id)
+            audit.record(SessionOp.EXPIRE, row)
+        if rows:
+            log.info("reaper claimed %d expired %s sessions", len(rows), status.value)
+        return rows
+
+    def _stop_apps(self, rows: list[Row]) -> list[str]:
+        """Stops apps of the claimed sessions, returns ids of the sessions which may be deleted."""
+        errors = stop_apps(rows, self.stop_concurrency)
+        with self._lock:
+            self.stop_failed += len(errors)
+        return [r.id for r in rows if r.id not in errors]
+
+    def _delete(self, ids: list[str]) -> int:
+        if not ids:
+            return 0
+        stmt = delete(SessionDAO).where(SessionDAO.id.in_(ids), SessionDAO.status == SessionStatus.CLOSED.value)
+        deleted = sqldb.session.connection().execute(stmt).rowcount
+        sqldb.session.commit()
+        for session_id in ids:
+            session_cache.invalidate(session_id)
+        return deleted
+
+
+reaper = SessionReaper()
+
+
+def init_app(app: Flask) -> None:
+    reaper.init_app(app)
+
+    @app.cli.command("reap-sessions")
+    @click.option("--interval", default=0.0, help="Seconds between passes, runs a single pass if 0.")
+    def reap_sessions(interval: float) -> None:
+        """Close expired sessions and stop their apps."""
+        while True:
+            reclaimed = reaper.run()
+            click.echo(json.dumps({"reclaimed": reclaimed, "stats": reaper.stats()}))
+            if interval <= 0:
+                return
+            time.sleep(interval)
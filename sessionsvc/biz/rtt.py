@@ -0,0 +1,35 @@
+import bisect
+import typing as t
+
+# compact streaming RTT aggregate: count, EWMA, min and a fixed-size log-scale histogram for quantiles
+
+# histogram bucket upper bounds (seconds), geometric from 5ms to 5s (~25% relative error per bucket);
+# persisted histograms depend on these values, never change them without migrating stats.users_dcs_rtts.hist
+RTT_BUCKETS: tuple[float, ...] = tuple(round(0.005 * 1000 ** (i / 31), 6) for i in range(32))
+RTT_EWMA_ALPHA = 0.1
+
+
+def bucket_index(rtt: float) -> int:
+    """Returns 0-based histogram bucket for rtt (values above the last bound go into the last bucket)."""
+    return min(bisect.bisect_left(RTT_BUCKETS, rtt), len(RTT_BUCKETS) - 1)
+
+
+def empty_hist() -> list[int]:
+    return [0] * len(RTT_BUCKETS)
+
+
+def quantile(hist: list[int], q: float, min_rtt: t.Optional[float] = None) -> t.Optional[float]:
+    """Estimates q-quantile from the histogram, interpolating linearly inside the matching bucket."""
+    total = sum(hist)
+    if not total:
+        return None
+    rank = q * total
+    seen = 0
+    for i, cnt in enumerate(hist):
+        if cnt and seen + cnt >= rank:
+            lo = RTT_BUCKETS[i - 1] if i else 0.0
+            if min_rtt is not None:
+                lo = max(lo, min(min_rtt, RTT_BUCKETS[i]))
+            return lo + (RTT_BUCKETS[i] - lo) * (rank - seen) / cnt
+        seen += cnt
+    return RTT_BUCKETS[-1]
@@ -0,0 +1,80 @@
+import dataclasses
+import json
+import threading
+import types
+import typing as t
+
+import orjson
+from flask import (
+    Response,
+    current_app,
+    make_response,
+)
+from flask_restful.representations.json import output_json
+from marshmallow import Schema
+
+JSON_BACKEND_JSON = "json"
+JSON_BACKEND_ORJSON = "orjson"
+
+
+_schemas: dict[type, Schema] = {}
+_schemas_lock = threading.Lock()
+
+
+def get_schema(cls: type) -> Schema:
+    """Returns a cached schema instance of the marshmallow dataclass.
+
+    Building a schema is much more expensive than using it, and schema instances are safe to share between threads
+    as long as they are only used to load and dump.
+    The first build is serialized: marshmallow_dataclass' lazy `Schema` class attribute is not thread-safe and may
+    return the class name instead of a schema class to a concurrent caller.
+    """
+    schema = _schemas.get(cls)
+    if schema is None:
+        with _schemas_lock:
+            schema = _schemas.get(cls)
+            if schema is None:
+                schema = _schemas[cls] = cls.Schema()
+    return schema
+
+
+def _marshmallow_dataclasses(scope: t.Union[types.ModuleType, type], module: str) -> t.Iterator[type]:
+    for value in vars(scope).values():
+        if isinstance(value, type) and value.__module__ == module:
+            yield from _marshmallow_dataclasses(value, module)
+            if dataclasses.is_dataclass(value) and hasattr(value, "Schema"):
+                yield value
+
+
+def build_schemas(*modules: types.ModuleType) -> int:
+    """Builds the schemas of all marshmallow dataclasses defined in the modules (including nested ones) ahead of their
+    first use, returns their number."""
+    built = 0
+    for module in modules:
+        for cls in _marshmallow_dataclasses(module, module.__name__):
+            get_schema(cls)
+            built += 1
+    return built
+
+
+def _use_orjson() -> bool:
+    return current_app.config.get("JSON_BACKEND", JSON_BACKEND_JSON) == JSON_BACKEND_ORJSON
+
+
+def output_fast_json(data: t.Any, code: int, headers: t.Optional[dict] = None) -> Response:
+    """flask-restful json representation using orjson when FLASK_JSON_BACKEND is set to `orjson`.
+
+    orjson output is semantically equal but more compact (no whitespaces after separators) than the default one.
+    """
+    if not _use_orjson():
+        return output_json(data, code, headers)
+    resp = make_response(orjson.dumps(data, option=orjson.OPT_APPEND_NEWLINE), code)
+    resp.headers.extend(headers or {})
+    return resp
+
+
+def dumps(data: t.Any) -> bytes:
+    """Encodes data with the configured json backend."""
+    if _use_orjson():
+        return orjson.dumps(data)
+    return json.dumps(data).encode()
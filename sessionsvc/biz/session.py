@@ -1,124 +1,333 @@
+import base64
+import datetime
+import json
 import logging
 import typing as t
 import uuid
-from dataclasses import (
-    dataclass,
-    field,
-)
 
-from sqlalchemy.exc import IntegrityError
+from flask import (
+    Flask,
+    current_app,
+)
+from marshmallow import ValidationError
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+from sqlalchemy import (
+    delete,
+    func,
+    select,
+    tuple_,
+    update,
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Query
 
 import sessionsvc.services.dto.appsvc as dto_appsvc
+from sessionsvc.biz import (
+    aio,
+    audit,
+)
+from sessionsvc.biz.cache import TTLCache
+from sessionsvc.biz.dcs import (
+    dc_ranker,
+    preferred_dcs,
+)
 from sessionsvc.biz.dto import (
+    CloseOutcome,
+    CloseSessionsRequestDTO,
+    CloseSessionsResponseDTO,
     CreateSessionRequestDTO,
     CreateSessionResponseDTO,
+    GetSessionsPageResponseDTO,
+    GetSessionsRequestDTO,
     SessionDC,
+    SessionOp,
+    SessionsOrderBy,
     SessionStatus,
     StartSessionRequestDTO,
 )
 from sessionsvc.biz.errors import (
+    AppSvcBusyException,
+    AppSvcUnavailableException,
+    BizException,
+    ExecutorQueueFullException,
+    SessionIllegalTransitionException,
     SessionNotFoundException,
     SessionOpException,
     SessionsQuotaLimitExceededException,
 )
-from sessionsvc.biz.misc import log_input_output
+from sessionsvc.biz.executor import BoundedExecutor
+from sessionsvc.biz.misc import log_call
 from sessionsvc.biz.models import SessionDAO
+from sessionsvc.biz.pgnotify import (
+    CHANNEL_SESSIONS,
+    pg_listener,
+)
+from sessionsvc.biz.serialization import get_schema
 from sessionsvc.biz.sqldb import sqldb
+from sessionsvc.biz.tracing import traced
 from sessionsvc.services import appsvc
 
 log = logging.getLogger("sessionsvc")
 
 # TODO: handle throught the quotas service/table
+# enforced by the sessions.user_id unique key, see _create_session
 MAX_USER_SESSIONS = 1
 
+SESSION_CREATE_MODE_SYNC = "sync"
+SESSION_CREATE_MODE_ASYNC = "async"
+
+GET_SESSIONS_MAX_LIMIT = 1000
+GET_SESSIONS_STREAM_BATCH_SIZE = 500
+
+# runs appsvc.run_app for sessions created in the async creation mode
+launch_executor = BoundedExecutor("launch")
+
+# read-through cache for get_session, invalidated locally on writes and in other workers through NOTIFY
+session_cache: TTLCache[str, SessionDC] = TTLCache()
+
+# session state machine: statuses a session may be switched to the given status from.
+# CLOSED is transient: the row is deleted right after the app is stopped
+SESSION_TRANSITIONS: dict[SessionStatus, frozenset[SessionStatus]] = {
+    # resume (create_session of a paused app)
+    SessionStatus.PENDING: frozenset({SessionStatus.PAUSED}),
+    # start_session, may be repeated when the producer reconnects
+    SessionStatus.ACTIVE: frozenset({SessionStatus.PENDING, SessionStatus.ACTIVE}),
+    SessionStatus.PAUSED: frozenset({SessionStatus.PENDING, SessionStatus.ACTIVE}),
+    # app launch failed (async creation mode)
+    SessionStatus.FAILED: frozenset({SessionStatus.PENDING}),
+    SessionStatus.CLOSED: frozenset(
+        {SessionStatus.PENDING, SessionStatus.ACTIVE, SessionStatus.PAUSED, SessionStatus.FAILED}
+    ),
+}
+
+
+def _on_sessions_notify(payload: t.Optional[str]) -> None:
+    if payload is None:
+        session_cache.clear()
+    else:
+        session_cache.invalidate(json.loads(payload)["id"])
+
+
+def init_app(app: Flask) -> None:
+    """Configures session cache and creation mode.
+
+    FLASK_SESSION_CACHE_SIZE, FLASK_SESSION_CACHE_TTL: session cache size and ttl (0 disables the cache)
+    FLASK_SESSION_CREATE_MODE: `sync` (default) or `async` (run_app is called in background, see create_session)
+    """
+    session_cache.maxsize = int(app.config.get("SESSION_CACHE_SIZE", session_cache.maxsize))
+    session_cache.ttl = float(app.config.get("SESSION_CACHE_TTL", session_cache.ttl))
+    if session_cache.enabled:
+        pg_listener.subscribe(CHANNEL_SESSIONS, _on_sessions_notify)
+    if app.config.get("SESSION_CREATE_MODE", SESSION_CREATE_MODE_SYNC) == SESSION_CREATE_MODE_ASYNC:
+        launch_executor.init_app(app)
+
+
+def _in_transaction(pool_conn: t.Any) -> bool:
+    """Whether the driver has a transaction open on the connection (psycopg2, or asyncpg in ASGI mode)."""
+    if hasattr(pool_conn.dbapi_connection, "get_transaction_status"):
+        return pool_conn.dbapi_connection.get_transaction_status() != TRANSACTION_STATUS_IDLE
+    return pool_conn.driver_connection.is_in_transaction()
+
+
+def _execute_autocommit(stmt: t.Any) -> list[Row]:
+    """Runs a single-statement write as its own implicit transaction: one db round trip, no BEGIN/COMMIT.
+
+    Uses the request's db connection; falls back to execute + commit if a transaction is already open on it.
+    """
+    conn = sqldb.session.connection()
+    dbapi_conn = conn.connection.dbapi_connection
+    if _in_transaction(conn.connection):
+        rows = conn.execute(stmt).all()
+        sqldb.session.commit()
+        return rows
+    dbapi_conn.autocommit = True
+    try:
+        return conn.execute(stmt).all()
+    finally:
+        dbapi_conn.autocommit = False
 
-@dataclass
-class UpdateSessionDC:
-    id: str
-    app_release_uuid: t.Optional[str] = None
-    container: t.Optional[SessionDC.Container] = None
-    status: t.Optional[SessionStatus] = field(metadata={"by_value": True}, default=None)
-    user_id: t.Optional[int] = None
-    ws_conn: t.Optional[SessionDC.WsConn] = None
 
+def _release_db_connection() -> None:
+    """Hands the request's db connection back to the pool ahead of a slow appsvc call, so requests waiting on appsvc
+    don't exhaust the pool (the next statement checks a connection out again). All writes before must be committed.
+    """
+    sqldb.session.close()
 
-def _delete_session(session_id: str) -> None:
-    rows_updated = sqldb.session.query(SessionDAO).filter(SessionDAO.id == session_id).delete()
-    if rows_updated == 0:
-        raise SessionNotFoundException()
-    elif rows_updated > 1:
-        raise SessionOpException(message="Multiple sessions touched, this is unexpected, please investigate")
-    sqldb.session.commit()
-
-
-def _update_session(session: UpdateSessionDC) -> None:
-    upd_params = {}
-    if session.status:
-        upd_params[SessionDAO.status] = session.status.value
-    if session.ws_conn:
-        upd_params[SessionDAO.ws_conn] = SessionDC.WsConn.Schema().dump(session.ws_conn)
-    if session.container:
-        upd_params[SessionDAO.container] = SessionDC.Container.Schema().dump(session.container)
-    rows_updated = sqldb.session.query(SessionDAO).filter(SessionDAO.id == session.id).update(upd_params)
-    if rows_updated == 0:
+
+def _delete_session(session_id: str, op: t.Optional[SessionOp] = None) -> None:
+    stmt = delete(SessionDAO).where(SessionDAO.id == session_id).returning(*SessionDAO.__table__.c)
+    deleted = _execute_autocommit(stmt)
+    session_cache.invalidate(session_id)
+    if not deleted:
         raise SessionNotFoundException()
-    elif rows_updated > 1:
-        raise SessionOpException(message="Multiple sessions touched, this is unexpected, please investigate")
-    sqldb.session.commit()
+    if op:
+        audit.record(op, deleted[0], status=SessionStatus.CLOSED)
+
+
+def _transition(
+    session_id: str,
+    status: SessionStatus,
+    from_statuses: t.Iterable[SessionStatus],
+    op: SessionOp,
+    *,
+    where: t.Sequence[t.Any] = (),
+    values: t.Optional[dict[str, t.Any]] = None,
+) -> t.Optional[Row]:
+    """Compare-and-set status switch: UPDATE ... WHERE status IN (from_statuses) RETURNING, one db round trip.
+
+    Returns the switched session row (with `prev_status`) or None if the session is missing, is not in any of
+    `from_statuses` or doesn't match extra `where` criteria. Extra columns to set can be passed in `values`.
+    Successful switches are recorded in the audit trail as `op`.
+    """
+    # locking subselect exposes the status the row had right before the update
+    prev = select(SessionDAO.id, SessionDAO.status).where(SessionDAO.id == session_id).with_for_update().subquery()
+    stmt = (
+        update(SessionDAO)
+        .where(SessionDAO.id == prev.c.id, prev.c.status.in_([s.value for s in from_statuses]), *where)
+        .values(status=status.value, **(values or {}))
+        .returning(prev.c.status.label("prev_status"), *SessionDAO.__table__.c)
+    )
+    rows = _execute_autocommit(stmt)
+    session_cache.invalidate(session_id)
+    if not rows:
+        return None
+    audit.record(op, rows[0])
+    return rows[0]
+
+
+def _switch_status(
+    session_id: str,
+    status: SessionStatus,
+    op: SessionOp,
+    *,
+    where: t.Sequence[t.Any] = (),
+    values: t.Optional[dict[str, t.Any]] = None,
+    where_error: str = "session doesn't meet the operation preconditions",
+) -> Row:
+    """Switches session status according to SESSION_TRANSITIONS, raises if the transition is not allowed."""
+    res = _transition(session_id, status, SESSION_TRANSITIONS[status], op, where=where, values=values)
+    if res is None:
+        cur = sqldb.session.query(SessionDAO.status).filter(SessionDAO.id == session_id).first()
+        if cur is None:
+            raise SessionNotFoundException()
+        if SessionStatus(cur.status) in SESSION_TRANSITIONS[status]:
+            raise SessionOpException(message=where_error)
+        raise SessionIllegalTransitionException(
+            f"illegal session status transition: {cur.status} -> {status.value} (id: {session_id})"
+        )
+    return res
 
 
-def _create_session(req: CreateSessionRequestDTO) -> CreateSessionResponseDTO:
-    session_id = str(uuid.uuid4())
+def _revert_status(session_id: str, status: SessionStatus, prev_status: str) -> None:
+    """Compensates a status switch whose appsvc call failed (no-op if the session changed meanwhile)."""
+    if _transition(session_id, SessionStatus(prev_status), [status], SessionOp.REVERT) is None:
+        log.warning("session %s status changed concurrently, %s was not reverted", session_id, status)
 
-    # Create a new session object
-    new_session = SessionDAO(
-        id=session_id,
-        app_release_uuid=req.app_release_uuid,
-        user_id=req.user_id,
-        ws_conn=SessionDC.WsConn.Schema().dump(
-            SessionDC.WsConn(
-                id=req.ws_conn.id,
-                consumer_id=req.ws_conn.consumer_id,
-                producer_id=None,
-            )
-        ),
-        status=SessionStatus.PENDING.value,
+
+def _create_session(req: CreateSessionRequestDTO) -> t.Optional[CreateSessionResponseDTO]:
+    """Inserts a pending session unless the user is at the sessions quota (returns None then).
+
+    Quota check and insert are a single INSERT ... ON CONFLICT DO NOTHING RETURNING round trip. An empty
+    req.preferred_dcs is filled from the user's data center ranking, whose rtts are selected by the same statement
+    when the ranking is not cached.
+    """
+    ranking = dc_ranker.cached(req.user_id) if not req.preferred_dcs else None
+    load_ranking = not req.preferred_dcs and ranking is None
+    generation = dc_ranker.cache.generation
+    session_id = str(uuid.uuid4())
+    ws_conn = get_schema(SessionDC.WsConn).dump(
+        SessionDC.WsConn(
+            id=req.ws_conn.id,
+            consumer_id=req.ws_conn.consumer_id,
+            producer_id=None,
+        )
     )
-    sqldb.session.add(new_session)
-    sqldb.session.commit()
+    stmt = (
+        pg_insert(SessionDAO)
+        .values(
+            id=session_id,
+            app_release_uuid=req.app_release_uuid,
+            status=SessionStatus.PENDING.value,
+            user_id=req.user_id,
+            ws_conn=ws_conn,
+        )
+        # sessions.user_id is a unique key (MAX_USER_SESSIONS = 1): nothing is inserted if the user has a session
+        .on_conflict_do_nothing(index_elements=[SessionDAO.user_id])
+        .returning(*SessionDAO.__table__.c, *([dc_ranker.user_rtts_column(req.user_id)] if load_ranking else []))
+    )
+    rows = _execute_autocommit(stmt)
+    if not rows:
+        return None
+    if load_ranking:
+        ranking = dc_ranker.rank_user(req.user_id, rows[0].user_rtts, generation)
+    if ranking is not None:
+        req.preferred_dcs = preferred_dcs(ranking)
+    session_cache.invalidate(session_id)
+    audit.record(SessionOp.CREATE, rows[0])
     return CreateSessionResponseDTO(session_id=session_id)
 
 
-@log_input_output
+def _resume_session(req: CreateSessionRequestDTO) -> t.Optional[tuple[str, dto_appsvc.ContainerOpDescr]]:
+    """Switches the user's paused session of the same app back to pending in one UPDATE ... RETURNING round trip.
+
+    This is the PAUSED -> PENDING transition of SESSION_TRANSITIONS, looked up by user and app instead of id.
+    ws_conn is reset primarily to drop the old producer_id, so it couldn't control the resumed session; consumer_id
+    and id may be also switched in a session resume flow.
+    """
+    stmt = (
+        update(SessionDAO)
+        .where(
+            SessionDAO.user_id == req.user_id,
+            SessionDAO.app_release_uuid == req.app_release_uuid,
+            SessionDAO.status == SessionStatus.PAUSED.value,
+        )
+        .values(
+            status=SessionStatus.PENDING.value,
+            ws_conn=get_schema(SessionDC.WsConn).dump(
+                SessionDC.WsConn(id=req.ws_conn.id, consumer_id=req.ws_conn.consumer_id)
+            ),
+        )
+        .returning(*SessionDAO.__table__.c)
+    )
+    rows = _execute_autocommit(stmt)
+    if not rows:
+        return None
+    row = rows[0]
+    session_cache.invalidate(row.id)
+    audit.record(SessionOp.RESUME, row)
+    return row.id, dto_appsvc.ContainerOpDescr(id=row.container["id"], node_id=row.container["node_id"])
+
+
+def _delete_failed_sessions(user_id: int) -> int:
+    stmt = (
+        delete(SessionDAO)
+        .where(SessionDAO.user_id == user_id, SessionDAO.status == SessionStatus.FAILED.value)
+        .returning(*SessionDAO.__table__.c)
+    )
+    deleted = _execute_autocommit(stmt)
+    for row in deleted:
+        session_cache.invalidate(row.id)
+        audit.record(SessionOp.CLOSE, row, status=SessionStatus.CLOSED)
+    return len(deleted)
+
+
+@log_call
+@traced
 def create_session(req: CreateSessionRequestDTO) -> CreateSessionResponseDTO:
-    user_sessions = get_user_sessions(req.user_id)
-    if len(user_sessions) > MAX_USER_SESSIONS:
-        raise SessionsQuotaLimitExceededException
-    for session in user_sessions:
-        if session.app_release_uuid == req.app_release_uuid:
-            if session.status != SessionStatus.PAUSED:
-                # possible causes:
-                #   - "fast-click": same app was quickly started more than once
-                #   - same app was requested to be run in a new tab
-                raise SessionOpException(f"found existing session in a non-paused state (id: {session.id})")
-            # updating session primarily to reset old ws_conn.producer_id so it couldn't control resumed session
-            # consumer_id and id may be also switched in a session resume flow
-            _update_session(
-                UpdateSessionDC(
-                    id=session.id,
-                    status=SessionStatus.PENDING,
-                    ws_conn=SessionDC.WsConn(
-                        id=req.ws_conn.id,
-                        consumer_id=req.ws_conn.consumer_id,
-                    ),
-                )
-            )
+    # _create_session must be called before the run_app to avoid dup sessions (sessions.user_id is a unique key)
+    # container params will be set after successfull execution of the run_app
+    # producer_id will be set later from the start_session call
+    create_sess_res = _create_session(req)
+    if create_sess_res is None:
+        # the user already has a session: resume it if it's a paused one of the same app
+        resumed = _resume_session(req)
+        if resumed:
+            session_id, container = resumed
+            _release_db_connection()
             appsvc.resume_app(
                 dto_appsvc.ResumeAppRequestDTO(
-                    container=dto_appsvc.ContainerOpDescr(
-                        id=session.container.id,
-                        node_id=session.container.node_id,
-                    ),
+                    container=container,
                     ws_conn=dto_appsvc.WsConnDC(
                         id=req.ws_conn.id,
                         consumer_id=req.ws_conn.consumer_id,
@@ -126,113 +335,329 @@ def create_session(req: CreateSessionRequestDTO) -> CreateSessionResponseDTO:
                 )
             )
             # start_session (resume) will be called later, from sigsvc
-            return CreateSessionResponseDTO(session_id=session.id)
-    if len(user_sessions) >= MAX_USER_SESSIONS:
+            return CreateSessionResponseDTO(session_id=session_id)
+        # sessions with a failed app launch don't hold the user's quota
+        if _delete_failed_sessions(req.user_id):
+            create_sess_res = _create_session(req)
+    if create_sess_res is None:
+        for session in get_user_sessions(req.user_id):
+            if session.app_release_uuid == req.app_release_uuid and session.status != SessionStatus.PAUSED:
+                # possible causes:
+                #   - "fast-click": same app was quickly started more than once
+                #   - same app was requested to be run in a new tab
+                raise SessionOpException(f"found existing session in a non-paused state (id: {session.id})")
         raise SessionsQuotaLimitExceededException
-
-    # _create_session must be called before the run_app to avoid dup sessions (sessions.user_id is a unique key)
-    # container params will be set after successfull execution of the run_app
-    # producer_id will be set later from the start_session call
+    if launch_executor.initialized:
+        # async creation mode: app is launched in background, clients observe progress through the session status
+        try:
+            launch_executor.submit(_launch_app_in_background, create_sess_res.session_id, req)
+        except ExecutorQueueFullException:
+            _delete_session(create_sess_res.session_id, SessionOp.CLOSE)
+            raise
+        return create_sess_res
     try:
-        create_sess_res = _create_session(req)
-        run_app_res: dto_appsvc.RunAppResponseDTO = appsvc.run_app(
-            dto_appsvc.RunAppRequestDTO(
-                app_release_uuid=req.app_release_uuid,
-                user_id=req.user_id,
-                preferred_dcs=req.preferred_dcs,
-                ws_conn=dto_appsvc.WsConnDC(id=req.ws_conn.id, consumer_id=req.ws_conn.consumer_id),
-            )
+        _launch_app(create_sess_res.session_id, req)
+    except (AppSvcBusyException, AppSvcUnavailableException):
+        # rejected before reaching appsvc, nothing was launched: let the client retry
+        _delete_session(create_sess_res.session_id, SessionOp.CLOSE)
+        raise
+    return create_sess_res
+
+
+def _launch_app(session_id: str, req: CreateSessionRequestDTO) -> None:
+    _release_db_connection()
+    run_app_res: dto_appsvc.RunAppResponseDTO = appsvc.run_app(
+        dto_appsvc.RunAppRequestDTO(
+            app_release_uuid=req.app_release_uuid,
+            user_id=req.user_id,
+            preferred_dcs=req.preferred_dcs,
+            ws_conn=dto_appsvc.WsConnDC(id=req.ws_conn.id, consumer_id=req.ws_conn.consumer_id),
         )
-        # now setting container attributes
-        _update_session(
-            UpdateSessionDC(
-                id=create_sess_res.session_id,
-                container=SessionDC.Container(
-                    run_app_res.container.id,
+    )
+    # now setting container attributes
+    container = SessionDC.Container(
+        run_app_res.container.id,
+        node_id=run_app_res.container.node_id,
+        region=run_app_res.container.region,
+    )
+    # start_session may have switched the session to ACTIVE before the container is written
+    launching = [SessionStatus.PENDING.value, SessionStatus.ACTIVE.value]
+    stmt = (
+        update(SessionDAO)
+        .where(SessionDAO.id == session_id, SessionDAO.status.in_(launching))
+        .values(container=get_schema(SessionDC.Container).dump(container))
+        .returning(SessionDAO.id)
+    )
+    updated = _execute_autocommit(stmt)
+    session_cache.invalidate(session_id)
+    if not updated:
+        # session was closed (or is being closed) while the app was being launched, don't leave the container orphaned
+        appsvc.stop_app(
+            dto_appsvc.StopAppRequestDTO(
+                container=dto_appsvc.ContainerOpDescr(
+                    id=run_app_res.container.id,
                     node_id=run_app_res.container.node_id,
-                    region=run_app_res.container.region,
-                ),
+                )
             )
         )
-        return create_sess_res
-    except IntegrityError as e:
-        raise SessionsQuotaLimitExceededException from e
+        raise SessionNotFoundException()
+
+
+@traced
+def _launch_app_in_background(session_id: str, req: CreateSessionRequestDTO) -> None:
+    try:
+        _launch_app(session_id, req)
+    except SessionNotFoundException:
+        log.warning("session %s was closed during the app launch", session_id)
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        log.exception("app launch failed for session %s: %s", session_id, e)
+        from_statuses = SESSION_TRANSITIONS[SessionStatus.FAILED]
+        if _transition(session_id, SessionStatus.FAILED, from_statuses, SessionOp.FAIL) is None:
+            log.warning("session %s was closed during the app launch", session_id)
 
 
-@log_input_output
+@log_call
+@traced
 def pause_session(session_id: str) -> None:
-    session: SessionDC = get_session(session_id)
-    if not session.container:
-        raise SessionOpException(message="session.container is empty")
-    appsvc.pause_app(
-        dto_appsvc.PauseAppRequestDTO(
-            container=dto_appsvc.ContainerOpDescr(
-                id=session.container.id,
-                node_id=session.container.node_id,
+    res = _switch_status(
+        session_id,
+        SessionStatus.PAUSED,
+        SessionOp.PAUSE,
+        where=[SessionDAO.container.isnot(None)],
+        where_error="session.container is empty",
+    )
+    _release_db_connection()
+    try:
+        appsvc.pause_app(
+            dto_appsvc.PauseAppRequestDTO(
+                container=dto_appsvc.ContainerOpDescr(
+                    id=res.container["id"],
+                    node_id=res.container["node_id"],
+                )
             )
         )
-    )
-    _update_session(UpdateSessionDC(id=session_id, status=SessionStatus.PAUSED))
+    except Exception:
+        _revert_status(session_id, SessionStatus.PAUSED, res.prev_status)
+        raise
 
 
-@log_input_output
+@log_call
+@traced
 def start_session(session_id: str, req: StartSessionRequestDTO) -> None:
-    session: SessionDC = get_session(session_id)
-    session.ws_conn.producer_id = req.ws_conn.producer_id
-    _update_session(
-        UpdateSessionDC(
-            id=session_id,
-            status=SessionStatus.ACTIVE,
-            ws_conn=session.ws_conn,
-        )
-    )
+    producer_id = func.jsonb_build_object("producer_id", req.ws_conn.producer_id)
+    ws_conn = SessionDAO.ws_conn.op("||")(producer_id)
+    _switch_status(session_id, SessionStatus.ACTIVE, SessionOp.START, values={"ws_conn": ws_conn})
     # in case session was in a PAUSED state, app will resume as part of the "create_session" call
 
 
-@log_input_output
+@log_call
+@traced
 def close_session(session_id: str) -> None:
     try:
-        session: SessionDC = get_session(session_id)
-        if session.status in {SessionStatus.PAUSED, SessionStatus.ACTIVE} and session.container:
+        res = _switch_status(session_id, SessionStatus.CLOSED, SessionOp.CLOSE)
+    except SessionNotFoundException:
+        log.warning("session %s was already closed", session_id)
+        return
+    except SessionIllegalTransitionException:
+        log.warning("session %s is being closed concurrently", session_id)
+        return
+    if res.container:
+        _release_db_connection()
+        try:
             appsvc.stop_app(
                 dto_appsvc.StopAppRequestDTO(
                     container=dto_appsvc.ContainerOpDescr(
-                        id=session.container.id,
-                        node_id=session.container.node_id,
+                        id=res.container["id"],
+                        node_id=res.container["node_id"],
                     )
                 )
             )
+        except Exception:
+            _revert_status(session_id, SessionStatus.CLOSED, res.prev_status)
+            raise
+    try:
         _delete_session(session_id)
     except SessionNotFoundException:
         log.warning("session %s was already closed", session_id)
 
 
-@log_input_output
+def stop_apps(rows: t.Sequence[Row], max_concurrency: int) -> dict[str, Exception]:
+    """Stops apps of the sessions (rows without a container are skipped) with at most `max_concurrency` concurrent
+    appsvc calls, returns errors of the failed stops by session id."""
+
+    def stop(row: Row) -> t.Optional[Exception]:
+        try:
+            appsvc.stop_app(
+                dto_appsvc.StopAppRequestDTO(
+                    container=dto_appsvc.ContainerOpDescr(id=row.container["id"], node_id=row.container["node_id"])
+                )
+            )
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            log.warning("failed to stop app of session %s: %s", row.id, e)
+            return e
+        return None
+
+    with_container = [r for r in rows if r.container]
+    results = aio.map_concurrently(stop, with_container, max_concurrency, name="stop")
+    return {row.id: e for row, e in zip(with_container, results) if e is not None}
+
+
+@log_call
+@traced
+def close_sessions(req: CloseSessionsRequestDTO) -> CloseSessionsResponseDTO:
+    """Closes sessions by ids, node or region: claims them in one statement, stops their apps concurrently and
+    deletes them in one statement. Sessions whose app couldn't be stopped get their previous status back.
+
+    FLASK_BULK_CLOSE_CONCURRENCY: max number of concurrent stop_app calls (defaults to the appsvc stop bulkhead size)
+    """
+    criteria = []
+    if req.ids is not None:
+        criteria.append(SessionDAO.id.in_(req.ids))
+    if req.node_id is not None:
+        criteria.append(SessionDAO.container["node_id"].astext == req.node_id)
+    if req.region is not None:
+        criteria.append(SessionDAO.container["region"].astext == req.region.name)
+    if len(criteria) != 1:
+        raise ValidationError({"_schema": ["Exactly one of ids, node_id or region must be set."]})
+    from_statuses = [s.value for s in SESSION_TRANSITIONS[SessionStatus.CLOSED]]
+    # locking subselect exposes the statuses the rows had right before the update, see _transition
+    prev = select(SessionDAO.id, SessionDAO.status).where(criteria[0]).with_for_update().subquery()
+    stmt = (
+        update(SessionDAO)
+        .where(SessionDAO.id == prev.c.id, prev.c.status.in_(from_statuses))
+        .values(status=SessionStatus.CLOSED.value)
+        .returning(prev.c.status.label("prev_status"), *SessionDAO.__table__.c)
+    )
+    rows = _execute_autocommit(stmt)
+    for row in rows:
+        session_cache.invalidate(row.id)
+        audit.record(SessionOp.CLOSE, row)
+
+    concurrency = int(current_app.config.get("BULK_CLOSE_CONCURRENCY", appsvc.MAX_CONCURRENCY["stop"]))
+    _release_db_connection()
+    errors = stop_apps(rows, concurrency)
+    results = []
+    for row in rows:
+        if row.id in errors:
+            _revert_status(row.id, SessionStatus.CLOSED, row.prev_status)
+            e = errors[row.id]
+            error = e.message if isinstance(e, BizException) else str(e)
+            results.append(CloseSessionsResponseDTO.Result(id=row.id, outcome=CloseOutcome.FAILED, error=error))
+        else:
+            results.append(CloseSessionsResponseDTO.Result(id=row.id, outcome=CloseOutcome.CLOSED))
+    closed = [r.id for r in results if r.outcome == CloseOutcome.CLOSED]
+    if closed:
+        stmt = delete(SessionDAO).where(SessionDAO.id.in_(closed), SessionDAO.status == SessionStatus.CLOSED.value)
+        _execute_autocommit(stmt.returning(SessionDAO.id))
+        for session_id in closed:
+            session_cache.invalidate(session_id)
+    claimed = {row.id for row in rows}
+    for session_id in dict.fromkeys(req.ids or []):
+        if session_id not in claimed:
+            results.append(CloseSessionsResponseDTO.Result(id=session_id, outcome=CloseOutcome.NOT_FOUND))
+    return CloseSessionsResponseDTO(results=results)
+
+
+@log_call
+@traced
 def get_session(session_id: str) -> SessionDC:
+    """Returns session, served from the session cache when possible (returned object must not be modified)."""
+    if session_cache.enabled:
+        pg_listener.ensure_started()
+    # without a live listener other workers' changes would go unnoticed, so the cache is bypassed
+    use_cache = session_cache.enabled and pg_listener.connected
+    if use_cache:
+        cached = session_cache.get(session_id)
+        if cached:
+            return cached
+    generation = session_cache.generation
     session = sqldb.session.query(SessionDAO).filter(SessionDAO.id == session_id).first()
     if not session:
         raise SessionNotFoundException
-    return SessionDC.from_sessiondao(session)
+    res = SessionDC.from_sessiondao(session)
+    if use_cache:
+        session_cache.set(session_id, res, generation)
+    return res
 
 
-@log_input_output
+@log_call
+@traced
 def get_user_sessions(user_id: int) -> list[SessionDC]:
     sessions = sqldb.session.query(SessionDAO).filter(SessionDAO.user_id == user_id).all()
     return [SessionDC.from_sessiondao(s) for s in sessions]
 
 
-@log_input_output
+@log_call
+@traced
 def get_consumer_sessions(consumer_id: str) -> list[SessionDC]:
     sessions = sqldb.session.query(SessionDAO).filter(SessionDAO.ws_conn["consumer_id"].astext == consumer_id).all()
     return [SessionDC.from_sessiondao(s) for s in sessions]
 
 
-@log_input_output
+@log_call
+@traced
 def get_producer_sessions(producer_id: str) -> list[SessionDC]:
     sessions = sqldb.session.query(SessionDAO).filter(SessionDAO.ws_conn["producer_id"].astext == producer_id).all()
     return [SessionDC.from_sessiondao(s) for s in sessions]
 
 
-def get_sessions() -> list[SessionDC]:
-    sessions = sqldb.session.query(SessionDAO).all()
-    return [SessionDC.from_sessiondao(s) for s in sessions]
+def _encode_cursor(session: SessionDAO, order_by: SessionsOrderBy) -> str:
+    key = [session.id] if order_by == SessionsOrderBy.ID else [session.updated.isoformat(), session.id]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+
+def _decode_cursor(cursor: str, order_by: SessionsOrderBy) -> list:
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if not isinstance(key, list):
+            raise ValueError(cursor)
+        if order_by == SessionsOrderBy.UPDATED:
+            key[0] = datetime.datetime.fromisoformat(key[0])
+        if len(key) != (1 if order_by == SessionsOrderBy.ID else 2):
+            raise ValueError(cursor)
+        return key
+    except (ValueError, TypeError, IndexError) as e:
+        raise ValidationError({"cursor": ["Invalid cursor."]}) from e
+
+
+def _sessions_query(req: GetSessionsRequestDTO) -> Query:
+    query = sqldb.session.query(SessionDAO)
+    if req.app_release_uuid:
+        query = query.filter(SessionDAO.app_release_uuid == req.app_release_uuid)
+    if req.node_id:
+        query = query.filter(SessionDAO.container["node_id"].astext == req.node_id)
+    if req.region:
+        query = query.filter(SessionDAO.container["region"].astext == req.region.name)
+    if req.status:
+        query = query.filter(SessionDAO.status == req.status.value)
+    if req.user_id is not None:
+        query = query.filter(SessionDAO.user_id == req.user_id)
+    if req.order_by == SessionsOrderBy.ID:
+        if req.cursor:
+            query = query.filter(SessionDAO.id > _decode_cursor(req.cursor, req.order_by)[0])
+        return query.order_by(SessionDAO.id)
+    if req.cursor:
+        cursor = tuple(_decode_cursor(req.cursor, req.order_by))
+        query = query.filter(tuple_(SessionDAO.updated, SessionDAO.id) > cursor)
+    return query.order_by(SessionDAO.updated, SessionDAO.id)
+
+
+@traced
+def get_sessions(req: GetSessionsRequestDTO) -> GetSessionsPageResponseDTO:
+    """Returns a page of sessions matching filters, ordered by a unique key (keyset pagination)."""
+    limit = req.limit or GET_SESSIONS_MAX_LIMIT
+    sessions = _sessions_query(req).limit(limit + 1).all()
+    next_cursor = _encode_cursor(sessions[limit - 1], req.order_by) if len(sessions) > limit else None
+    return GetSessionsPageResponseDTO(
+        sessions=[SessionDC.from_sessiondao(s) for s in sessions[:limit]],
+        next_cursor=next_cursor,
+    )
+
+
+def iter_sessions(req: GetSessionsRequestDTO) -> t.Iterator[SessionDC]:
+    """Yields all sessions matching filters (starting after req.cursor) using a server-side cursor."""
+    query = _sessions_query(req)
+    if req.limit:
+        query = query.limit(req.limit)
+    for session in query.yield_per(GET_SESSIONS_STREAM_BATCH_SIZE):
+        yield SessionDC.from_sessiondao(session)
@@ -0,0 +1,34 @@
+import typing as t
+
+from flask import (
+    Flask,
+    Response,
+    g,
+    has_request_context,
+)
+from sqlalchemy import event
+
+from sessionsvc.biz.sqldb import sqldb
+
+SQL_STATEMENTS_HEADER = "X-SQL-Statements"
+
+
+def _count_statement(*args: t.Any) -> None:  # pylint: disable=unused-argument
+    if has_request_context():
+        g.sql_statements = g.get("sql_statements", 0) + 1
+
+
+def statements_count() -> int:
+    """Number of SQL statements (db round trips, commits excluded) executed so far by the current request."""
+    return g.get("sql_statements", 0)
+
+
+def init_app(app: Flask) -> None:
+    """Counts SQL statements executed per request and reports them in the X-SQL-Statements response header."""
+    with app.app_context():
+        event.listen(sqldb.engine, "before_cursor_execute", _count_statement)
+
+    @app.after_request
+    def add_statements_header(response: Response) -> Response:
+        response.headers[SQL_STATEMENTS_HEADER] = str(statements_count())
+        return response
@@ -1,54 +1,229 @@
 import json
-from collections import deque
+import logging
+import typing as t
+from dataclasses import dataclass
 
-from sessionsvc.biz.dto import SubmitWebRtcStatsRequestDTO
+from flask import Flask
+from sqlalchemy import (
+    insert,
+    text,
+)
+from sqlalchemy.exc import IntegrityError
+
+from sessionsvc.biz import metrics
+from sessionsvc.biz.batch_writer import BatchWriter
+from sessionsvc.biz.dto import (
+    SubmitWebRtcStatsRequestDTO,
+    UserDcRttDC,
+)
+from sessionsvc.biz.errors import (
+    SessionOpException,
+    WriterQueueFullException,
+)
 from sessionsvc.biz.models import (
-    UsersDcsDAO,
+    UsersDcsRttsDAO,
     WebRTCStatsLogsDAO,
 )
+from sessionsvc.biz.rtt import (
+    RTT_EWMA_ALPHA,
+    bucket_index,
+    empty_hist,
+    quantile,
+)
 from sessionsvc.biz.session import get_session
 from sessionsvc.biz.sqldb import sqldb
+from sessionsvc.biz.stats_maintenance import (
+    is_missing_partition,
+    stats_maintenance,
+)
+from sessionsvc.biz.stats_storage import stats_storage
 
-MAX_RTTS = 100
+log = logging.getLogger("sessionsvc")
 
+STATS_INGEST_MODE_SYNC = "sync"
+STATS_INGEST_MODE_BUFFERED = "buffered"
 
-def submit_webrtc_stats(session_id: str, req: SubmitWebRtcStatsRequestDTO) -> None:
-    """Submit webrtc stats.
-
-    Create a new entry in the stats.webrtc_stats_logs table;
-    Update dcs in the stats.users_dcs (recording only best rtt per region);
+# upserts a batch of _collapse_rtts rows; an existing aggregate takes the place of the batch's first rtt in its ewma,
+# which then decays by (1 - alpha) per sample of the batch
+_RECORD_RTTS_SQL = text(
     """
+    WITH batch AS (
+        SELECT * FROM json_to_recordset(CAST(:batch AS JSON)) AS b(
+            user_id BIGINT,
+            region VARCHAR,
+            samples BIGINT,
+            ewma DOUBLE PRECISION,
+            first_rtt DOUBLE PRECISION,
+            hist INTEGER[],
+            min_rtt DOUBLE PRECISION
+        )
+    )
+    INSERT INTO stats.users_dcs_rtts AS a (user_id, region, samples, ewma, hist, min_rtt)
+    SELECT user_id, region, samples, ewma, hist, min_rtt FROM batch ORDER BY user_id, region
+    ON CONFLICT (user_id, region) DO UPDATE SET
+        ewma = excluded.ewma + power(1 - :alpha, excluded.samples) * (
+            a.ewma - (SELECT b.first_rtt FROM batch b WHERE b.user_id = excluded.user_id AND b.region = excluded.region)
+        ),
+        hist = ARRAY(
+            SELECT h + e FROM unnest(a.hist, excluded.hist) WITH ORDINALITY AS u(h, e, i) ORDER BY i
+        ),
+        min_rtt = least(a.min_rtt, excluded.min_rtt),
+        samples = a.samples + excluded.samples,
+        updated = now() AT TIME ZONE 'utc'
+    """
+)
+
+
+@dataclass
+class WebRtcStatsSample:
+    """Validated stats submission, ready to be written."""
+
+    app_release_uuid: str
+    region: str
+    session_id: str
+    stats: dict
+    user_id: int
+    rtt: t.Optional[float] = None
+
+    def to_log_row(self) -> dict:
+        return {
+            "app_release_uuid": self.app_release_uuid,
+            "region": self.region,
+            "session_id": self.session_id,
+            "user_id": self.user_id,
+            **stats_storage.to_columns(self.stats),
+        }
+
+
+def _make_sample(session_id: str, req: SubmitWebRtcStatsRequestDTO) -> WebRtcStatsSample:
     session = get_session(session_id)
-    user_id = session.user_id
+    if not session.container:
+        raise SessionOpException(message="session.container is empty")
     stats = json.loads(req.stats)
+    rtt = None
     if "remote_inbound_rtp" in stats:
-        user_dcs = sqldb.session.query(UsersDcsDAO).filter(UsersDcsDAO.user_id == user_id).first()
         cur_rtt = stats["remote_inbound_rtp"]["round_trip_time"]
         if cur_rtt and (0 < cur_rtt < 5):
-            if user_dcs:
-                cur_dcs = user_dcs.dcs
-                if session.container.region not in cur_dcs:
-                    rtts = [cur_rtt]
-                else:
-                    rtts_dq = deque(cur_dcs[session.container.region], maxlen=MAX_RTTS)
-                    rtts_dq.append(cur_rtt)
-                    rtts = list(rtts_dq)
-                cur_dcs[session.container.region] = rtts
-                sqldb.session.query(UsersDcsDAO).filter(UsersDcsDAO.user_id == user_id).update(
-                    {
-                        UsersDcsDAO.dcs: cur_dcs,
-                    }
-                )
-            else:
-                sqldb.session.add(UsersDcsDAO(dcs={session.container.region: [cur_rtt]}, user_id=user_id))
-
-    new_stats_entry = WebRTCStatsLogsDAO(
+            rtt = cur_rtt
+    return WebRtcStatsSample(
         app_release_uuid=session.app_release_uuid,
         region=session.container.region,
         session_id=session_id,
         stats=stats,
-        user_id=user_id,
+        user_id=session.user_id,
+        rtt=rtt,
     )
-    sqldb.session.add(new_stats_entry)
 
+
+def _collapse_rtts(samples: list[WebRtcStatsSample]) -> list[dict]:
+    """Aggregates of the samples' rtts per user and region, sorted by user and region.
+
+    `ewma` folds the rtts in order starting from the first one (`first_rtt`), as a new aggregate would.
+    """
+    rtts: dict[tuple[int, str], list[float]] = {}
+    for sample in samples:
+        if sample.rtt is not None:
+            rtts.setdefault((sample.user_id, sample.region), []).append(sample.rtt)
+    rows = []
+    for (user_id, region), values in sorted(rtts.items()):
+        ewma, hist = values[0], empty_hist()
+        for rtt in values:
+            ewma += RTT_EWMA_ALPHA * (rtt - ewma)
+            hist[bucket_index(rtt)] += 1
+        rows.append(
+            {
+                "user_id": user_id,
+                "region": region,
+                "samples": len(values),
+                "ewma": ewma,
+                "first_rtt": values[0],
+                "hist": hist,
+                "min_rtt": min(values),
+            }
+        )
+    return rows
+
+
+def _record_rtts(samples: list[WebRtcStatsSample]) -> None:
+    """Folds the samples' rtts into the users' region aggregates in stats.users_dcs_rtts.
+
+    Done as a single INSERT ... ON CONFLICT DO UPDATE of one row per user and region, so concurrent submissions from
+    different workers never lose samples or create duplicate aggregates, and lock the rows in the same order.
+    """
+    rows = _collapse_rtts(samples)
+    if rows:
+        sqldb.session.execute(_RECORD_RTTS_SQL, {"batch": json.dumps(rows), "alpha": RTT_EWMA_ALPHA})
+
+
+def _insert_samples(samples: list[WebRtcStatsSample]) -> None:
+    _record_rtts(samples)
+    sqldb.session.execute(insert(WebRTCStatsLogsDAO), [s.to_log_row() for s in samples])
     sqldb.session.commit()
+
+
+def _write_samples(samples: list[WebRtcStatsSample]) -> None:
+    """Writes samples in a single transaction using a multi-row insert for the stats logs.
+
+    Samples of a day without a partition are written again once the partition is created (another worker may have
+    created it meanwhile), so that a stopped maintenance job doesn't fail ingestion.
+    """
+    try:
+        _insert_samples(samples)
+    except IntegrityError as e:
+        sqldb.session.rollback()
+        if not is_missing_partition(e):
+            raise
+        log.warning("stats partition of today is missing, creating it (is maintain-stats running?)")
+        stats_maintenance.ensure_partition()
+        _insert_samples(samples)
+    metrics.stats_samples.labels("written").inc(len(samples))
+
+
+stats_writer: BatchWriter[WebRtcStatsSample] = BatchWriter("stats", flush=_write_samples)
+
+
+def init_app(app: Flask) -> None:
+    """Enables buffered stats ingestion when FLASK_STATS_INGEST_MODE is set to `buffered`."""
+    if app.config.get("STATS_INGEST_MODE", STATS_INGEST_MODE_SYNC) == STATS_INGEST_MODE_BUFFERED:
+        stats_writer.init_app(app)
+
+
+def is_buffered() -> bool:
+    return stats_writer.initialized
+
+
+def submit_webrtc_stats(session_id: str, req: SubmitWebRtcStatsRequestDTO) -> None:
+    """Submit webrtc stats.
+
+    Create a new entry in the stats.webrtc_stats_logs table;
+    Update user's rtt aggregate for the session region in the stats.users_dcs_rtts;
+    """
+    sample = _make_sample(session_id, req)
+    metrics.stats_samples.labels("accepted").inc()
+    _write_samples([sample])
+
+
+def enqueue_webrtc_stats(session_id: str, req: SubmitWebRtcStatsRequestDTO) -> None:
+    """Validate webrtc stats and buffer them for a background batched write (see submit_webrtc_stats)."""
+    sample = _make_sample(session_id, req)
+    try:
+        stats_writer.put(sample)
+    except WriterQueueFullException:
+        metrics.stats_samples.labels("rejected").inc()
+        raise
+    metrics.stats_samples.labels("accepted").inc()
+
+
+def get_user_rtts(user_id: int) -> list[UserDcRttDC]:
+    aggs = sqldb.session.query(UsersDcsRttsDAO).filter(UsersDcsRttsDAO.user_id == user_id).all()
+    return [
+        UserDcRttDC(
+            region=a.region,
+            samples=a.samples,
+            ewma=a.ewma,
+            min=a.min_rtt,
+            p50=quantile(a.hist, 0.5, a.min_rtt),
+            p95=quantile(a.hist, 0.95, a.min_rtt),
+        )
+        for a in aggs
+    ]
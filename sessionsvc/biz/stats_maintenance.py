@@ -0,0 +1,311 @@
+import datetime
+import json
+import logging
+import re
+import threading
+import time
+import typing as t
+
+import click
+from flask import Flask
+from psycopg2.errorcodes import CHECK_VIOLATION
+from sqlalchemy import (
+    delete,
+    func,
+    select,
+    text,
+)
+from sqlalchemy.exc import DBAPIError
+
+from sessionsvc.biz.models import WebRTCStatsRollupDAO
+from sessionsvc.biz.sqldb import sqldb
+
+log = logging.getLogger("sessionsvc")
+
+# only one maintenance pass runs at a time across all pods, the others skip it
+STATS_MAINTENANCE_LOCK_ID = 0x5E551077
+
+PARTITION_PREFIX = "webrtc_stats_logs_p"
+_PARTITION_UPPER_BOUND = re.compile(r"TO \('([^']+)'\)")
+
+_PARTITIONS_SQL = text(
+    """
+    SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), i.inhdetachpending
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = 'stats.webrtc_stats_logs'::regclass
+    """
+)
+
+
+def _number(path: str) -> str:
+    """SQL of a numeric stats field (NULL if missing or not a number), `path` is a `stats -> 'a' -> 'b'` expression."""
+    return f"CASE WHEN jsonb_typeof({path}) = 'number' THEN ({path})::TEXT::DOUBLE PRECISION END"
+
+
+# of submissions stored as a json blob, before the typed columns (see sessionsvc.biz.stats_storage)
+_RTT = f"""coalesce(
+    {_number("stats -> 'remote_inbound_rtp' -> 'round_trip_time'")},
+    {_number("stats -> 'candidate_pair' -> 'currentRoundTripTime'")}
+)"""
+_JITTER = _number("stats -> 'inbound_rtp' -> 'jitter'")
+_PACKETS_LOST = _number("stats -> 'inbound_rtp' -> 'packetsLost'")
+_BYTES_RECEIVED = _number("stats -> 'inbound_rtp' -> 'bytesReceived'")
+
+# aggregates submissions of [:start, :end) into hourly rows per session; re-running a range overwrites its rows
+_ROLLUP_TEMPLATE = """
+    INSERT INTO stats.webrtc_stats_rollups AS r (
+        bucket, session_id, app_release_uuid, region, user_id, samples, rtt_avg, rtt_p95, rtt_max, jitter_avg,
+        jitter_max, packets_lost, bitrate_avg
+    )
+    SELECT
+        date_trunc('hour', created),
+        session_id,
+        min(app_release_uuid),
+        min(region),
+        min(user_id),
+        count(*),
+        avg(rtt),
+        percentile_cont(0.95) WITHIN GROUP (ORDER BY rtt),
+        max(rtt),
+        avg(jitter),
+        max(jitter),
+        (max(packets_lost) - min(packets_lost))::BIGINT,
+        (max(bytes_received) - min(bytes_received)) * 8 / nullif(extract(epoch FROM max(created) - min(created)), 0)
+    FROM (
+        SELECT
+            created,
+            session_id,
+            app_release_uuid,
+            region,
+            user_id,
+            coalesce(l.rtt, {rtt}) AS rtt,
+            coalesce(l.jitter, {jitter}) AS jitter,
+            coalesce(l.packets_lost, {packets_lost}) AS packets_lost,
+            coalesce(l.bytes_received, {bytes_received}) AS bytes_received
+        FROM stats.webrtc_stats_logs l
+        WHERE created >= :start AND created < :end
+    ) s
+    GROUP BY 1, 2
+    ON CONFLICT (bucket, session_id) DO UPDATE SET
+        app_release_uuid = excluded.app_release_uuid,
+        region = excluded.region,
+        user_id = excluded.user_id,
+        samples = excluded.samples,
+        rtt_avg = excluded.rtt_avg,
+        rtt_p95 = excluded.rtt_p95,
+        rtt_max = excluded.rtt_max,
+        jitter_avg = excluded.jitter_avg,
+        jitter_max = excluded.jitter_max,
+        packets_lost = excluded.packets_lost,
+        bitrate_avg = excluded.bitrate_avg
+    """
+# only the constant field expressions above are interpolated, the range is a bound parameter
+_ROLLUP_SQL = text(
+    _ROLLUP_TEMPLATE.format(rtt=_RTT, jitter=_JITTER, packets_lost=_PACKETS_LOST, bytes_received=_BYTES_RECEIVED)
+)
+
+
+def partition_name(day: datetime.date) -> str:
+    return f"{PARTITION_PREFIX}{day:%Y%m%d}"
+
+
+def is_missing_partition(e: DBAPIError) -> bool:
+    """Whether the error is of stats submitted for a day without a partition (check violations of actual constraints
+    name the constraint)."""
+    # error fields are on psycopg2's error, or on the asyncpg one (ASGI mode) the dbapi error is raised from
+    diag = getattr(e.orig, "diag", None) or e.orig.__cause__
+    return (
+        getattr(e.orig, "pgcode", None) == CHECK_VIOLATION
+        and getattr(diag, "table_name", None) == "webrtc_stats_logs"
+        and getattr(diag, "constraint_name", None) is None
+    )
+
+
+class StatsMaintenance:
+    """Keeps stats.webrtc_stats_logs partitioned by day and rolled up by hour.
+
+    Every pass creates the partitions of the next `premake_days` days, detaches and drops partitions whose days are
+    older than `retention_days`, rolls up hours which ended at least `rollup_delay` seconds ago into
+    stats.webrtc_stats_rollups and deletes rollups older than `rollup_retention_days`.
+
+    Ingestion is never blocked: partitions are created as standalone tables and attached (which doesn't lock out
+    inserts into the parent), giving up after `lock_timeout` seconds until the next pass; expired ones are detached
+    concurrently. Stats of a day without a partition (passes stopped for longer than `premake_days`) have ingestion
+    create the partition, which is slower: run passes at least daily.
+
+    Config:
+        FLASK_STATS_RETENTION_DAYS, FLASK_STATS_ROLLUP_RETENTION_DAYS: days raw stats and rollups are kept for
+        FLASK_STATS_PARTITION_PREMAKE_DAYS: number of days partitions are created ahead
+        FLASK_STATS_ROLLUP_DELAY, FLASK_STATS_MAINTENANCE_LOCK_TIMEOUT: seconds
+    """
+
+    def __init__(self) -> None:
+        self.retention_days = 30
+        self.rollup_retention_days = 365
+        self.premake_days = 7
+        self.rollup_delay = 300.0
+        self.lock_timeout = 1.0
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.skipped = 0
+        self.last_run_duration = 0.0
+
+    def init_app(self, app: Flask) -> None:
+        self.retention_days = int(app.config.get("STATS_RETENTION_DAYS", self.retention_days))
+        self.rollup_retention_days = int(app.config.get("STATS_ROLLUP_RETENTION_DAYS", self.rollup_retention_days))
+        self.premake_days = int(app.config.get("STATS_PARTITION_PREMAKE_DAYS", self.premake_days))
+        self.rollup_delay = float(app.config.get("STATS_ROLLUP_DELAY", self.rollup_delay))
+        self.lock_timeout = float(app.config.get("STATS_MAINTENANCE_LOCK_TIMEOUT", self.lock_timeout))
+
+    def run(self) -> t.Optional[dict[str, t.Any]]:
+        """Runs a maintenance pass, returns what it did (None if another pass is running elsewhere)."""
+        with sqldb.engine.connect() as lock_conn:
+            locked = lock_conn.execute(text("SELECT pg_try_advisory_lock(:id)"), {"id": STATS_MAINTENANCE_LOCK_ID})
+            if not locked.scalar():
+                self.skipped += 1
+                return None
+            try:
+                started = time.monotonic()
+                now = self._now()
+                res = {
+                    "created": self.create_partitions(now.date()),
+                    "dropped": self.drop_expired_partitions(now.date()),
+                    "rolled_up": self.roll_up(now),
+                    "rollups_deleted": self.delete_expired_rollups(now),
+                }
+                with self._lock:
+                    self.runs += 1
+                    self.last_run_duration = time.monotonic() - started
+                return res
+            finally:
+                lock_conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": STATS_MAINTENANCE_LOCK_ID})
+                lock_conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"runs": self.runs, "skipped": self.skipped, "last_run_duration": self.last_run_duration}
+
+    @staticmethod
+    def _now() -> datetime.datetime:
+        return sqldb.session.execute(select(func.timezone("utc", func.now()))).scalar()  # pylint: disable=not-callable
+
+    @staticmethod
+    def partitions() -> dict[str, tuple[t.Optional[datetime.datetime], bool]]:
+        """Partitions of stats.webrtc_stats_logs: name -> (exclusive upper bound, whether a detach is pending)."""
+        res = {}
+        for name, bound, detach_pending in sqldb.session.execute(_PARTITIONS_SQL).all():
+            match = _PARTITION_UPPER_BOUND.search(bound)
+            res[name] = (datetime.datetime.fromisoformat(match[1]) if match else None, detach_pending)
+        sqldb.session.commit()
+        return res
+
+    def create_partitions(self, today: datetime.date) -> list[str]:
+        existing = self.partitions()
+        created = []
+        for i in range(self.premake_days + 1):
+            day = today + datetime.timedelta(days=i)
+            if partition_name(day) not in existing and self.create_partition(day):
+                created.append(partition_name(day))
+        return created
+
+    def create_partition(self, day: datetime.date) -> bool:
+        """Creates and attaches the partition of the day, returns False if it gave up waiting for a lock."""
+        name = partition_name(day)
+        start, end = day.isoformat(), (day + datetime.timedelta(days=1)).isoformat()
+        conn = sqldb.session.connection()
+        try:
+            conn.execute(text(f"SET LOCAL lock_timeout = '{int(self.lock_timeout * 1000)}ms'"))
+            conn.execute(text(f"CREATE TABLE stats.{name} (LIKE stats.webrtc_stats_logs INCLUDING DEFAULTS)"))
+            # attaching a table with a matching constraint skips the validation scan
+            bounds = f"CHECK (created >= '{start}' AND created < '{end}')"
+            conn.execute(text(f"ALTER TABLE stats.{name} ADD CONSTRAINT {name}_bounds {bounds}"))
+            conn.execute(
+                text(
+                    f"ALTER TABLE stats.webrtc_stats_logs ATTACH PARTITION stats.{name} "
+                    f"FOR VALUES FROM ('{start}') TO ('{end}')"
+                )
+            )
+            conn.execute(text(f"ALTER TABLE stats.{name} DROP CONSTRAINT {name}_bounds"))
+            sqldb.session.commit()
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            sqldb.session.rollback()
+            log.warning("stats partition %s was not created, retrying on the next pass: %s", name, e)
+            return False
+        log.info("stats partition %s created", name)
+        return True
+
+    def ensure_partition(self) -> bool:
+        """Creates the partition of the current day if missing, returns whether it exists."""
+        today = self._now().date()
+        sqldb.session.commit()
+        return partition_name(today) in self.partitions() or self.create_partition(today)
+
+    def drop_expired_partitions(self, today: datetime.date) -> list[str]:
+        cutoff = datetime.datetime.combine(today - datetime.timedelta(days=self.retention_days), datetime.time())
+        dropped = []
+        for name, (upper_bound, detach_pending) in self.partitions().items():
+            if upper_bound is None or upper_bound > cutoff:
+                continue
+            # CONCURRENTLY can't run in a transaction; an interrupted detach is finalized by the next pass
+            mode = "FINALIZE" if detach_pending else "CONCURRENTLY"
+            with sqldb.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                conn.execute(text(f"ALTER TABLE stats.webrtc_stats_logs DETACH PARTITION stats.{name} {mode}"))
+                conn.execute(text(f"DROP TABLE stats.{name}"))
+            log.info("stats partition %s dropped", name)
+            dropped.append(name)
+        return dropped
+
+    def roll_up(self, now: datetime.datetime) -> int:
+        """Rolls up hours not rolled up yet which ended `rollup_delay` seconds ago, returns the number of hours."""
+        end = (now - datetime.timedelta(seconds=self.rollup_delay)).replace(minute=0, second=0, microsecond=0)
+        last = sqldb.session.execute(select(func.max(WebRTCStatsRollupDAO.bucket))).scalar()
+        if last is not None:
+            start = last + datetime.timedelta(hours=1)
+        else:
+            # -infinity: rows of the legacy partition, without timestamp
+            first = sqldb.session.execute(
+                text("SELECT min(created) FROM stats.webrtc_stats_logs WHERE created > '-infinity'")
+            ).scalar()
+            if first is None:
+                return 0
+            start = first.replace(minute=0, second=0, microsecond=0)
+        start = max(start, end - datetime.timedelta(days=self.retention_days))
+        hours = 0
+        while start < end:
+            # an hour per transaction, so that rollups of a long backlog don't hold a snapshot for long
+            self.roll_up_hour(start)
+            start += datetime.timedelta(hours=1)
+            hours += 1
+        return hours
+
+    @staticmethod
+    def roll_up_hour(hour: datetime.datetime) -> None:
+        """(Re)computes the rollups of the hour starting at `hour`."""
+        sqldb.session.execute(_ROLLUP_SQL, {"start": hour, "end": hour + datetime.timedelta(hours=1)})
+        sqldb.session.commit()
+
+    def delete_expired_rollups(self, now: datetime.datetime) -> int:
+        cutoff = now - datetime.timedelta(days=self.rollup_retention_days)
+        stmt = delete(WebRTCStatsRollupDAO).where(WebRTCStatsRollupDAO.bucket < cutoff)
+        deleted = sqldb.session.execute(stmt).rowcount
+        sqldb.session.commit()
+        return deleted
+
+
+stats_maintenance = StatsMaintenance()
+
+
+def init_app(app: Flask) -> None:
+    stats_maintenance.init_app(app)
+
+    @app.cli.command("maintain-stats")
+    @click.option("--interval", default=0.0, help="Seconds between passes, runs a single pass if 0.")
+    def maintain_stats(interval: float) -> None:
+        """Create stats partitions ahead, drop expired ones and roll up stats."""
+        while True:
+            res = stats_maintenance.run()
+            click.echo(json.dumps({"maintenance": res, "stats": stats_maintenance.stats()}))
+            if interval <= 0:
+                return
+            time.sleep(interval)
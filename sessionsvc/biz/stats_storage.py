@@ -0,0 +1,198 @@
+import json
+import math
+import time
+import typing as t
+import zlib
+
+import click
+from flask import Flask
+from sqlalchemy import (
+    String,
+    cast,
+    select,
+    text,
+)
+
+from sessionsvc.biz.models import WebRTCStatsLogsDAO
+from sessionsvc.biz.sqldb import sqldb
+
+_INT4 = 2**31
+_INT8 = 2**63
+
+# typed columns of stats.webrtc_stats_logs: column -> (type, int range or max str length, fields the value is taken
+# from, the first one holding a value of the type wins)
+METRICS: dict[str, tuple[type, int, tuple[tuple[str, str], ...]]] = {
+    "rtt": (float, 0, (("remote_inbound_rtp", "round_trip_time"), ("candidate_pair", "currentRoundTripTime"))),
+    "jitter": (float, 0, (("inbound_rtp", "jitter"),)),
+    "packets_lost": (int, _INT4, (("inbound_rtp", "packetsLost"),)),
+    "frames_decoded": (int, _INT4, (("inbound_rtp", "framesDecoded"),)),
+    "frames_dropped": (int, _INT4, (("inbound_rtp", "framesDropped"),)),
+    "bytes_received": (int, _INT8, (("inbound_rtp", "bytesReceived"),)),
+    "codec": (str, 64, (("codec", "mimeType"),)),
+}
+
+# stats_extra is deflate with a preset dictionary of the usual field names: a submission's remainder is a few hundred
+# bytes, mostly keys, which plain deflate barely compresses. The leading byte is the format version (of the dictionary).
+_EXTRA_FORMAT = b"\x01"
+_EXTRA_ZDICT = (
+    b'{"outbound_rtp":{"bytesSent":,"packetsSent":,"retransmittedPacketsSent":,"framesEncoded":,"framesSent":,'
+    b'"qualityLimitationReason":"none","targetBitrate":,"totalEncodeTime":,"hugeFramesSent":,'
+    b'"codec":{"clockRate":90000,"payloadType":,"sdpFmtpLine":"","mimeType":"video/VP8","channels":},'
+    b'"candidate_pair":{"state":"succeeded","nominated":true,"availableOutgoingBitrate":,'
+    b'"availableIncomingBitrate":,"totalRoundTripTime":,"requestsSent":,"responsesReceived":,"bytesSent":,'
+    b'"bytesReceived":,"currentRoundTripTime":},'
+    b'"remote_inbound_rtp":{"fractionLost":,"packetsLost":,"roundTripTimeMeasurements":,"totalRoundTripTime":,'
+    b'"round_trip_time":,"jitter":},'
+    b'"inbound_rtp":{"kind":"video","frameWidth":1920,"frameHeight":1080,"framesPerSecond":60,"framesReceived":,'
+    b'"keyFramesDecoded":,"totalDecodeTime":,"totalInterFrameDelay":,"jitterBufferDelay":,"jitterBufferEmittedCount":,'
+    b'"totalProcessingDelay":,"freezeCount":,"pauseCount":,"totalFreezesDuration":,"headerBytesReceived":,'
+    b'"nackCount":,"pliCount":,"firCount":,"packetsReceived":,"packetsDiscarded":,"packetsLost":,"bytesReceived":,'
+    b'"framesDecoded":,"framesDropped":,"jitter":0.00'
+)
+
+
+def _typed(value: t.Any, kind: type, limit: int) -> t.Any:
+    """value if it fits the column, None otherwise."""
+    if isinstance(value, bool):
+        return None
+    if kind is float and isinstance(value, (int, float)) and math.isfinite(value):
+        return float(value)
+    if kind is int and isinstance(value, int) and -limit <= value < limit:
+        return value
+    if kind is str and isinstance(value, str) and len(value) <= limit:
+        return value
+    return None
+
+
+def split(stats: t.Any) -> tuple[dict[str, t.Any], t.Any]:
+    """Splits a stats submission into the values of the typed columns (None if missing or mistyped) and the fields
+    left, which are not modified in place."""
+    values: dict[str, t.Any] = dict.fromkeys(METRICS)
+    if not isinstance(stats, dict):
+        return values, stats
+    extra = {report: dict(fields) if isinstance(fields, dict) else fields for report, fields in stats.items()}
+    for column, (kind, limit, paths) in METRICS.items():
+        for report, field in paths:
+            fields = extra.get(report)
+            if not isinstance(fields, dict) or field not in fields:
+                continue
+            value = _typed(fields[field], kind, limit)
+            if value is not None:
+                values[column] = value
+                del fields[field]
+                if not fields:
+                    del extra[report]
+                break
+    return values, extra
+
+
+def encode_extra(extra: t.Any) -> bytes:
+    compressor = zlib.compressobj(wbits=-zlib.MAX_WBITS, zdict=_EXTRA_ZDICT)
+    data = json.dumps(extra, separators=(",", ":")).encode()
+    return _EXTRA_FORMAT + compressor.compress(data) + compressor.flush()
+
+
+def decode_extra(data: bytes) -> t.Any:
+    """Fields of a submission not stored in typed columns, from stats_extra."""
+    data = bytes(data)
+    if data[:1] != _EXTRA_FORMAT:
+        raise ValueError(f"unknown stats_extra format {data[:1]!r}")
+    decompressor = zlib.decompressobj(wbits=-zlib.MAX_WBITS, zdict=_EXTRA_ZDICT)
+    return json.loads(decompressor.decompress(data[1:]) + decompressor.flush())
+
+
+# a batch of converted rows in one statement, rows are matched by primary key; created goes through text, which keeps
+# the -infinity of legacy rows
+_CONVERT_SQL = text(
+    """
+    UPDATE stats.webrtc_stats_logs l SET
+        rtt = v.rtt,
+        jitter = v.jitter,
+        packets_lost = v.packets_lost,
+        frames_decoded = v.frames_decoded,
+        frames_dropped = v.frames_dropped,
+        bytes_received = v.bytes_received,
+        codec = v.codec,
+        stats_extra = v.stats_extra,
+        stats = NULL
+    FROM unnest(
+        CAST(:id AS BIGINT[]),
+        CAST(:created AS TIMESTAMP[]),
+        CAST(:rtt AS REAL[]),
+        CAST(:jitter AS REAL[]),
+        CAST(:packets_lost AS INTEGER[]),
+        CAST(:frames_decoded AS INTEGER[]),
+        CAST(:frames_dropped AS INTEGER[]),
+        CAST(:bytes_received AS BIGINT[]),
+        CAST(:codec AS VARCHAR[]),
+        CAST(:stats_extra AS BYTEA[])
+    ) AS v(id, created, rtt, jitter, packets_lost, frames_decoded, frames_dropped, bytes_received, codec, stats_extra)
+    WHERE l.id = v.id AND l.created = v.created
+    """
+)
+
+
+class StatsStorage:
+    """Stores stats submissions compactly: the metrics which are queried (see METRICS) in typed columns of
+    stats.webrtc_stats_logs, and the rest of the submission as compressed json in stats_extra, or not at all.
+
+    Config:
+        FLASK_STATS_KEEP_EXTRA: whether fields not stored in typed columns are kept (true by default)
+    """
+
+    def __init__(self) -> None:
+        self.keep_extra = True
+
+    def init_app(self, app: Flask) -> None:
+        self.keep_extra = str(app.config.get("STATS_KEEP_EXTRA", self.keep_extra)).lower() == "true"
+
+    def to_columns(self, stats: t.Any) -> dict[str, t.Any]:
+        """Column values of a submission's stats.webrtc_stats_logs row (except its identity columns)."""
+        values, extra = split(stats)
+        values["stats_extra"] = encode_extra(extra) if self.keep_extra and extra else None
+        return values
+
+    def convert(self, batch_size: int, pause: float = 0.0) -> t.Iterator[int]:
+        """Converts rows stored as a json stats blob to typed columns (and stats_extra) in batches of `batch_size`
+        rows, one transaction each, sleeping `pause` seconds between batches; yields the number of rows converted by
+        every batch."""
+        last_id = None
+        while True:
+            stmt = select(
+                WebRTCStatsLogsDAO.id, cast(WebRTCStatsLogsDAO.created, String), WebRTCStatsLogsDAO.stats
+            ).where(WebRTCStatsLogsDAO.stats.is_not(None))
+            if last_id is not None:
+                stmt = stmt.where(WebRTCStatsLogsDAO.id > last_id)
+            rows = sqldb.session.execute(stmt.order_by(WebRTCStatsLogsDAO.id).limit(batch_size)).all()
+            if not rows:
+                sqldb.session.commit()
+                return
+            params: dict[str, list] = {"id": [], "created": [], **{column: [] for column in METRICS}, "stats_extra": []}
+            for row_id, created, stats in rows:
+                params["id"].append(row_id)
+                params["created"].append(created)
+                for column, value in self.to_columns(stats).items():
+                    params[column].append(value)
+            sqldb.session.execute(_CONVERT_SQL, params)
+            sqldb.session.commit()
+            last_id = rows[-1][0]
+            yield len(rows)
+            if pause > 0:
+                time.sleep(pause)
+
+
+stats_storage = StatsStorage()
+
+
+def init_app(app: Flask) -> None:
+    stats_storage.init_app(app)
+
+    @app.cli.command("convert-stats")
+    @click.option("--batch-size", default=1000, help="Rows converted per transaction.")
+    @click.option("--pause", default=0.0, help="Seconds between batches.")
+    def convert_stats(batch_size: int, pause: float) -> None:
+        """Convert stats submitted before typed columns were introduced."""
+        started, converted = time.monotonic(), 0
+        for batch in stats_storage.convert(batch_size, pause):
+            converted += batch
+            click.echo(json.dumps({"converted": converted, "duration": time.monotonic() - started}))
@@ -0,0 +1,197 @@
+import contextlib
+import functools
+import random
+import threading
+import typing as t
+from collections import OrderedDict
+
+from flask import (
+    Flask,
+    Response,
+    g,
+    request,
+)
+from opentelemetry import (
+    context,
+    propagate,
+    trace,
+)
+from opentelemetry.sdk.trace import (
+    ReadableSpan,
+    SpanProcessor,
+)
+from opentelemetry.trace import (
+    SpanKind,
+    Status,
+    StatusCode,
+)
+from sqlalchemy import (
+    Engine,
+    event,
+)
+
+# spans are only recorded once a TracerProvider is set up (see runtime/conf/gunicorn.config.py), otherwise all
+# instrumentation below is a cheap no-op; head sampling is configured through the standard OTEL_TRACES_SAMPLER and
+# OTEL_TRACES_SAMPLER_ARG env vars, tail sampling with TailSamplingSpanProcessor
+tracer = trace.get_tracer("sessionsvc")
+
+F = t.TypeVar("F", bound=t.Callable[..., t.Any])
+
+
+def traced(func: F) -> F:
+    """Runs func inside a `<module>.<func>` span, e.g. `session.create_session`."""
+    name = f"{func.__module__.rsplit('.', 1)[-1]}.{func.__name__}"
+
+    @functools.wraps(func)
+    def wrapper(*args: t.Any, **kwargs: t.Any) -> t.Any:
+        with tracer.start_as_current_span(name):
+            return func(*args, **kwargs)
+
+    return t.cast(F, wrapper)
+
+
+def with_current_context(func: F) -> F:
+    """Binds func to the caller's trace context, so spans it creates in another thread join the caller's trace."""
+    ctx = context.get_current()
+
+    @functools.wraps(func)
+    def wrapper(*args: t.Any, **kwargs: t.Any) -> t.Any:
+        token = context.attach(ctx)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            context.detach(token)
+
+    return t.cast(F, wrapper)
+
+
+@contextlib.contextmanager
+def client_span(name: str, headers: dict[str, str], attributes: dict[str, t.Any]) -> t.Iterator[trace.Span]:
+    """Runs an outgoing call inside a client span, injecting its W3C trace context (traceparent) into `headers`."""
+    with tracer.start_as_current_span(name, kind=SpanKind.CLIENT, attributes=attributes) as span:
+        propagate.inject(headers)
+        yield span
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_statement_span(
+    conn: t.Any, cursor: t.Any, statement: str, *args: t.Any  # pylint: disable=unused-argument
+) -> None:
+    if not trace.get_current_span().is_recording():
+        return
+    words = statement[:16].split(None, 1)
+    operation = words[0].upper() if words else "SQL"
+    span = tracer.start_span(
+        operation,
+        kind=SpanKind.CLIENT,
+        attributes={"db.system": "postgresql", "db.operation": operation, "db.statement": statement},
+    )
+    conn.info.setdefault("otel_spans", []).append(span)
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _end_statement_span(conn: t.Any, *args: t.Any) -> None:  # pylint: disable=unused-argument
+    if conn.info.get("otel_spans"):
+        conn.info["otel_spans"].pop().end()
+
+
+@event.listens_for(Engine, "handle_error")
+def _fail_statement_span(exception_context: t.Any) -> None:
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("otel_spans"):
+        span = conn.info["otel_spans"].pop()
+        span.record_exception(exception_context.original_exception)
+        span.set_status(Status(StatusCode.ERROR))
+        span.end()
+
+
+class TailSamplingSpanProcessor(SpanProcessor):
+    """Buffers spans of a trace until its local root span ends, then passes the whole trace on to `processor` only if
+    it's worth keeping: failed, slower than `latency_threshold` seconds or picked at random with `ratio`.
+
+    Runs after head sampling (only head-sampled traces reach it). At most `max_traces` traces are buffered, spans
+    ending after their local root (e.g. of background jobs) stay buffered until evicted and are never exported.
+    """
+
+    def __init__(
+        self, processor: SpanProcessor, latency_threshold: float, ratio: float = 0.0, max_traces: int = 10000
+    ) -> None:
+        self._processor = processor
+        self.latency_threshold = latency_threshold
+        self.ratio = ratio
+        self.max_traces = max_traces
+        self._traces: OrderedDict[int, list[ReadableSpan]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.kept = 0
+        self.dropped = 0
+
+    def on_start(self, span: t.Any, parent_context: t.Optional[context.Context] = None) -> None:
+        self._processor.on_start(span, parent_context)
+
+    def on_end(self, span: ReadableSpan) -> None:
+        trace_id = span.context.trace_id
+        is_local_root = span.parent is None or span.parent.is_remote
+        with self._lock:
+            spans = self._traces.setdefault(trace_id, [])
+            spans.append(span)
+            if not is_local_root:
+                if len(self._traces) > self.max_traces:
+                    self._traces.popitem(last=False)
+                    self.dropped += 1
+                return
+            del self._traces[trace_id]
+        if self._keep(span, spans):
+            self.kept += 1
+            for s in spans:
+                self._processor.on_end(s)
+        else:
+            self.dropped += 1
+
+    def _keep(self, root: ReadableSpan, spans: list[ReadableSpan]) -> bool:
+        if any(s.status.status_code == StatusCode.ERROR for s in spans):
+            return True
+        if (root.end_time - root.start_time) / 1e9 >= self.latency_threshold:
+            return True
+        # sampling decision, not security sensitive
+        return random.random() < self.ratio  # nosec B311
+
+    def shutdown(self) -> None:
+        self._processor.shutdown()
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return self._processor.force_flush(timeout_millis)
+
+
+def init_app(app: Flask) -> None:
+    """Traces every request as a server span, continuing the caller's W3C trace context if any."""
+
+    @app.before_request
+    def start_request_span() -> None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        span = tracer.start_span(
+            f"{request.method} {route}",
+            context=propagate.extract(request.headers),
+            kind=SpanKind.SERVER,
+            attributes={"http.request.method": request.method, "http.route": route, "url.path": request.path},
+        )
+        g.otel_span = span
+        g.otel_token = context.attach(trace.set_span_in_context(span))
+
+    @app.after_request
+    def set_response_status(response: Response) -> Response:
+        if "otel_span" in g:
+            g.otel_span.set_attribute("http.response.status_code", response.status_code)
+            if response.status_code >= 500:
+                g.otel_span.set_status(Status(StatusCode.ERROR))
+        return response
+
+    @app.teardown_request
+    def end_request_span(exc: t.Optional[BaseException]) -> None:
+        if "otel_span" not in g:
+            return
+        if exc is not None:
+            g.otel_span.record_exception(exc)
+            g.otel_span.set_status(Status(StatusCode.ERROR))
+        g.otel_span.end()
+        context.detach(g.pop("otel_token"))
+        g.pop("otel_span")
@@ -0,0 +1,51 @@
+-- schemas and tables which predate the service-owned migrations (no-op on an existing database)
+
+CREATE SCHEMA IF NOT EXISTS sessions;
+CREATE SCHEMA IF NOT EXISTS stats;
+
+CREATE TABLE IF NOT EXISTS sessions.sessions (
+    id VARCHAR PRIMARY KEY,
+    app_release_uuid VARCHAR NOT NULL,
+    container JSONB,
+    status VARCHAR NOT NULL,
+    updated TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'utc'),
+    user_id BIGINT NOT NULL UNIQUE,
+    ws_conn JSONB NOT NULL
+);
+
+CREATE OR REPLACE FUNCTION sessions.sessions_set_updated() RETURNS trigger AS $$
+BEGIN
+    NEW.updated := now() AT TIME ZONE 'utc';
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS sessions_set_updated ON sessions.sessions;
+CREATE TRIGGER sessions_set_updated
+    BEFORE UPDATE ON sessions.sessions
+    FOR EACH ROW EXECUTE FUNCTION sessions.sessions_set_updated();
+
+CREATE TABLE IF NOT EXISTS sessions.sessions_logs (
+    id BIGSERIAL PRIMARY KEY,
+    app_release_uuid VARCHAR NOT NULL,
+    container JSONB,
+    session_id VARCHAR NOT NULL,
+    status VARCHAR NOT NULL,
+    user_id BIGINT NOT NULL,
+    ws_conn JSONB NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS stats.webrtc_stats_logs (
+    id BIGSERIAL PRIMARY KEY,
+    app_release_uuid VARCHAR NOT NULL,
+    region VARCHAR NOT NULL,
+    session_id VARCHAR NOT NULL,
+    stats JSONB,
+    user_id BIGINT
+);
+
+CREATE TABLE IF NOT EXISTS stats.users_dcs (
+    id BIGSERIAL PRIMARY KEY,
+    dcs JSONB,
+    user_id BIGINT
+);
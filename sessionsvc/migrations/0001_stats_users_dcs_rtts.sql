@@ -0,0 +1,53 @@
+-- streaming rtt aggregates per user and region (replaces raw rtt lists in stats.users_dcs.dcs)
+-- hist bucket bounds: sessionsvc.biz.rtt.RTT_BUCKETS
+
+CREATE TABLE IF NOT EXISTS stats.users_dcs_rtts (
+    id BIGSERIAL PRIMARY KEY,
+    ewma DOUBLE PRECISION NOT NULL,
+    hist INTEGER[] NOT NULL,
+    min_rtt DOUBLE PRECISION NOT NULL,
+    region VARCHAR NOT NULL,
+    samples BIGINT NOT NULL,
+    updated TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'utc'),
+    user_id BIGINT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS users_dcs_rtts_user_id_idx ON stats.users_dcs_rtts (user_id);
+
+-- backfill from the legacy per-region rtt lists (ewma is seeded with the average of the list)
+WITH rtts AS (
+    SELECT d.user_id, e.key AS region, v.rtt::DOUBLE PRECISION AS rtt
+    FROM stats.users_dcs d
+    CROSS JOIN LATERAL jsonb_each(d.dcs) e
+    CROSS JOIN LATERAL jsonb_array_elements_text(e.value) v(rtt)
+    WHERE d.user_id IS NOT NULL AND jsonb_typeof(e.value) = 'array'
+),
+aggs AS (
+    SELECT user_id, region, avg(rtt) AS ewma, min(rtt) AS min_rtt, count(*) AS samples
+    FROM rtts
+    GROUP BY user_id, region
+),
+buckets AS (
+    SELECT
+        user_id,
+        region,
+        -- 1-based bucket as in sessionsvc.biz.rtt.bucket_index: bounds are inclusive upper bounds, values above the
+        -- last but one go into the last bucket
+        1 + (SELECT count(*) FROM unnest(ARRAY[0.005, 0.006248, 0.007808, 0.009756, 0.012192, 0.015235, 0.019038, 0.02379, 0.029728, 0.037148, 0.046421, 0.058008, 0.072487, 0.09058, 0.11319, 0.141443, 0.176749, 0.220867, 0.275998, 0.344889, 0.430977, 0.538553, 0.67298, 0.840962, 1.050874, 1.313182, 1.640964, 2.050564, 2.562403, 3.202002, 4.001251]::DOUBLE PRECISION[]) b(bound) WHERE b.bound < rtt)::INTEGER AS idx,
+        count(*)::INTEGER AS cnt
+    FROM rtts
+    GROUP BY 1, 2, 3
+)
+INSERT INTO stats.users_dcs_rtts (ewma, hist, min_rtt, region, samples, user_id)
+SELECT
+    a.ewma,
+    array_agg(coalesce(b.cnt, 0) ORDER BY i.idx),
+    a.min_rtt,
+    a.region,
+    a.samples,
+    a.user_id
+FROM aggs a
+CROSS JOIN generate_series(1, 32) i(idx)
+LEFT JOIN buckets b ON b.user_id = a.user_id AND b.region = a.region AND b.idx = i.idx
+WHERE NOT EXISTS (SELECT 1 FROM stats.users_dcs_rtts x WHERE x.user_id = a.user_id AND x.region = a.region)
+GROUP BY a.user_id, a.region, a.ewma, a.min_rtt, a.samples;
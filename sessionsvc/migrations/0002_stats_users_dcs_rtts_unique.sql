@@ -0,0 +1,47 @@
+-- one rtt aggregate per user and region, required by the INSERT ... ON CONFLICT upsert in sessionsvc.biz.stats
+
+-- merge duplicates created by concurrent first-time submissions into the oldest row
+UPDATE stats.users_dcs_rtts k
+SET
+    ewma = m.ewma,
+    hist = m.hist,
+    min_rtt = m.min_rtt,
+    samples = m.samples
+FROM (
+    SELECT
+        r.user_id,
+        r.region,
+        min(r.id) AS keep_id,
+        avg(r.ewma) AS ewma,
+        (
+            SELECT array_agg(h.cnt ORDER BY h.idx)
+            FROM (
+                SELECT e.idx, sum(e.cnt)::INTEGER AS cnt
+                FROM stats.users_dcs_rtts x
+                CROSS JOIN LATERAL unnest(x.hist) WITH ORDINALITY e(cnt, idx)
+                WHERE x.user_id = r.user_id AND x.region = r.region
+                GROUP BY e.idx
+            ) h
+        ) AS hist,
+        min(r.min_rtt) AS min_rtt,
+        sum(r.samples) AS samples
+    FROM stats.users_dcs_rtts r
+    GROUP BY r.user_id, r.region
+    HAVING count(*) > 1
+) m
+WHERE k.id = m.keep_id;
+
+DELETE FROM stats.users_dcs_rtts d
+USING stats.users_dcs_rtts k
+WHERE d.user_id = k.user_id AND d.region = k.region AND d.id > k.id;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'users_dcs_rtts_user_id_region_key') THEN
+        ALTER TABLE stats.users_dcs_rtts ADD CONSTRAINT users_dcs_rtts_user_id_region_key UNIQUE (user_id, region);
+    END IF;
+END;
+$$;
+
+-- superseded by the unique index (user_id is its leading column)
+DROP INDEX IF EXISTS stats.users_dcs_rtts_user_id_idx;
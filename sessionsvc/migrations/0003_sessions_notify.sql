@@ -0,0 +1,29 @@
+-- notify listeners (session cache invalidation in every sessionsvc worker) about any sessions.sessions change
+
+CREATE OR REPLACE FUNCTION sessions.sessions_notify() RETURNS trigger AS $$
+DECLARE
+    r sessions.sessions;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        r := OLD;
+    ELSE
+        r := NEW;
+    END IF;
+    PERFORM pg_notify(
+        'sessions_sessions',
+        json_build_object(
+            'op', lower(TG_OP),
+            'id', r.id,
+            'status', CASE WHEN TG_OP = 'DELETE' THEN 'closed' ELSE r.status END,
+            'user_id', r.user_id,
+            'consumer_id', r.ws_conn->>'consumer_id'
+        )::text
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS sessions_notify ON sessions.sessions;
+CREATE TRIGGER sessions_notify
+    AFTER INSERT OR UPDATE OR DELETE ON sessions.sessions
+    FOR EACH ROW EXECUTE FUNCTION sessions.sessions_notify();
@@ -0,0 +1,18 @@
+-- no-transaction
+-- indexes for signaling lookups (sessionsvc.biz.session: get_consumer_sessions, get_producer_sessions),
+-- node/region drains and session history; expressions must match the ones generated by the SessionDAO queries
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS sessions_ws_conn_consumer_id_idx
+    ON sessions.sessions ((ws_conn ->> 'consumer_id'));
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS sessions_ws_conn_producer_id_idx
+    ON sessions.sessions ((ws_conn ->> 'producer_id'));
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS sessions_container_node_id_idx
+    ON sessions.sessions ((container ->> 'node_id'));
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS sessions_container_region_idx
+    ON sessions.sessions ((container ->> 'region'));
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS sessions_logs_session_id_idx
+    ON sessions.sessions_logs (session_id);
@@ -0,0 +1,4 @@
+-- sessions.sessions_logs becomes the session audit trail (sessionsvc.biz.audit): operation and event time columns
+
+ALTER TABLE sessions.sessions_logs ADD COLUMN IF NOT EXISTS op VARCHAR;
+ALTER TABLE sessions.sessions_logs ADD COLUMN IF NOT EXISTS created TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'utc');
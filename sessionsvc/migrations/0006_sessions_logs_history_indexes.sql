@@ -0,0 +1,11 @@
+-- no-transaction
+-- keyset pagination of the session and user history (sessionsvc.biz.audit: get_session_history, get_user_history),
+-- (session_id, id) supersedes the single column session_id index
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS sessions_logs_session_id_id_idx
+    ON sessions.sessions_logs (session_id, id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS sessions_logs_user_id_id_idx
+    ON sessions.sessions_logs (user_id, id);
+
+DROP INDEX CONCURRENTLY IF EXISTS sessions.sessions_logs_session_id_idx;
@@ -0,0 +1,5 @@
+-- no-transaction
+-- expired sessions lookup of the session reaper (sessionsvc.biz.reaper)
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS sessions_status_updated_idx
+    ON sessions.sessions (status, updated);
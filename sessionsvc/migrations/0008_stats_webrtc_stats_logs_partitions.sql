@@ -0,0 +1,109 @@
+-- no-transaction
+-- stats.webrtc_stats_logs becomes partitioned by day on the new ingestion timestamp and rolled up hourly per session
+-- into stats.webrtc_stats_rollups; partitions are created ahead and dropped once expired by
+-- sessionsvc.biz.stats_maintenance. Rows ingested before have no timestamp: they are kept as the
+-- webrtc_stats_logs_legacy partition (created is -infinity, they are not rolled up), which expires with the retention
+-- window counted from this migration.
+--
+-- The legacy rows are checked to fit the partition (CHECK constraint validated in its own transaction, without
+-- blocking writes) before the table is renamed, so attaching it doesn't scan it under an ACCESS EXCLUSIVE lock.
+
+ALTER TABLE stats.webrtc_stats_logs ADD COLUMN IF NOT EXISTS created TIMESTAMP NOT NULL DEFAULT '-infinity';
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'stats.webrtc_stats_logs'::regclass)
+        AND NOT EXISTS (
+            SELECT 1 FROM pg_constraint
+            WHERE conrelid = 'stats.webrtc_stats_logs'::regclass AND conname = 'webrtc_stats_logs_legacy_created_check'
+        )
+    THEN
+        -- the partition's upper bound is today when attached, which is never earlier
+        EXECUTE format(
+            'ALTER TABLE stats.webrtc_stats_logs ADD CONSTRAINT webrtc_stats_logs_legacy_created_check '
+            'CHECK (created < %L) NOT VALID',
+            date_trunc('day', now() AT TIME ZONE 'utc')
+        );
+    END IF;
+END $$;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'stats.webrtc_stats_logs'::regclass) THEN
+        ALTER TABLE stats.webrtc_stats_logs VALIDATE CONSTRAINT webrtc_stats_logs_legacy_created_check;
+    END IF;
+END $$;
+
+-- indexes of the partitioned table, built ahead on the legacy rows for the same reason
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS webrtc_stats_logs_legacy_pkey ON stats.webrtc_stats_logs (id, created);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS webrtc_stats_logs_legacy_created_idx ON stats.webrtc_stats_logs (created);
+
+DO $$
+DECLARE
+    today TIMESTAMP := date_trunc('day', now() AT TIME ZONE 'utc');
+    day TIMESTAMP;
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'stats.webrtc_stats_logs'::regclass) THEN
+        RETURN;
+    END IF;
+
+    ALTER TABLE stats.webrtc_stats_logs RENAME TO webrtc_stats_logs_legacy;
+    -- replaced by the (id, created) key of the partitioned table
+    ALTER TABLE stats.webrtc_stats_logs_legacy DROP CONSTRAINT webrtc_stats_logs_pkey;
+    ALTER TABLE stats.webrtc_stats_logs_legacy
+        ADD CONSTRAINT webrtc_stats_logs_legacy_pkey PRIMARY KEY USING INDEX webrtc_stats_logs_legacy_pkey;
+
+    CREATE TABLE stats.webrtc_stats_logs (
+        id BIGINT NOT NULL DEFAULT nextval('stats.webrtc_stats_logs_id_seq'),
+        app_release_uuid VARCHAR NOT NULL,
+        created TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'utc'),
+        region VARCHAR NOT NULL,
+        session_id VARCHAR NOT NULL,
+        stats JSONB,
+        user_id BIGINT,
+        PRIMARY KEY (id, created)
+    ) PARTITION BY RANGE (created);
+    -- the sequence must outlive the legacy partition
+    ALTER SEQUENCE stats.webrtc_stats_logs_id_seq OWNED BY stats.webrtc_stats_logs.id;
+    CREATE INDEX webrtc_stats_logs_created_idx ON stats.webrtc_stats_logs (created);
+
+    EXECUTE format(
+        'ALTER TABLE stats.webrtc_stats_logs ATTACH PARTITION stats.webrtc_stats_logs_legacy '
+        'FOR VALUES FROM (MINVALUE) TO (%L)',
+        today
+    );
+    -- a week ahead, stats_maintenance keeps creating them
+    FOR i IN 0..7 LOOP
+        day := today + make_interval(days => i);
+        EXECUTE format(
+            'CREATE TABLE stats.%I PARTITION OF stats.webrtc_stats_logs FOR VALUES FROM (%L) TO (%L)',
+            'webrtc_stats_logs_p' || to_char(day, 'YYYYMMDD'),
+            day,
+            day + interval '1 day'
+        );
+    END LOOP;
+END $$;
+
+CREATE TABLE IF NOT EXISTS stats.webrtc_stats_rollups (
+    bucket TIMESTAMP NOT NULL,  -- start of the hour
+    session_id VARCHAR NOT NULL,
+    app_release_uuid VARCHAR NOT NULL,
+    region VARCHAR NOT NULL,
+    user_id BIGINT,
+    samples INTEGER NOT NULL,
+    -- seconds
+    rtt_avg DOUBLE PRECISION,
+    rtt_p95 DOUBLE PRECISION,
+    rtt_max DOUBLE PRECISION,
+    jitter_avg DOUBLE PRECISION,
+    jitter_max DOUBLE PRECISION,
+    -- increase of the cumulative inbound packetsLost counter within the hour
+    packets_lost BIGINT,
+    -- inbound bits per second, from the increase of the cumulative bytesReceived counter
+    bitrate_avg DOUBLE PRECISION,
+    PRIMARY KEY (bucket, session_id)
+);
+
+CREATE INDEX IF NOT EXISTS webrtc_stats_rollups_region_bucket_idx ON stats.webrtc_stats_rollups (region, bucket);
+CREATE INDEX IF NOT EXISTS webrtc_stats_rollups_app_release_uuid_bucket_idx
+    ON stats.webrtc_stats_rollups (app_release_uuid, bucket);
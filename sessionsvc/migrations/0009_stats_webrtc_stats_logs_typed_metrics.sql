@@ -0,0 +1,12 @@
+-- Metrics of stats submissions are stored in typed columns (see sessionsvc.biz.stats_storage), the rest of a submission
+-- is optionally kept as compressed json in stats_extra. stats only holds submissions stored before, until they are
+-- converted by `flask convert-stats`. Nullable columns without default: no rewrite of the existing partitions.
+ALTER TABLE stats.webrtc_stats_logs
+    ADD COLUMN IF NOT EXISTS rtt REAL,  -- seconds
+    ADD COLUMN IF NOT EXISTS jitter REAL,  -- seconds
+    ADD COLUMN IF NOT EXISTS packets_lost INTEGER,  -- cumulative
+    ADD COLUMN IF NOT EXISTS frames_decoded INTEGER,  -- cumulative
+    ADD COLUMN IF NOT EXISTS frames_dropped INTEGER,  -- cumulative
+    ADD COLUMN IF NOT EXISTS bytes_received BIGINT,  -- cumulative
+    ADD COLUMN IF NOT EXISTS codec VARCHAR,
+    ADD COLUMN IF NOT EXISTS stats_extra BYTEA;
@@ -0,0 +1,85 @@
+import logging
+from pathlib import Path
+
+import click
+from flask import Flask
+from sqlalchemy import (
+    Engine,
+    text,
+)
+
+from sessionsvc.biz.sqldb import sqldb
+
+log = logging.getLogger("sessionsvc")
+
+MIGRATIONS_DIR = Path(__file__).parent
+# first line marker for migrations which can't run inside a transaction (e.g. CREATE INDEX CONCURRENTLY)
+NO_TRANSACTION_MARKER = "-- no-transaction"
+# serializes concurrent upgrades started by several pods
+ADVISORY_LOCK_ID = 0x5E551075
+
+
+def list_migrations() -> list[Path]:
+    return sorted(MIGRATIONS_DIR.glob("*.sql"))
+
+
+def _split_statements(sql: str) -> list[str]:
+    statements, cur, in_body = [], [], False
+    for line in sql.splitlines():
+        cur.append(line)
+        # statements inside a dollar-quoted body (e.g. of a DO block) belong to the enclosing one
+        if line.count("$$") % 2:
+            in_body = not in_body
+        if not in_body and line.rstrip().endswith(";"):
+            statements.append("\n".join(cur))
+            cur = []
+    return [s for s in statements if s.strip()]
+
+
+def upgrade(engine: Engine) -> list[str]:
+    """Applies pending migrations in the filename order, returns versions applied."""
+    applied_now = []
+    with engine.connect() as lock_conn:
+        lock_conn.execute(text("SELECT pg_advisory_lock(:id)"), {"id": ADVISORY_LOCK_ID})
+        try:
+            with engine.begin() as conn:
+                conn.execute(text("CREATE SCHEMA IF NOT EXISTS sessions"))
+                conn.execute(
+                    text(
+                        "CREATE TABLE IF NOT EXISTS sessions.schema_migrations "
+                        "(version VARCHAR PRIMARY KEY, applied TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'utc'))"
+                    )
+                )
+                applied = set(conn.execute(text("SELECT version FROM sessions.schema_migrations")).scalars())
+            for path in list_migrations():
+                version = path.stem
+                if version in applied:
+                    continue
+                log.info("applying migration %s", version)
+                sql = path.read_text()
+                if sql.startswith(NO_TRANSACTION_MARKER):
+                    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                        for statement in _split_statements(sql):
+                            conn.connection.cursor().execute(statement)
+                        conn.execute(
+                            text("INSERT INTO sessions.schema_migrations (version) VALUES (:v)"), {"v": version}
+                        )
+                else:
+                    with engine.begin() as conn:
+                        conn.connection.cursor().execute(sql)
+                        conn.execute(
+                            text("INSERT INTO sessions.schema_migrations (version) VALUES (:v)"), {"v": version}
+                        )
+                applied_now.append(version)
+        finally:
+            lock_conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": ADVISORY_LOCK_ID})
+            lock_conn.commit()
+    return applied_now
+
+
+def init_app(app: Flask) -> None:
+    @app.cli.command("db-upgrade")
+    def db_upgrade() -> None:
+        """Apply pending sessions/stats schema migrations."""
+        applied = upgrade(sqldb.engine)
+        click.echo(f"applied migrations: {', '.join(applied) or 'none'}")
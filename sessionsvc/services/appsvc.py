@@ -1,8 +1,21 @@
 import json
 import logging
 import os
+import time
 
-from sessionsvc.biz.errors import AppSvcException
+import requests
+from flask import Flask
+
+from sessionsvc.biz import (
+    metrics,
+    tracing,
+)
+from sessionsvc.biz.errors import (
+    AppSvcBusyException,
+    AppSvcException,
+    AppSvcUnavailableException,
+)
+from sessionsvc.biz.serialization import get_schema
 from sessionsvc.services.dto.appsvc import (
     PauseAppRequestDTO,
     ResumeAppRequestDTO,
@@ -10,82 +23,136 @@ from sessionsvc.services.dto.appsvc import (
     RunAppResponseDTO,
     StopAppRequestDTO,
 )
-from sessionsvc.services.helpers import get_http_client_session
+from sessionsvc.services.helpers import (
+    Bulkhead,
+    CircuitBreaker,
+    OpStats,
+    PooledHttpClient,
+)
+
+# set by init_app, so that the module can be imported (e.g. by tools and benchmarks) without the env var
+APPSVC_URL = ""
+# max keep-alive connections per worker, should match the number of gunicorn threads
+APPSVC_POOL_SIZE = int(os.environ.get("APPSVC_POOL_SIZE", 10))
+APPSVC_CONNECT_TIMEOUT = float(os.environ.get("APPSVC_CONNECT_TIMEOUT", 3))
+APPSVC_OPS = ("run", "pause", "resume", "stop")
+
+
+def _op_config(name: str, defaults: dict[str, float]) -> dict[str, float]:
+    return {op: float(os.environ.get(f"APPSVC_{op.upper()}_{name}", defaults[op])) for op in APPSVC_OPS}
+
 
-APPSVC_URL = os.environ["APPSVC_URL"]
-REQUESTS_TIMEOUT_CONN_READ = (3, 10)
+# per-operation read timeouts (seconds)
+REQUESTS_TIMEOUTS = {
+    op: (APPSVC_CONNECT_TIMEOUT, timeout)
+    for op, timeout in _op_config("TIMEOUT", {"run": 55, "pause": 10, "resume": 10, "stop": 10}).items()
+}
+# calls slower than this (seconds) count as failures for the circuit breaker
+SLOW_CALL_THRESHOLDS = _op_config("SLOW_CALL", {"run": 30, "pause": 5, "resume": 5, "stop": 5})
+# bulkheads: max concurrent calls per operation and worker, so slow run calls can't starve stop calls
+MAX_CONCURRENCY = _op_config("MAX_CONCURRENCY", {"run": 6, "pause": 4, "resume": 4, "stop": 4})
 
 log = logging.getLogger("sessionsvc.appsvc")
 
+http_client = PooledHttpClient(pool_maxsize=APPSVC_POOL_SIZE)
+op_stats = OpStats()
+breakers = {
+    op: CircuitBreaker(
+        window=int(os.environ.get("APPSVC_BREAKER_WINDOW", 20)),
+        min_calls=int(os.environ.get("APPSVC_BREAKER_MIN_CALLS", 10)),
+        failure_rate=float(os.environ.get("APPSVC_BREAKER_FAILURE_RATE", 0.5)),
+        open_duration=float(os.environ.get("APPSVC_BREAKER_OPEN_DURATION", 30)),
+    )
+    for op in APPSVC_OPS
+}
+bulkheads = {
+    op: Bulkhead(int(MAX_CONCURRENCY[op]), wait=float(os.environ.get("APPSVC_BULKHEAD_WAIT", 0.1))) for op in APPSVC_OPS
+}
+
+
+def init_app(app: Flask) -> None:  # pylint: disable=unused-argument
+    """Reads APPSVC_URL, fails the app creation if it's not set."""
+    global APPSVC_URL  # pylint: disable=global-statement
+    APPSVC_URL = os.environ.get("APPSVC_URL", "")
+    if not APPSVC_URL:
+        raise RuntimeError("APPSVC_URL env var is not set")
+
+
+def _post(op: str, data: dict) -> requests.Response:
+    headers = {"Content-Type": "application/json"}
+    url = f"{APPSVC_URL}/apps/{op}"
+    with tracing.client_span(f"appsvc.{op}", headers, {"http.request.method": "POST", "url.full": url}) as span:
+        res = _post_guarded(op, url, data, headers)
+        span.set_attribute("http.response.status_code", res.status_code)
+        return res
+
+
+def _post_guarded(op: str, url: str, data: dict, headers: dict[str, str]) -> requests.Response:
+    bulkhead, breaker = bulkheads[op], breakers[op]
+    if not bulkhead.acquire():
+        log.warning("appsvc %s call rejected: bulkhead is full", op)
+        metrics.appsvc_errors.labels(op, "busy").inc()
+        raise AppSvcBusyException()
+    try:
+        if not breaker.allow():
+            log.warning("appsvc %s call rejected: circuit is open", op)
+            metrics.appsvc_errors.labels(op, "unavailable").inc()
+            raise AppSvcUnavailableException()
+        start = time.perf_counter()
+        failed = True
+        try:
+            with op_stats.timed(op):
+                res = http_client.session().post(
+                    url=url,
+                    data=json.dumps(data),
+                    headers=headers,
+                    timeout=REQUESTS_TIMEOUTS[op],
+                )
+                # 4xx responses are appsvc business errors, they don't indicate appsvc degradation
+                failed = res.status_code >= 500
+                if res.status_code != 200:
+                    raise AppSvcException(res.text)
+                return res
+        except Exception as e:
+            log.exception(e)
+            if isinstance(e, AppSvcException):
+                metrics.appsvc_errors.labels(op, "http").inc()
+                raise e
+            metrics.appsvc_errors.labels(op, "exception").inc()
+            raise AppSvcException from e
+        finally:
+            elapsed = time.perf_counter() - start
+            metrics.appsvc_request_duration.labels(op).observe(elapsed)
+            breaker.record(failed or elapsed >= SLOW_CALL_THRESHOLDS[op])
+    finally:
+        bulkhead.release()
+
 
 def run_app(req: RunAppRequestDTO) -> RunAppResponseDTO:
-    s = get_http_client_session()
+    res = _post("run", get_schema(RunAppRequestDTO).dump(req))
     try:
-        res = s.post(
-            url=f"{APPSVC_URL}/apps/run",
-            data=json.dumps(RunAppRequestDTO.Schema().dump(req)),
-            headers={"Content-Type": "application/json"},
-            timeout=(3, 55),
-        )
-        if res.status_code != 200:
-            raise AppSvcException(res.text)
-        return RunAppResponseDTO.Schema().load(data=res.json())
+        return get_schema(RunAppResponseDTO).load(data=res.json())
     except Exception as e:
         log.exception(e)
-        if isinstance(e, AppSvcException):
-            raise e
         raise AppSvcException from e
 
 
 def pause_app(req: PauseAppRequestDTO) -> None:
-    s = get_http_client_session()
-    try:
-        res = s.post(
-            url=f"{APPSVC_URL}/apps/pause",
-            data=json.dumps(PauseAppRequestDTO.Schema().dump(req)),
-            headers={"Content-Type": "application/json"},
-            timeout=REQUESTS_TIMEOUT_CONN_READ,
-        )
-        if res.status_code != 200:
-            raise AppSvcException(res.text)
-    except Exception as e:
-        log.exception(e)
-        if isinstance(e, AppSvcException):
-            raise e
-        raise AppSvcException from e
+    _post("pause", get_schema(PauseAppRequestDTO).dump(req))
 
 
 def resume_app(req: ResumeAppRequestDTO) -> None:
-    s = get_http_client_session()
-    try:
-        res = s.post(
-            url=f"{APPSVC_URL}/apps/resume",
-            data=json.dumps(ResumeAppRequestDTO.Schema().dump(req)),
-            headers={"Content-Type": "application/json"},
-            timeout=REQUESTS_TIMEOUT_CONN_READ,
-        )
-        if res.status_code != 200:
-            raise AppSvcException(res.text)
-    except Exception as e:
-        log.exception(e)
-        if isinstance(e, AppSvcException):
-            raise e
-        raise AppSvcException from e
+    _post("resume", get_schema(ResumeAppRequestDTO).dump(req))
 
 
 def stop_app(req: StopAppRequestDTO) -> None:
-    s = get_http_client_session()
-    try:
-        res = s.post(
-            url=f"{APPSVC_URL}/apps/stop",
-            data=json.dumps(StopAppRequestDTO.Schema().dump(req)),
-            headers={"Content-Type": "application/json"},
-            timeout=REQUESTS_TIMEOUT_CONN_READ,
-        )
-        if res.status_code != 200:
-            raise AppSvcException(res.text)
-    except Exception as e:
-        log.exception(e)
-        if isinstance(e, AppSvcException):
-            raise e
-        raise AppSvcException from e
+    _post("stop", get_schema(StopAppRequestDTO).dump(req))
+
+
+def stats() -> dict:
+    return {
+        "pool": http_client.pool_stats(),
+        "ops": op_stats.snapshot(),
+        "breakers": {op: breaker.stats() for op, breaker in breakers.items()},
+        "bulkheads": {op: bulkhead.stats() for op, bulkhead in bulkheads.items()},
+    }
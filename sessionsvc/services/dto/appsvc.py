@@ -1,16 +1,29 @@
-# sync with appsvc (appsvc/biz/dto.py)
+# sync with appsvc (appsvc/biz/dto.py), app catalog DTOs are in appsvc_catalog
 
-import datetime
+import importlib
 import typing as t
 from dataclasses import field
 from enum import StrEnum
 
-from marshmallow import (
-    Schema,
-    validate,
-)
+from marshmallow import Schema
 from marshmallow_dataclass import dataclass
 
+# app catalog DTOs are big and unused by the service, their module is imported on first access only
+_CATALOG_MODULE = "sessionsvc.services.dto.appsvc_catalog"
+_CATALOG_NAMES = frozenset(
+    {
+        "AppReleaseDetails",
+        "GetAppReleaseResponseDTO",
+        "SearchAppsAclRequestDTO",
+        "SearchAppsAclResponseDTO",
+        "SearchAppsOrderBy",
+        "SearchAppsRequestDTO",
+        "SearchAppsResponseDTO",
+        "SearchAppsResponseItem",
+        "WindowSystem",
+    }
+)
+
 
 class DcRegion(StrEnum):
     EU_CENTRAL_1 = "eu-central-1"
@@ -18,11 +31,6 @@ class DcRegion(StrEnum):
     US_WEST_1 = "us-west-1"
 
 
-class WindowSystem(StrEnum):
-    X11 = "x11"
-    WAYLAND = "wayland"
-
-
 @dataclass
 class ContainerOpDescr:
     id: str
@@ -40,115 +48,6 @@ class WsConnDC:
     consumer_id: str
 
 
-@dataclass
-class AppReleaseDetails:
-    @dataclass
-    class Company:
-        id: int
-        name: str
-        developer: bool
-        porting: bool
-        publisher: bool
-        supporting: bool
-
-    @dataclass
-    class MediaAssets:
-        @dataclass
-        class Cover:
-            image_id: str
-
-        @dataclass
-        class Screenshot:
-            width: int
-            height: int
-            image_id: str
-
-        cover: Cover
-        screenshots: t.Optional[list[Screenshot]]
-        Schema: t.ClassVar[t.Type[Schema]] = Schema  # pylint: disable=invalid-name
-
-    @dataclass
-    class Runner:
-        name: str
-        ver: t.Optional[str]
-        window_system: t.Optional[WindowSystem] = field(default=None, metadata={"by_value": True})
-        Schema: t.ClassVar[t.Type[Schema]] = Schema  # pylint: disable=invalid-name
-
-    @dataclass
-    class AppReqs:
-        @dataclass
-        class HwReqs:
-            dgpu: bool = False
-            igpu: bool = False
-            memory: int = 0
-            memory_shared: int = 0
-            nanocpus: int = 0
-
-        @dataclass
-        class UaReqs:
-            lock_pointer: bool = False
-
-        color_bits: t.Optional[int]
-        screen_width: int
-        screen_height: int
-        hw: HwReqs = field(default_factory=HwReqs)
-        midi: bool = False
-        ua: UaReqs = field(default_factory=UaReqs)
-        loading_duration: t.Optional[int] = 0
-        Schema: t.ClassVar[t.Type[Schema]] = Schema  # pylint: disable=invalid-name
-
-    @dataclass
-    class GameRefs:
-        ag_id: t.Optional[int]
-        lutris_id: t.Optional[str]
-        mg_id: t.Optional[int]
-        pcgw_id: t.Optional[str]
-        qz_id: t.Optional[int]
-        Schema: t.ClassVar[t.Type[Schema]] = Schema  # pylint: disable=invalid-name
-
-    @dataclass
-    class IgdbDescr:
-        id: int
-        slug: str
-        similar_ids: t.Optional[list[int]]
-        Schema: t.ClassVar[t.Type[Schema]] = Schema  # pylint: disable=invalid-name
-
-    @dataclass
-    class AppPlatform:
-        id: int
-        name: str
-        abbreviation: str
-        alternative_name: str
-        slug: str
-
-    addl_artifacts: dict
-    alternative_names: list[str]
-    app_reqs: AppReqs
-    companies: list[Company]
-    esrb_rating: int
-    igdb: IgdbDescr
-    is_visible: bool
-    lang: str
-    long_descr: str
-    media_assets: MediaAssets
-    media_assets_localized: t.Optional[MediaAssets]
-    name: str
-    platform: AppPlatform
-    refs: GameRefs
-    runner: Runner
-    short_descr: str
-    ts_added: datetime.datetime
-    uuid: str
-    year_released: int
-    tags: list[str] | None = None
-    Schema: t.ClassVar[t.Type[Schema]] = Schema  # pylint: disable=invalid-name
-
-
-@dataclass
-class GetAppReleaseResponseDTO(AppReleaseDetails):
-    Schema: t.ClassVar[t.Type[Schema]] = Schema  # pylint: disable=invalid-name
-
-
 @dataclass
 class RunAppRequestDTO:
     app_release_uuid: str
@@ -183,48 +82,7 @@ class StopAppRequestDTO:
     Schema: t.ClassVar[t.Type[Schema]] = Schema  # pylint: disable=invalid-name
 
 
-class SearchAppsOrderBy(StrEnum):
-    TS_ADDED = "ts_added"
-    YEAR_RELEASED = "year_released"
-    NAME = "name"
-
-
-@dataclass
-class SearchAppsRequestDTO:
-    app_name: t.Optional[str] = field(default=None, metadata={"validate": validate.Length(min=3)})
-    kids_mode: bool = False
-    offset: int = 0
-    limit: int = 100
-    order_by: SearchAppsOrderBy = SearchAppsOrderBy.TS_ADDED
-    Schema: t.ClassVar[t.Type[Schema]] = Schema  # pylint: disable=invalid-name
-
-
-@dataclass
-class SearchAppsResponseItem:
-    cover_image_id: str
-    esrb_rating: int
-    lang: str
-    name: str
-    uuid: str
-    year_released: int
-    tags: list[str] | None = None
-
-
-@dataclass
-class SearchAppsResponseDTO:
-    apps: t.List[SearchAppsResponseItem] = field(default_factory=list)
-    Schema: t.ClassVar[t.Type[Schema]] = Schema  # pylint: disable=invalid-name
-
-
-@dataclass
-class SearchAppsAclRequestDTO:
-    app_name: t.Optional[str] = field(default=None, metadata={"validate": validate.Length(min=3)})
-    company_name: t.Optional[str] = field(default=None, metadata={"validate": validate.Length(min=3)})
-    kids_mode: bool = False
-    Schema: t.ClassVar[t.Type[Schema]] = Schema  # pylint: disable=invalid-name
-
-
-@dataclass
-class SearchAppsAclResponseDTO:
-    acl: list[str]
-    Schema: t.ClassVar[t.Type[Schema]] = Schema  # pylint: disable=invalid-name
+def __getattr__(name: str) -> t.Any:
+    if name in _CATALOG_NAMES:
+        return getattr(importlib.import_module(_CATALOG_MODULE), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,17 +1,31 @@
+import asyncio
+import os
+import threading
+import time
 import typing as t
+from collections import deque
 
+import httpx
 import requests
 from requests.adapters import (
     HTTPAdapter,
     Retry,
 )
 
+from sessionsvc.biz import aio
+
+# how often a bulkhead waiting on the event loop checks for a free slot, seconds
+BULKHEAD_POLL_INTERVAL = 0.005
+# timeout of http calls not passing their own, seconds
+DEFAULT_TIMEOUT = 10.0
+
 
 def get_http_client_session(
     total: int = 0,
     backoff_factor: int = 3,
     allowed_methods: t.Optional[list[str]] = None,
     status_forcelist: t.Optional[list[int]] = None,
+    pool_maxsize: int = 10,
 ) -> requests.Session:
     # backoff_factor for 3: 5, 10, 20, 40, 80, 160, 320, 640, 1280, 2560
     if not allowed_methods:
@@ -25,6 +39,248 @@ def get_http_client_session(
         status_forcelist=status_forcelist,
     )
     sess = requests.Session()
-    sess.mount("http://", HTTPAdapter(max_retries=retries))
-    sess.mount("https://", HTTPAdapter(max_retries=retries))
+    sess.mount("http://", HTTPAdapter(max_retries=retries, pool_maxsize=pool_maxsize))
+    sess.mount("https://", HTTPAdapter(max_retries=retries, pool_maxsize=pool_maxsize))
     return sess
+
+
+class AsyncHttpSession:
+    """httpx.AsyncClient behind the `post` interface of requests.Session, for calls made on the event loop (ASGI mode,
+    see sessionsvc.biz.aio): the call waits on the loop instead of blocking the worker."""
+
+    def __init__(self, pool_maxsize: int = 10) -> None:
+        # connections belong to the loop the client was created on
+        self.loop = asyncio.get_running_loop()
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=None, max_keepalive_connections=pool_maxsize),
+            timeout=DEFAULT_TIMEOUT,
+        )
+        self.requests = 0
+
+    def post(self, url: str, data: str, headers: dict[str, str], timeout: tuple[float, float]) -> httpx.Response:
+        connect_timeout, read_timeout = timeout
+        self.requests += 1
+        return aio.wait(
+            self.client.post(
+                url, content=data, headers=headers, timeout=httpx.Timeout(read_timeout, connect=connect_timeout)
+            )
+        )
+
+    def close(self) -> None:
+        aio.wait(self.client.aclose())
+
+
+class PooledHttpClient:
+    """Process-wide keep-alive http client session (one per gunicorn worker).
+
+    The session (and its connection pools) is re-created after a fork, so sockets are never shared between processes.
+    Calls made on the event loop in ASGI mode get an AsyncHttpSession instead.
+    """
+
+    def __init__(self, pool_maxsize: int = 10) -> None:
+        self.pool_maxsize = pool_maxsize
+        self._session: t.Optional[requests.Session] = None
+        self._async_session: t.Optional[AsyncHttpSession] = None
+        self._pid: t.Optional[int] = None
+        self._lock = threading.Lock()
+
+    def session(self) -> t.Union[requests.Session, AsyncHttpSession]:
+        if aio.in_event_loop():
+            # only ever used from the event loop thread
+            if self._async_session is None or self._async_session.loop is not asyncio.get_running_loop():
+                self._async_session = AsyncHttpSession(pool_maxsize=self.pool_maxsize)
+            return self._async_session
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    self._session = get_http_client_session(pool_maxsize=self.pool_maxsize)
+                    self._pid = pid
+        return self._session
+
+    def close_async_session(self) -> None:
+        """Closes the AsyncHttpSession connections, must be called on the event loop."""
+        if self._async_session is not None:
+            self._async_session.close()
+            self._async_session = None
+
+    def pool_stats(self) -> dict:
+        """Connections opened / requests sent / idle connections over all connection pools of the current process.
+
+        Only requests are counted for the AsyncHttpSession.
+        """
+        stats = {"connections_opened": 0, "requests": 0, "idle_connections": 0, "pool_maxsize": self.pool_maxsize}
+        if self._async_session is not None:
+            stats["requests"] += self._async_session.requests
+        if self._pid != os.getpid():
+            return stats
+        for adapter in self._session.adapters.values():
+            for key in adapter.poolmanager.pools.keys():
+                pool = adapter.poolmanager.pools[key]
+                stats["connections_opened"] += pool.num_connections
+                stats["requests"] += pool.num_requests
+                # the pool queue is pre-filled with None placeholders for connections not opened yet
+                stats["idle_connections"] += sum(1 for conn in list(pool.pool.queue) if conn) if pool.pool else 0
+        return stats
+
+
+class OpStats:
+    """Per-operation call/error counters and latency totals."""
+
+    def __init__(self) -> None:
+        self._ops: dict[str, dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, op: str, latency: float, error: bool) -> None:
+        with self._lock:
+            stats = self._ops.setdefault(op, {"calls": 0, "errors": 0, "latency_total": 0.0, "latency_max": 0.0})
+            stats["calls"] += 1
+            stats["errors"] += int(error)
+            stats["latency_total"] += latency
+            stats["latency_max"] = max(stats["latency_max"], latency)
+
+    def snapshot(self) -> dict[str, dict[str, float]]:
+        with self._lock:
+            return {
+                op: {**stats, "latency_avg": stats["latency_total"] / stats["calls"] if stats["calls"] else 0.0}
+                for op, stats in self._ops.items()
+            }
+
+    def timed(self, op: str) -> "_Timed":
+        return _Timed(self, op)
+
+
+class _Timed:
+    def __init__(self, stats: OpStats, op: str) -> None:
+        self._stats = stats
+        self._op = op
+        self._start = 0.0
+
+    def __enter__(self) -> None:
+        self._start = time.perf_counter()
+
+    def __exit__(self, exc_type: t.Any, *args: t.Any) -> None:
+        self._stats.record(self._op, time.perf_counter() - self._start, exc_type is not None)
+
+
+class CircuitBreaker:
+    """Closed/open/half-open circuit breaker over a sliding window of the last `window` call outcomes.
+
+    The circuit opens when at least `min_calls` outcomes are recorded and the failed ones (errors or calls slower
+    than the caller's threshold) make up `failure_rate` or more of the window. After `open_duration` seconds it lets
+    `half_open_calls` trial calls through: the first failed trial re-opens the circuit, all successful close it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        window: int = 20,
+        min_calls: int = 10,
+        failure_rate: float = 0.5,
+        open_duration: float = 30.0,
+        half_open_calls: int = 1,
+    ) -> None:
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.open_duration = open_duration
+        self.half_open_calls = half_open_calls
+        self.state = self.CLOSED
+        self.opened = 0
+        self.rejected = 0
+        self._outcomes: deque[bool] = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._trials = 0
+        self._trials_ok = 0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Returns whether a call may proceed, every allowed call must be followed by `record`."""
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.open_duration:
+                self.state, self._trials, self._trials_ok = self.HALF_OPEN, 0, 0
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and self._trials < self.half_open_calls:
+                self._trials += 1
+                return True
+            self.rejected += 1
+            return False
+
+    def record(self, failed: bool) -> None:
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                if failed:
+                    self._open()
+                else:
+                    self._trials_ok += 1
+                    if self._trials_ok >= self.half_open_calls:
+                        self.state = self.CLOSED
+                        self._outcomes.clear()
+                return
+            if self.state == self.OPEN:
+                # a call allowed before the circuit opened
+                return
+            self._outcomes.append(failed)
+            if len(self._outcomes) >= self.min_calls and self._failures() >= self.failure_rate:
+                self._open()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "failure_rate": self._failures(),
+                "calls_in_window": len(self._outcomes),
+                "opened": self.opened,
+                "rejected": self.rejected,
+            }
+
+    def _open(self) -> None:
+        self.state = self.OPEN
+        self.opened += 1
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+
+    def _failures(self) -> float:
+        return sum(self._outcomes) / len(self._outcomes) if self._outcomes else 0.0
+
+
+class Bulkhead:
+    """Caps the number of concurrent calls, waiting up to `wait` seconds for a free slot before rejecting a call."""
+
+    def __init__(self, max_concurrent: int = 4, wait: float = 0.1) -> None:
+        self.max_concurrent = max_concurrent
+        self.wait = wait
+        self.in_flight = 0
+        self.rejected = 0
+        self._sem = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+
+    def acquire(self) -> bool:
+        acquired = self._acquire_on_event_loop() if aio.in_event_loop() else self._sem.acquire(timeout=self.wait)
+        if not acquired:
+            with self._lock:
+                self.rejected += 1
+            return False
+        with self._lock:
+            self.in_flight += 1
+        return True
+
+    def release(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+        self._sem.release()
+
+    def _acquire_on_event_loop(self) -> bool:
+        # slots are released by other greenlets of the same thread: blocking on the semaphore would never see them
+        deadline = time.monotonic() + self.wait
+        while not self._sem.acquire(blocking=False):
+            if time.monotonic() >= deadline:
+                return False
+            aio.sleep(BULKHEAD_POLL_INTERVAL)
+        return True
+
+    def stats(self) -> dict:
+        return {"in_flight": self.in_flight, "max_concurrent": self.max_concurrent, "rejected": self.rejected}
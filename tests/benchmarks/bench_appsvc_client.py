@@ -0,0 +1,61 @@
+"""Latency and connection churn of appsvc calls: a fresh requests.Session per call vs the pooled keep-alive client.
+
+Runs against a local stub appsvc, no database required:
+
+    python tests/benchmarks/bench_appsvc_client.py [ops] [concurrency]
+"""
+
+import sys
+import typing as t
+
+from common import (
+    StubAppSvc,
+    measure,
+)
+
+from sessionsvc.services import appsvc
+from sessionsvc.services.dto.appsvc import (
+    ContainerOpDescr,
+    StopAppRequestDTO,
+)
+from sessionsvc.services.helpers import (
+    PooledHttpClient,
+    get_http_client_session,
+)
+
+
+class _PerCallHttpClient(PooledHttpClient):
+    """Previous behaviour: new session and connection pools for every call."""
+
+    def session(self) -> t.Any:
+        return get_http_client_session()
+
+
+def run(ops: int, concurrency: int) -> dict[str, dict[str, float]]:
+    req = StopAppRequestDTO(container=ContainerOpDescr(id="container-1", node_id="node-1"))
+    pooled_client, url = appsvc.http_client, appsvc.APPSVC_URL
+    results = {}
+    with StubAppSvc() as stub:
+        appsvc.APPSVC_URL = stub.url
+        for name, client in (("per_call_session", _PerCallHttpClient()), ("pooled", pooled_client)):
+            appsvc.http_client = client
+            connections = stub.connections
+            res = measure(lambda i: appsvc.stop_app(req), ops, concurrency)
+            res["connections"] = stub.connections - connections
+            results[f"appsvc_client.{name}"] = res
+    appsvc.http_client, appsvc.APPSVC_URL = pooled_client, url
+    return results
+
+
+def main() -> None:
+    ops = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    for name, res in run(ops, concurrency).items():
+        print(
+            f"{name:<32} p50 {res['p50_ms']:7.2f} ms  p99 {res['p99_ms']:7.2f} ms  "
+            f"{res['throughput']:8.1f} ops/s  {res['connections']:6d} connections"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Request thread cost of logging a session operation's input and output.
+
+Compares the previous setup (DEBUG level, log_input_output rendering full reprs, synchronous StreamHandler) with
+log_call writing through the AsyncHandler at DEBUG, sampled DEBUG and INFO levels. Every variant writes to a fast
+(/dev/null) and a slow stream (50us per write, e.g. a blocked stdout pipe):
+
+    python tests/benchmarks/bench_logging.py [calls]
+"""
+
+import datetime
+import logging
+import os
+import sys
+import time
+import timeit
+import typing as t
+
+from sessionsvc.biz.dto import (
+    DcRegion,
+    GetSessionsResponseDTO,
+    SessionDC,
+    SessionStatus,
+)
+from sessionsvc.biz.log import (
+    TEXT_FORMAT,
+    AsyncHandler,
+    DebugSampler,
+    JsonFormatter,
+)
+from sessionsvc.biz.misc import log_call
+
+log = logging.getLogger("sessionsvc")
+
+
+class _SlowStream:
+    def __init__(self, stream: t.TextIO, delay: float) -> None:
+        self.stream = stream
+        self.delay = delay
+
+    def write(self, text: str) -> int:
+        time.sleep(self.delay)
+        return self.stream.write(text)
+
+    def flush(self) -> None:
+        self.stream.flush()
+
+
+def log_input_output(func: t.Callable) -> t.Callable:
+    """Previous behaviour: both records rendered with full reprs whenever the level is enabled."""
+
+    def wrap(*args: t.Any, **kwargs: t.Any) -> t.Any:
+        log.debug("calling %s with args: %s, kwargs: %s", func.__name__, args, kwargs)
+        result = func(*args, **kwargs)
+        log.debug("%s returned: %s", func.__name__, repr(result))
+        return result
+
+    return wrap
+
+
+def make_response(rows: int) -> GetSessionsResponseDTO:
+    return GetSessionsResponseDTO(
+        sessions=[
+            SessionDC(
+                id=f"session-{i}",
+                app_release_uuid="421ba7f4-97ad-4c5d-8fbc-e176513516ba",
+                container=SessionDC.Container(id=f"container-{i}", node_id=f"node-{i % 10}", region=DcRegion.US_EAST_1),
+                status=SessionStatus.ACTIVE,
+                user_id=i,
+                ws_conn=SessionDC.WsConn(id=f"ws-{i}", consumer_id=f"consumer-{i}", producer_id=f"producer-{i}"),
+                updated=datetime.datetime.now(datetime.timezone.utc),
+            )
+            for i in range(rows)
+        ]
+    )
+
+
+def _setup(handler: logging.Handler, level: int) -> None:
+    log.handlers.clear()
+    log.addHandler(handler)
+    log.setLevel(level)
+    log.propagate = False
+
+
+def run(calls: int, rows: int = 20) -> dict[str, float]:
+    """Returns per-call cost in microseconds for every variant."""
+    res = make_response(rows)
+
+    def get_sessions(user_id: int) -> GetSessionsResponseDTO:  # pylint: disable=unused-argument
+        return res
+
+    old, new = log_input_output(get_sessions), log_call(get_sessions)
+    results = {}
+    with open(os.devnull, "w", encoding="utf-8") as devnull:
+        for stream_name, stream in (("fast", devnull), ("slow", _SlowStream(devnull, 50e-6))):
+            sync_handler = logging.StreamHandler(stream)
+            sync_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+            async_target = logging.StreamHandler(stream)
+            async_target.setFormatter(JsonFormatter())
+            variants: dict[str, tuple[logging.Handler, int, t.Callable]] = {
+                "sync_debug_log_input_output": (sync_handler, logging.DEBUG, old),
+                "async_debug": (AsyncHandler(async_target, queue_size=calls * 2), logging.DEBUG, new),
+                "async_debug_sampled_1pct": (AsyncHandler(async_target, queue_size=calls * 2), logging.DEBUG, new),
+                "async_info": (AsyncHandler(async_target, queue_size=calls * 2), logging.INFO, new),
+            }
+            variants["async_debug_sampled_1pct"][0].addFilter(DebugSampler(0.01))
+            for name, (handler, level, func) in variants.items():
+                _setup(handler, level)
+                elapsed = timeit.timeit(lambda f=func: f(user_id=1), number=calls)
+                if isinstance(handler, AsyncHandler):
+                    # the queued records are written out before the next variant starts
+                    handler.stop()
+                results[f"{name}.{stream_name}"] = elapsed / calls * 1e6
+    log.handlers.clear()
+    return results
+
+
+def main() -> None:
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    for name, usec in run(calls).items():
+        print(f"{name:<40} {usec:8.2f} us/call")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Per-row cost of SessionDC deserialization (from_sessiondao) and list responses serialization.
+
+Compares the schema-per-call approach with cached schemas and the SessionDC fast encoders:
+
+    python tests/benchmarks/bench_serialization.py [rows]
+"""
+
+import datetime
+import json
+import sys
+import timeit
+
+from sessionsvc.biz.dto import (
+    GetSessionsResponseDTO,
+    SessionDC,
+    SessionStatus,
+)
+from sessionsvc.biz.models import SessionDAO
+from sessionsvc.biz.serialization import get_schema
+
+
+def make_sessiondaos(rows: int) -> list[SessionDAO]:
+    updated = datetime.datetime.utcnow()
+    return [
+        SessionDAO(
+            id=f"session-{i}",
+            app_release_uuid="421ba7f4-97ad-4c5d-8fbc-e176513516ba",
+            container={"id": f"container-{i}", "node_id": f"node-{i % 10}", "region": "US_EAST_1"},
+            status=SessionStatus.ACTIVE.value,
+            updated=updated,
+            user_id=i,
+            ws_conn={"id": f"ws-{i}", "consumer_id": f"consumer-{i}", "producer_id": f"producer-{i}"},
+        )
+        for i in range(rows)
+    ]
+
+
+def from_sessiondao_schemas(s: SessionDAO) -> SessionDC:
+    return SessionDC(
+        id=s.id,
+        app_release_uuid=s.app_release_uuid,
+        container=SessionDC.Container.Schema().load(data=s.container) if s.container else None,
+        status=SessionStatus(s.status),
+        user_id=s.user_id,
+        ws_conn=SessionDC.WsConn.Schema().load(data=s.ws_conn),
+        updated=s.updated.replace(tzinfo=datetime.timezone.utc),
+    )
+
+
+def from_sessiondao_cached_schemas(s: SessionDAO) -> SessionDC:
+    return SessionDC(
+        id=s.id,
+        app_release_uuid=s.app_release_uuid,
+        container=get_schema(SessionDC.Container).load(data=s.container) if s.container else None,
+        status=SessionStatus(s.status),
+        user_id=s.user_id,
+        ws_conn=get_schema(SessionDC.WsConn).load(data=s.ws_conn),
+        updated=s.updated.replace(tzinfo=datetime.timezone.utc),
+    )
+
+
+def run(rows: int) -> dict[str, float]:
+    """Returns per-row cost in microseconds for every variant."""
+    daos = make_sessiondaos(rows)
+    res = GetSessionsResponseDTO(sessions=[SessionDC.from_sessiondao(s) for s in daos])
+    variants = {
+        "load_schema_per_call": lambda: [from_sessiondao_schemas(s) for s in daos],
+        "load_cached_schema": lambda: [from_sessiondao_cached_schemas(s) for s in daos],
+        "load_fast": lambda: [SessionDC.from_sessiondao(s) for s in daos],
+        "dump_schema_per_call": lambda: json.dumps(GetSessionsResponseDTO.Schema().dump(res)),
+        "dump_cached_schema": lambda: json.dumps(get_schema(GetSessionsResponseDTO).dump(res)),
+        "dump_fast": lambda: json.dumps(res.to_dict()),
+    }
+    results = {}
+    for name, func in variants.items():
+        number = 5
+        best = min(timeit.repeat(func, number=number, repeat=5))
+        results[name] = best / number / rows * 1e6
+    return results
+
+
+def main() -> None:
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    for name, usec in run(rows).items():
+        print(f"{name:<24} {usec:8.2f} us/row")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Concurrency of the WSGI (gthread) and ASGI (uvicorn, sessionsvc.asgi) serving modes under slow appsvc calls.
+
+Starts one gunicorn worker per mode (WSGI with --threads threads) against the usual SQLDB_* db and a local stub
+appsvc answering after --appsvc-delay seconds, then runs create + close of a session per unique user and user sessions
+reads from `concurrency` client threads:
+
+    python tests/benchmarks/bench_serving.py [ops] [concurrency] [appsvc_delay]
+"""
+
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import typing as t
+
+import psycopg2
+import requests
+from common import (
+    StubAppSvc,
+    measure,
+)
+
+# user ids range reserved for this benchmark
+BENCH_USER_ID = 9_000_000_000_000 + 2 * 10**9
+WSGI_THREADS = 5
+SERVER_START_TIMEOUT = 30.0
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _cleanup() -> None:
+    conn = psycopg2.connect(
+        host=os.environ["SQLDB_HOST"],
+        port=os.environ["SQLDB_PORT"],
+        dbname=os.environ["SQLDB_DBNAME"],
+        user=os.environ["SQLDB_USERNAME"],
+        password=os.environ.get("SQLDB_PASSWORD", ""),
+    )
+    with conn, conn.cursor() as cur:
+        cur.execute("DELETE FROM sessions.sessions WHERE user_id >= %s", (BENCH_USER_ID,))
+    conn.close()
+
+
+class Server:
+    """gunicorn serving sessionsvc in the given mode on a free local port."""
+
+    def __init__(self, mode: str, appsvc_url: str, concurrency: int) -> None:
+        port = _free_port()
+        self.url = f"http://127.0.0.1:{port}"
+        app = "sessionsvc.asgi:create_asgi_app()" if mode == "asgi" else "sessionsvc:create_app()"
+        worker = ["-k", "uvicorn.workers.UvicornWorker"] if mode == "asgi" else ["--threads", str(WSGI_THREADS)]
+        env = {
+            **os.environ,
+            "APPSVC_URL": appsvc_url,
+            "APPSVC_POOL_SIZE": str(concurrency),
+            "FLASK_LOG_LEVEL": "WARNING",
+            # bulkheads would otherwise reject most of the concurrent calls of the ASGI worker
+            **{f"APPSVC_{op}_MAX_CONCURRENCY": str(concurrency) for op in ("RUN", "PAUSE", "RESUME", "STOP")},
+        }
+        cmd = ["gunicorn", "--bind", f"127.0.0.1:{port}", "--workers", "1", *worker, app]
+        self._proc = subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def __enter__(self) -> "Server":
+        deadline = time.monotonic() + SERVER_START_TIMEOUT
+        while time.monotonic() < deadline:
+            try:
+                requests.get(f"{self.url}/caches/sessions", timeout=1)
+                return self
+            except requests.ConnectionError:
+                time.sleep(0.2)
+        self._proc.kill()
+        raise RuntimeError(f"server {self.url} did not start")
+
+    def __exit__(self, *args: t.Any) -> None:
+        self._proc.terminate()
+        self._proc.wait()
+
+
+def _bench_mode(mode: str, appsvc_url: str, ops: int, concurrency: int) -> dict[str, dict[str, float]]:
+    ws_conn = {"id": "ws", "consumer_id": "consumer"}
+    local = threading.local()
+
+    with Server(mode, appsvc_url, concurrency) as server:
+
+        def client() -> requests.Session:
+            if not hasattr(local, "session"):
+                local.session = requests.Session()
+            return local.session
+
+        def post(path: str, json: t.Optional[dict] = None) -> requests.Response:
+            res = client().post(f"{server.url}{path}", json=json, timeout=60)
+            if res.status_code != 200:
+                raise RuntimeError(f"unexpected response {res.status_code}: {res.text[:200]}")
+            return res
+
+        def lifecycle(i: int) -> None:
+            req = {"app_release_uuid": "bench-app", "user_id": BENCH_USER_ID + i, "ws_conn": ws_conn}
+            session_id = post("/sessions/create", req).json()["session_id"]
+            post(f"/sessions/{session_id}/close")
+
+        def read(i: int) -> None:
+            client().get(f"{server.url}/users/{BENCH_USER_ID + i}/sessions", timeout=60).raise_for_status()
+
+        return {
+            f"serving.{mode}.create_close": measure(lifecycle, ops, concurrency),
+            f"serving.{mode}.get_user_sessions": measure(read, ops * 5, concurrency),
+        }
+
+
+def run(ops: int, concurrency: int, appsvc_delay: float) -> dict[str, dict[str, float]]:
+    results = {}
+    with StubAppSvc(delay=appsvc_delay) as appsvc:
+        try:
+            for mode in ("wsgi", "asgi"):
+                results.update(_bench_mode(mode, appsvc.url, ops, concurrency))
+        finally:
+            _cleanup()
+    return results
+
+
+def main() -> None:
+    ops = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    appsvc_delay = float(sys.argv[3]) if len(sys.argv) > 3 else 0.1
+    for name, res in run(ops, concurrency, appsvc_delay).items():
+        print(f"{name:<36} " + " ".join(f"{k}={v:.2f}" for k, v in res.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""Worker startup cost: import-time profile, time to first request, worker respawn time and per-worker memory.
+
+Starts gunicorn with runtime/conf/gunicorn.config.py (and --preload in the preload mode) against the usual SQLDB_* db,
+reads memory of the workers from /proc (linux only) after serving some requests, then kills them all and waits for
+the respawned ones to serve. RSS counts pages shared with the master and the other workers, USS (private pages) is what
+every extra worker costs. Exits with 1 when a bound is exceeded:
+
+    python tests/benchmarks/bench_startup.py [--workers 4] [--max-first-request-ms 3000] [--max-worker-uss-mb 40]
+"""
+
+import argparse
+import os
+import re
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import typing as t
+
+import requests
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+GUNICORN_CONFIG = os.path.join(ROOT, "runtime", "conf", "gunicorn.config.py")
+SERVER_START_TIMEOUT = 60.0
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+
+def import_profile(top: int = 15) -> dict[str, t.Any]:
+    """Runs `python -X importtime` over the app creation, returns total time and the most expensive top-level packages
+    (self time of all their modules) and modules (cumulative time), microseconds."""
+    code = "import time; s = time.perf_counter(); from sessionsvc import create_app; create_app(); "
+    code += "print(int((time.perf_counter() - s) * 1e6))"
+    env = {
+        **os.environ,
+        "APPSVC_URL": os.environ.get("APPSVC_URL", "http://localhost:8085"),
+        "FLASK_LOG_LEVEL": "ERROR",
+    }
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code], env=env, capture_output=True, text=True, check=True
+    )
+    packages: dict[str, int] = {}
+    modules: dict[str, int] = {}
+    for line in proc.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, name = int(match[1]), int(match[2]), match[4]
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0) + self_us
+        modules[name] = cumulative_us
+    return {
+        "create_app_us": int(proc.stdout.strip().splitlines()[-1]),
+        "imports_us": sum(packages.values()),
+        "packages": dict(sorted(packages.items(), key=lambda kv: -kv[1])[:top]),
+        "sessionsvc_modules": dict(
+            sorted(((k, v) for k, v in modules.items() if k.startswith("sessionsvc.")), key=lambda kv: -kv[1])[:top]
+        ),
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _memory_kb(pid: int) -> dict[str, int]:
+    """Rss, Pss and Uss (private pages) of the process, kB."""
+    with open(f"/proc/{pid}/smaps_rollup", encoding="ascii") as f:
+        values = {line.split(":")[0]: int(line.split()[1]) for line in f if line.split()[-1] == "kB"}
+    return {"rss": values["Rss"], "pss": values["Pss"], "uss": values["Private_Clean"] + values["Private_Dirty"]}
+
+
+def _children(pid: int) -> list[int]:
+    with open(f"/proc/{pid}/task/{pid}/children", encoding="ascii") as f:
+        return [int(p) for p in f.read().split()]
+
+
+def _wait_until_serving(url: str, deadline: float) -> None:
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f"{url}/caches/sessions", timeout=1).status_code == 200:
+                return
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.01)
+    raise RuntimeError(f"{url} did not start")
+
+
+def bench_mode(preload: bool, workers: int, requests_per_worker: int = 200) -> dict[str, float]:
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}"
+    with tempfile.TemporaryDirectory() as metrics_dir:
+        env = {
+            **os.environ,
+            "APPSVC_URL": os.environ.get("APPSVC_URL", "http://localhost:8085"),
+            "GUNICORN_PRELOAD": "true" if preload else "false",
+            "PROMETHEUS_MULTIPROC_DIR": metrics_dir,
+            "FLASK_LOG_LEVEL": "WARNING",
+        }
+        cmd = [
+            *(sys.executable, "-m", "gunicorn", "-c", GUNICORN_CONFIG, "--bind", f"127.0.0.1:{port}"),
+            *("--workers", str(workers), "--threads", "5", "sessionsvc:create_app()"),
+        ]
+        start = time.monotonic()
+        proc = subprocess.Popen(cmd, env=env, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            _wait_until_serving(url, start + SERVER_START_TIMEOUT)
+            first_request = time.monotonic() - start
+            # every worker serves requests (and runs collections) before its memory is read
+            with requests.Session() as session:
+                for _ in range(workers * requests_per_worker):
+                    session.get(f"{url}/users/1/sessions", timeout=10).raise_for_status()
+            while len(pids := _children(proc.pid)) < workers:
+                time.sleep(0.1)
+            memory = [_memory_kb(pid) for pid in pids]
+            master = _memory_kb(proc.pid)
+
+            # killed workers are respawned by the master, like recycled ones (--max-requests)
+            for pid in pids:
+                os.kill(pid, signal.SIGKILL)
+            respawn_start = time.monotonic()
+            _wait_until_serving(url, respawn_start + SERVER_START_TIMEOUT)
+            respawn = time.monotonic() - respawn_start
+        finally:
+            proc.send_signal(signal.SIGTERM)
+            proc.wait()
+    return {
+        "first_request_ms": first_request * 1e3,
+        "worker_respawn_ms": respawn * 1e3,
+        "master_rss_mb": master["rss"] / 1024,
+        "worker_rss_mb": sum(m["rss"] for m in memory) / len(memory) / 1024,
+        "worker_pss_mb": sum(m["pss"] for m in memory) / len(memory) / 1024,
+        "worker_uss_mb": sum(m["uss"] for m in memory) / len(memory) / 1024,
+    }
+
+
+def run(workers: int) -> dict[str, dict[str, float]]:
+    return {f"startup.{'preload' if preload else 'default'}": bench_mode(preload, workers) for preload in (False, True)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--max-first-request-ms", type=float, help="fail if the time to first request exceeds this")
+    parser.add_argument("--max-worker-uss-mb", type=float, help="fail if the private memory of a worker exceeds this")
+    args = parser.parse_args()
+
+    profile = import_profile()
+    print(f"create_app: {profile['create_app_us'] / 1e3:.1f} ms, imports: {profile['imports_us'] / 1e3:.1f} ms")
+    for title in ("packages", "sessionsvc_modules"):
+        print(f"  {title} (ms):")
+        for name, us in profile[title].items():
+            print(f"    {name:<48} {us / 1e3:8.1f}")
+
+    failed = False
+    for name, res in run(args.workers).items():
+        print(f"{name:<20} " + " ".join(f"{k}={v:.1f}" for k, v in res.items()))
+        if args.max_first_request_ms and res["first_request_ms"] > args.max_first_request_ms:
+            print(f"{name}: first request after {res['first_request_ms']:.0f} ms > {args.max_first_request_ms} ms")
+            failed = True
+        if args.max_worker_uss_mb and res["worker_uss_mb"] > args.max_worker_uss_mb:
+            print(f"{name}: worker private memory {res['worker_uss_mb']:.1f} MB > {args.max_worker_uss_mb} MB")
+            failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
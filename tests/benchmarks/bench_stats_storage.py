@@ -0,0 +1,141 @@
+"""Storage cost of webrtc stats samples: json blob (before) vs typed columns, with and without the compressed extra
+fields (FLASK_STATS_KEEP_EXTRA).
+
+Inserts the same generated browser-like samples into a scratch copy of stats.webrtc_stats_logs per format, in batches
+of 500 rows (as the stats writer does), in the usual SQLDB_* db (migrated). Reports table (heap + toast) and WAL bytes
+per sample and the insert throughput, including the conversion of samples to rows:
+
+    python tests/benchmarks/bench_stats_storage.py [samples]
+"""
+
+import json
+import os
+import random
+import sys
+import time
+import typing as t
+
+import psycopg2
+from psycopg2.extras import (
+    Json,
+    execute_values,
+)
+
+from sessionsvc.biz.stats_storage import (
+    METRICS,
+    StatsStorage,
+)
+
+BATCH_SIZE = 500
+TABLE = "bench_webrtc_stats_logs"
+COLUMNS = ["app_release_uuid", "region", "session_id", "user_id", "stats", *METRICS, "stats_extra"]
+
+
+def make_stats(rnd: random.Random, i: int) -> dict:
+    """A sample as submitted by clients: a few getStats() reports with their cumulative counters."""
+    return {
+        "candidate_pair": {
+            "availableOutgoingBitrate": rnd.randint(1_000_000, 5_000_000),
+            "bytesReceived": i * 125_000 + rnd.randint(0, 1000),
+            "bytesSent": i * 2_000 + rnd.randint(0, 100),
+            "currentRoundTripTime": round(rnd.uniform(0.01, 0.2), 3),
+            "nominated": True,
+            "requestsSent": i // 2,
+            "responsesReceived": i // 2,
+            "state": "succeeded",
+            "totalRoundTripTime": round(i * rnd.uniform(0.01, 0.2), 3),
+        },
+        "codec": {"clockRate": 90000, "mimeType": "video/H264", "payloadType": 102},
+        "inbound_rtp": {
+            "bytesReceived": i * 125_000,
+            "firCount": 0,
+            "frameHeight": 1080,
+            "frameWidth": 1920,
+            "framesDecoded": i * 60,
+            "framesDropped": rnd.randint(0, i + 1),
+            "framesPerSecond": rnd.choice((58, 59, 60)),
+            "framesReceived": i * 60 + 2,
+            "jitter": round(rnd.uniform(0.001, 0.03), 3),
+            "jitterBufferDelay": round(i * rnd.uniform(1.0, 3.0), 3),
+            "keyFramesDecoded": i // 10 + 1,
+            "kind": "video",
+            "nackCount": rnd.randint(0, 50),
+            "packetsLost": rnd.randint(0, 500),
+            "packetsReceived": i * 110,
+            "pliCount": rnd.randint(0, 5),
+            "totalDecodeTime": round(i * rnd.uniform(0.1, 0.3), 3),
+        },
+        "remote_inbound_rtp": {
+            "fractionLost": 0,
+            "packetsLost": rnd.randint(0, 10),
+            "roundTripTimeMeasurements": i,
+            "round_trip_time": round(rnd.uniform(0.01, 0.2), 3),
+        },
+    }
+
+
+def json_row(stats: dict) -> dict:
+    return {"stats": Json(stats)}
+
+
+def run(samples: int) -> dict[str, dict[str, float]]:
+    rnd = random.Random(samples)
+    stats = [make_stats(rnd, i) for i in range(samples)]
+    typed, typed_extra = StatsStorage(), StatsStorage()
+    typed.keep_extra = False
+    variants: dict[str, t.Callable[[dict], dict]] = {
+        "json": json_row,
+        "typed+extra": typed_extra.to_columns,
+        "typed": typed.to_columns,
+    }
+    conn = psycopg2.connect(
+        host=os.environ["SQLDB_HOST"],
+        port=os.environ["SQLDB_PORT"],
+        dbname=os.environ["SQLDB_DBNAME"],
+        user=os.environ["SQLDB_USERNAME"],
+        password=os.environ.get("SQLDB_PASSWORD", ""),
+    )
+    conn.autocommit = True
+    base = {**dict.fromkeys(COLUMNS), "app_release_uuid": "bench-app", "region": "eu-central-1", "user_id": 1}
+    base["session_id"] = "bench-session"
+    results = {}
+    with conn.cursor() as cur:
+        for name, to_row in variants.items():
+            cur.execute(f"DROP TABLE IF EXISTS {TABLE}")
+            cur.execute(f"CREATE TABLE {TABLE} (LIKE stats.webrtc_stats_logs INCLUDING DEFAULTS)")
+            cur.execute("CHECKPOINT")
+            cur.execute("SELECT pg_current_wal_insert_lsn()")
+            wal_start = cur.fetchone()[0]
+            start = time.perf_counter()
+            for offset in range(0, samples, BATCH_SIZE):
+                rows = []
+                for s in stats[offset : offset + BATCH_SIZE]:
+                    row = {**base, **to_row(s)}
+                    rows.append(tuple(row[c] for c in COLUMNS))
+                cur.execute("BEGIN")
+                execute_values(cur, f"INSERT INTO {TABLE} ({', '.join(COLUMNS)}) VALUES %s", rows, page_size=BATCH_SIZE)
+                cur.execute("COMMIT")
+            elapsed = time.perf_counter() - start
+            cur.execute("SELECT pg_wal_lsn_diff(pg_current_wal_insert_lsn(), %s)", (wal_start,))
+            wal = float(cur.fetchone()[0])
+            cur.execute(f"SELECT pg_table_size('{TABLE}')")
+            size = cur.fetchone()[0]
+            results[name] = {
+                "table_bytes_per_sample": size / samples,
+                "wal_bytes_per_sample": wal / samples,
+                "inserts_per_second": samples / elapsed,
+            }
+        cur.execute(f"DROP TABLE {TABLE}")
+    conn.close()
+    results["json"]["submission_bytes"] = sum(len(json.dumps(s)) for s in stats) / samples
+    return results
+
+
+def main() -> None:
+    samples = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    for name, res in run(samples).items():
+        print(f"{name:<12} " + " ".join(f"{k}={v:.1f}" for k, v in res.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+import json
+import os
+import statistics
+import subprocess
+import threading
+import time
+import typing as t
+from concurrent.futures import ThreadPoolExecutor
+from http.server import (
+    BaseHTTPRequestHandler,
+    ThreadingHTTPServer,
+)
+
+
+def summarize(latencies: list[float], elapsed: float) -> dict[str, float]:
+    """Latencies and elapsed wall time are in seconds, returned percentiles are in milliseconds."""
+    latencies = sorted(latencies)
+    q = statistics.quantiles(latencies, n=100, method="inclusive") if len(latencies) > 1 else latencies * 99
+    return {
+        "ops": len(latencies),
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": q[49] * 1e3,
+        "p99_ms": q[98] * 1e3,
+        "max_ms": latencies[-1] * 1e3,
+    }
+
+
+def measure(func: t.Callable[[int], t.Any], ops: int, concurrency: int = 1) -> dict[str, float]:
+    """Calls func(i) for i in range(ops) from `concurrency` threads, returns latency/throughput summary."""
+    latencies: list[float] = []
+    lock = threading.Lock()
+
+    def call(i: int) -> None:
+        start = time.perf_counter()
+        func(i)
+        latency = time.perf_counter() - start
+        with lock:
+            latencies.append(latency)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for f in [executor.submit(call, i) for i in range(ops)]:
+            f.result()
+    return summarize(latencies, time.perf_counter() - start)
+
+
+class Timer:
+    """Collects latencies of named steps of a multi-step flow."""
+
+    def __init__(self) -> None:
+        self.latencies: dict[str, list[float]] = {}
+        self._lock = threading.Lock()
+
+    def step(self, name: str, func: t.Callable[[], t.Any]) -> t.Any:
+        start = time.perf_counter()
+        res = func()
+        latency = time.perf_counter() - start
+        with self._lock:
+            self.latencies.setdefault(name, []).append(latency)
+        return res
+
+    def summary(self, elapsed: float) -> dict[str, dict[str, float]]:
+        return {name: summarize(latencies, elapsed) for name, latencies in self.latencies.items()}
+
+
+class StubAppSvc:
+    """Minimal appsvc replacement served from a background thread (HTTP/1.1, keep-alive).
+
+    `connections` counts accepted TCP connections, `requests` counts served requests.
+    """
+
+    def __init__(self, port: int = 0, delay: float = 0.0) -> None:
+        stub = self
+        self.requests = 0
+        self.connections = 0
+
+        class RequestHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def setup(self) -> None:
+                stub.connections += 1
+                super().setup()
+
+            def do_POST(self) -> None:  # pylint: disable=invalid-name
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                stub.requests += 1
+                time.sleep(delay)
+                body = b""
+                if self.path == "/apps/run":
+                    container = {"id": f"container-{time.monotonic_ns()}", "node_id": "node-1", "region": "us-east-1"}
+                    body = json.dumps({"container": container}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args: t.Any) -> None:
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), RequestHandler)
+        self._server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._server.server_port}"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def __enter__(self) -> "StubAppSvc":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args: t.Any) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def save_results(path: str, results: dict, params: dict) -> None:
+    doc = {
+        "meta": {
+            "revision": git_revision(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "pid": os.getpid(),
+            "params": params,
+        },
+        "results": results,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(doc, f, indent=2, sort_keys=True)
+
+
+def compare(baseline_path: str, results: dict) -> list[str]:
+    """Returns human readable p50/p99/throughput changes against a previously saved results file."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)["results"]
+    lines = []
+    for name, cur in sorted(results.items()):
+        base = baseline.get(name)
+        if not base:
+            continue
+        changes = []
+        for key in ("p50_ms", "p99_ms", "throughput", "us_per_row", "us_per_call"):
+            if key in cur and key in base and base[key]:
+                changes.append(f"{key} {base[key]:.2f} -> {cur[key]:.2f} ({(cur[key] / base[key] - 1) * 100:+.1f}%)")
+        lines.append(f"{name}: {', '.join(changes)}")
+    return lines
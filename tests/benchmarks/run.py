@@ -0,0 +1,217 @@
+"""Session lifecycle, read and stats ingestion benchmarks.
+
+Runs in-process (flask test client) against a throwaway postgres db configured through the usual SQLDB_* env vars
+and a local stub appsvc. Migrations are applied, benchmark rows are removed at the end.
+
+    python tests/benchmarks/run.py --rows 10000 --out results.json
+    python tests/benchmarks/run.py --rows 1000000 --only reads --compare results.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import time
+import typing as t
+
+from common import (
+    StubAppSvc,
+    Timer,
+    compare,
+    measure,
+    save_results,
+)
+
+# user ids range reserved for benchmark rows
+BENCH_USER_ID = 9_000_000_000_000
+BENCH_SESSION_PREFIX = "bench-"
+
+GROUPS = ("lifecycle", "reads", "stats", "micro", "appsvc")
+
+
+def _check(res: t.Any) -> t.Any:
+    if res.status_code >= 300:
+        raise RuntimeError(f"unexpected response {res.status_code}: {res.data[:200]!r}")
+    return res
+
+
+def _cleanup(app: t.Any) -> None:
+    from sessionsvc.biz.sqldb import sqldb  # pylint: disable=import-outside-toplevel
+
+    with app.app_context():
+        params = {"user_id": BENCH_USER_ID}
+        sqldb.session.execute(sqldb.text("DELETE FROM sessions.sessions WHERE user_id >= :user_id"), params)
+        sqldb.session.execute(sqldb.text("DELETE FROM stats.webrtc_stats_logs WHERE user_id >= :user_id"), params)
+        sqldb.session.execute(sqldb.text("DELETE FROM stats.users_dcs_rtts WHERE user_id >= :user_id"), params)
+        sqldb.session.commit()
+
+
+def _seed(app: t.Any, rows: int) -> None:
+    """Inserts `rows` active sessions spread over 100 nodes and all regions."""
+    from sessionsvc.biz.sqldb import sqldb  # pylint: disable=import-outside-toplevel
+
+    with app.app_context():
+        sqldb.session.execute(
+            sqldb.text(
+                """
+                INSERT INTO sessions.sessions (id, app_release_uuid, container, status, user_id, ws_conn)
+                SELECT
+                    :prefix || lpad(i::TEXT, 8, '0'),
+                    'app-' || (i % 50),
+                    jsonb_build_object(
+                        'id', 'container-' || i,
+                        'node_id', 'node-' || (i % 100),
+                        'region', (ARRAY['EU_CENTRAL_1', 'US_EAST_1', 'US_WEST_1'])[1 + i % 3]
+                    ),
+                    'active',
+                    :user_id + i,
+                    jsonb_build_object('id', 'ws-' || i, 'consumer_id', 'consumer-' || i, 'producer_id', 'producer-' || i)
+                FROM generate_series(1, :rows) i
+                """
+            ),
+            {"prefix": BENCH_SESSION_PREFIX, "user_id": BENCH_USER_ID + 10**9, "rows": rows},
+        )
+        sqldb.session.commit()
+        sqldb.session.execute(sqldb.text("ANALYZE sessions.sessions"))
+        sqldb.session.commit()
+
+
+def bench_lifecycle(app: t.Any, ops: int, concurrency: int) -> dict:
+    """create -> start -> pause -> resume (create) -> start -> close, per unique user."""
+    timer = Timer()
+    ws_conn = {"id": "ws", "consumer_id": "consumer"}
+
+    def flow(i: int) -> None:
+        client = app.test_client()
+        create_req = {"app_release_uuid": "bench-app", "user_id": BENCH_USER_ID + i, "ws_conn": ws_conn}
+        start_req = {"ws_conn": {**ws_conn, "producer_id": "producer"}}
+        sid = timer.step("create", lambda: _check(client.post("/sessions/create", json=create_req))).json["session_id"]
+        timer.step("start", lambda: _check(client.post(f"/sessions/{sid}/start", json=start_req)))
+        timer.step("pause", lambda: _check(client.post(f"/sessions/{sid}/pause")))
+        timer.step("resume", lambda: _check(client.post("/sessions/create", json=create_req)))
+        timer.step("start_resumed", lambda: _check(client.post(f"/sessions/{sid}/start", json=start_req)))
+        timer.step("close", lambda: _check(client.post(f"/sessions/{sid}/close")))
+
+    start = time.perf_counter()
+    measure(flow, ops, concurrency)
+    return {f"lifecycle.{name}": res for name, res in timer.summary(time.perf_counter() - start).items()}
+
+
+def bench_reads(app: t.Any, rows: int, ops: int, concurrency: int) -> dict:
+    client = app.test_client()
+    rnd = random.Random(rows)
+
+    def session_id() -> str:
+        return f"{BENCH_SESSION_PREFIX}{rnd.randint(1, rows):08d}"
+
+    res = {
+        "reads.get_session": measure(lambda i: _check(client.get(f"/sessions/{session_id()}")), ops, concurrency),
+        "reads.get_user_sessions": measure(
+            lambda i: _check(client.get(f"/users/{BENCH_USER_ID + 10**9 + rnd.randint(1, rows)}/sessions")),
+            ops,
+            concurrency,
+        ),
+        "reads.get_consumer_sessions": measure(
+            lambda i: _check(client.get(f"/consumers/consumer-{rnd.randint(1, rows)}/sessions")), ops, concurrency
+        ),
+        "reads.list_page": measure(lambda i: _check(client.get("/sessions?limit=100")), ops, concurrency),
+        "reads.list_page_by_node": measure(
+            lambda i: _check(client.get(f"/sessions?limit=100&node_id=node-{rnd.randint(0, 99)}")), ops, concurrency
+        ),
+    }
+    streamed = []
+    res["reads.list_stream_all"] = measure(
+        lambda i: streamed.append(len(_check(client.get("/sessions?stream=true")).data.splitlines())), 1
+    )
+    res["reads.list_stream_all"]["rows"] = streamed[0]
+    return res
+
+
+def bench_stats(app: t.Any, rows: int, ops: int, concurrency: int) -> dict:
+    client = app.test_client()
+    rnd = random.Random(ops)
+    stats = json.dumps({"remote_inbound_rtp": {"round_trip_time": 0.05, "packetsLost": 1}, "inbound_rtp": {"fps": 60}})
+    mode = app.config.get("STATS_INGEST_MODE", "sync")
+
+    def submit(i: int) -> None:
+        sid = f"{BENCH_SESSION_PREFIX}{rnd.randint(1, min(rows, 1000)):08d}"
+        _check(client.post(f"/sessions/{sid}/stats", json={"stats": stats}))
+
+    return {f"stats.submit_{mode}": measure(submit, ops, concurrency)}
+
+
+def bench_micro(rows: int) -> dict:
+    # pylint: disable=import-outside-toplevel
+    import bench_logging
+    import bench_serialization
+
+    results = {f"micro.{name}": {"us_per_row": usec} for name, usec in bench_serialization.run(rows).items()}
+    results.update({f"micro.logging.{name}": {"us_per_call": usec} for name, usec in bench_logging.run(rows).items()})
+    return results
+
+
+def bench_appsvc(ops: int, concurrency: int) -> dict:
+    import bench_appsvc_client  # pylint: disable=import-outside-toplevel
+
+    return bench_appsvc_client.run(ops, concurrency)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000, help="sessions seeded for read/stats benchmarks")
+    parser.add_argument("--ops", type=int, default=1000, help="operations per benchmark")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--appsvc-delay", type=float, default=0.0, help="stub appsvc response delay, seconds")
+    parser.add_argument("--stats-mode", choices=("sync", "buffered"), default="sync")
+    parser.add_argument("--only", nargs="*", choices=GROUPS, default=list(GROUPS))
+    parser.add_argument("--out", help="write results to this json file")
+    parser.add_argument("--compare", help="compare results with a previously written json file")
+    args = parser.parse_args()
+
+    results: dict = {}
+    if "micro" in args.only:
+        results.update(bench_micro(1000))
+
+    with StubAppSvc(delay=args.appsvc_delay) as appsvc:
+        os.environ["APPSVC_URL"] = appsvc.url
+        os.environ["FLASK_STATS_INGEST_MODE"] = args.stats_mode
+        # pylint: disable=import-outside-toplevel
+        from sessionsvc import (
+            create_app,
+            migrations,
+        )
+        from sessionsvc.biz.sqldb import sqldb
+
+        app = create_app()
+        # per-call debug logging would dominate the measurements
+        for name in ("sessionsvc", app.logger.name, "werkzeug", ""):
+            logging.getLogger(name).setLevel(logging.WARNING)
+        with app.app_context():
+            migrations.upgrade(sqldb.engine)
+        _cleanup(app)
+        try:
+            if "appsvc" in args.only:
+                results.update(bench_appsvc(args.ops, args.concurrency))
+            if "lifecycle" in args.only:
+                results.update(bench_lifecycle(app, args.ops // 5, args.concurrency))
+            if {"reads", "stats"} & set(args.only):
+                _seed(app, args.rows)
+            if "reads" in args.only:
+                results.update(bench_reads(app, args.rows, args.ops, args.concurrency))
+            if "stats" in args.only:
+                results.update(bench_stats(app, args.rows, args.ops, args.concurrency))
+        finally:
+            _cleanup(app)
+
+    for name, res in sorted(results.items()):
+        print(f"{name:<36} " + " ".join(f"{k}={v:.2f}" for k, v in res.items()))
+    if args.out:
+        save_results(args.out, results, vars(args))
+    if args.compare:
+        print("\n".join(compare(args.compare, results)))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
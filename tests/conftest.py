@@ -0,0 +1,57 @@
+import os
+import time
+import typing as t
+
+import pytest
+from flask import Flask
+
+from sessionsvc.services import appsvc
+from sessionsvc.services.dto.appsvc import (
+    ContainerDescr,
+    DcRegion,
+    RunAppResponseDTO,
+)
+
+# integration tests run against a migrated throwaway db configured through the usual SQLDB_* env vars
+os.environ.setdefault("APPSVC_URL", "http://localhost:8085")
+
+
+@pytest.fixture(scope="session")
+def app() -> Flask:
+    if "SQLDB_HOST" not in os.environ:
+        pytest.skip("SQLDB_* env vars are not set")
+
+    # pylint: disable=import-outside-toplevel
+    from sessionsvc import (
+        create_app,
+        migrations,
+    )
+    from sessionsvc.biz.sqldb import sqldb
+
+    app = create_app()
+    with app.app_context():
+        migrations.upgrade(sqldb.engine)
+    return app
+
+
+@pytest.fixture
+def fake_appsvc(monkeypatch: pytest.MonkeyPatch) -> list[str]:
+    """Replaces appsvc calls, returns the names of the calls made."""
+    calls: list[str] = []
+
+    def run_app(req: t.Any) -> RunAppResponseDTO:
+        calls.append("run")
+        return RunAppResponseDTO(container=ContainerDescr(id="c-1012", node_id="n-1012", region=DcRegion.US_EAST_1))
+
+    def app_op(op: str) -> t.Callable[[t.Any], None]:
+        def call(req: t.Any) -> None:
+            calls.append(op)
+            # widens the window for concurrent requests to interleave
+            time.sleep(0.05)
+
+        return call
+
+    monkeypatch.setattr(appsvc, "run_app", run_app)
+    for op in ("pause", "resume", "stop"):
+        monkeypatch.setattr(appsvc, f"{op}_app", app_op(op))
+    return calls
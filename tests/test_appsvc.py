@@ -0,0 +1,142 @@
+import os
+import threading
+import time
+import typing as t
+from http.server import (
+    BaseHTTPRequestHandler,
+    ThreadingHTTPServer,
+)
+
+import pytest
+
+from sessionsvc.services import helpers
+from sessionsvc.services.helpers import (
+    Bulkhead,
+    CircuitBreaker,
+    OpStats,
+    PooledHttpClient,
+)
+
+
+@pytest.mark.unit
+def test_circuit_breaker_opens_on_failure_rate() -> None:
+    breaker = CircuitBreaker(window=10, min_calls=4, failure_rate=0.5, open_duration=60)
+    for failed in (False, True, False):
+        assert breaker.allow()
+        breaker.record(failed)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+    breaker.record(True)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    assert breaker.stats()["rejected"] == 1
+    assert breaker.stats()["opened"] == 1
+
+
+@pytest.mark.unit
+def test_circuit_breaker_half_open() -> None:
+    breaker = CircuitBreaker(window=4, min_calls=2, failure_rate=0.5, open_duration=0.05)
+    for _ in range(2):
+        breaker.allow()
+        breaker.record(True)
+    assert not breaker.allow()
+    time.sleep(0.06)
+    # a single trial call is let through
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+    breaker.record(True)
+    assert breaker.state == CircuitBreaker.OPEN
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record(False)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+
+
+@pytest.mark.unit
+def test_bulkhead_rejects_over_capacity() -> None:
+    bulkhead = Bulkhead(max_concurrent=2, wait=0.01)
+    assert bulkhead.acquire()
+    assert bulkhead.acquire()
+    assert not bulkhead.acquire()
+    assert bulkhead.stats() == {"in_flight": 2, "max_concurrent": 2, "rejected": 1}
+    bulkhead.release()
+    assert bulkhead.acquire()
+
+
+@pytest.mark.unit
+def test_bulkhead_waits_for_free_slot() -> None:
+    bulkhead = Bulkhead(max_concurrent=1, wait=1.0)
+    assert bulkhead.acquire()
+    threading.Timer(0.05, bulkhead.release).start()
+    assert bulkhead.acquire()
+    assert bulkhead.stats()["rejected"] == 0
+
+
+class _OkHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def do_POST(self) -> None:  # pylint: disable=invalid-name
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args: t.Any) -> None:
+        pass
+
+
+@pytest.fixture
+def server_url() -> t.Iterator[str]:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _OkHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.unit
+def test_pooled_http_client_reuses_connections(server_url: str) -> None:
+    client = PooledHttpClient(pool_maxsize=2)
+    assert client.pool_stats() == {"connections_opened": 0, "requests": 0, "idle_connections": 0, "pool_maxsize": 2}
+    session = client.session()
+    for _ in range(3):
+        assert session.post(server_url, data="{}", headers={}, timeout=(1, 1)).status_code == 200
+    assert client.session() is session
+    assert client.pool_stats() == {"connections_opened": 1, "requests": 3, "idle_connections": 1, "pool_maxsize": 2}
+
+
+@pytest.mark.unit
+def test_pooled_http_client_is_recreated_after_fork(monkeypatch: pytest.MonkeyPatch) -> None:
+    client = PooledHttpClient()
+    session = client.session()
+    child_pid = os.getpid() + 1
+    monkeypatch.setattr(helpers.os, "getpid", lambda: child_pid)
+    # the parent's pools are not reported, nor reused
+    assert client.pool_stats()["connections_opened"] == 0
+    assert client.session() is not session
+    assert client.session() is client.session()
+
+
+@pytest.mark.unit
+def test_op_stats() -> None:
+    stats = OpStats()
+    stats.record("run", 0.2, error=False)
+    stats.record("run", 0.4, error=True)
+    with pytest.raises(ValueError):
+        with stats.timed("stop"):
+            raise ValueError()
+    snapshot = stats.snapshot()
+    assert snapshot["run"] == {
+        "calls": 2,
+        "errors": 1,
+        "latency_total": pytest.approx(0.6),
+        "latency_max": 0.4,
+        "latency_avg": pytest.approx(0.3),
+    }
+    assert snapshot["stop"]["calls"] == 1
+    assert snapshot["stop"]["errors"] == 1
+    # snapshots are copies
+    snapshot["run"]["calls"] = 0
+    assert stats.snapshot()["run"]["calls"] == 2
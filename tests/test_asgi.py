@@ -0,0 +1,212 @@
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import threading
+import time
+import typing as t
+from concurrent.futures import ThreadPoolExecutor
+from http.server import (
+    BaseHTTPRequestHandler,
+    ThreadingHTTPServer,
+)
+
+import pytest
+import requests
+from flask import Flask
+
+from sessionsvc.asgi import AsgiAdapter
+from sessionsvc.biz.models import (
+    SessionDAO,
+    SessionsLogDAO,
+)
+from sessionsvc.biz.sqldb import sqldb
+
+USER_ID = -1020
+APPSVC_DELAY = 0.2
+SERVER_START_TIMEOUT = 30.0
+
+
+class _AppSvcHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self) -> None:  # pylint: disable=invalid-name
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(APPSVC_DELAY)
+        body = b""
+        if self.path == "/apps/run":
+            container = {"id": f"c-{time.monotonic_ns()}", "node_id": "n-1020", "region": "us-east-1"}
+            body = json.dumps({"container": container}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args: t.Any) -> None:
+        pass
+
+
+class _AppSvcServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # all concurrent calls of a test connect at once
+    request_queue_size = 64
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture(scope="module")
+def server(app) -> t.Iterator[str]:
+    """uvicorn serving sessionsvc.asgi against a stub appsvc answering after APPSVC_DELAY seconds."""
+    appsvc = _AppSvcServer(("127.0.0.1", 0), _AppSvcHandler)
+    threading.Thread(target=appsvc.serve_forever, daemon=True).start()
+
+    port = _free_port()
+    env = {
+        **os.environ,
+        "APPSVC_URL": f"http://127.0.0.1:{appsvc.server_port}",
+        "APPSVC_RUN_MAX_CONCURRENCY": "20",
+        "APPSVC_STOP_MAX_CONCURRENCY": "20",
+        "FLASK_LOG_LEVEL": "WARNING",
+        "FLASK_SESSION_FEED_HEARTBEAT_INTERVAL": "0.2",
+    }
+    cmd = ["uvicorn", "--factory", "--port", str(port), "sessionsvc.asgi:create_asgi_app"]
+    proc = subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + SERVER_START_TIMEOUT
+        while True:
+            try:
+                requests.get(f"{url}/caches/sessions", timeout=1)
+                break
+            except requests.ConnectionError:
+                if time.monotonic() > deadline or proc.poll() is not None:
+                    raise
+                time.sleep(0.2)
+        yield url
+    finally:
+        proc.terminate()
+        proc.wait()
+        appsvc.shutdown()
+
+
+@pytest.fixture
+def cleanup(app) -> t.Iterator[None]:
+    def delete() -> None:
+        with app.app_context():
+            for dao in (SessionDAO, SessionsLogDAO):
+                sqldb.session.query(dao).filter(dao.user_id <= USER_ID, dao.user_id > USER_ID - 100).delete()
+            sqldb.session.commit()
+
+    delete()
+    yield
+    delete()
+
+
+def _create(url: str, user_id: int = USER_ID) -> requests.Response:
+    ws_conn = {"id": "ws", "consumer_id": "c"}
+    req = {"app_release_uuid": "421ba7f4-97ad-4c5d-8fbc-e176513516ba", "user_id": user_id, "ws_conn": ws_conn}
+    return requests.post(f"{url}/sessions/create", json=req, timeout=10)
+
+
+@pytest.mark.unit
+class TestAsgiScopes:
+    @staticmethod
+    def _serve(scope_type: str, received: list[dict]) -> list[dict]:
+        sent: list[dict] = []
+
+        async def receive() -> dict:
+            return received.pop(0)
+
+        async def send(message: dict) -> None:
+            sent.append(message)
+
+        asyncio.run(AsgiAdapter(Flask(__name__))({"type": scope_type}, receive, send))
+        return sent
+
+    def test_lifespan(self, monkeypatch: pytest.MonkeyPatch):
+        monkeypatch.setattr(AsgiAdapter, "_close_connections", lambda self: None)
+        sent = self._serve("lifespan", [{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}])
+        assert sent == [{"type": "lifespan.startup.complete"}, {"type": "lifespan.shutdown.complete"}]
+
+    def test_websocket_is_rejected(self):
+        sent = self._serve("websocket", [{"type": "websocket.connect"}])
+        assert sent == [{"type": "websocket.close", "code": 1000}]
+
+    def test_unknown_scope_type_raises(self):
+        with pytest.raises(ValueError):
+            self._serve("webtransport", [])
+
+
+@pytest.mark.integration
+class TestAsgi:
+    def test_errors_match_wsgi(self, app, server):
+        client = app.test_client()
+        for method, path, body in (
+            ("GET", "/sessions/unknown-session", None),
+            ("POST", "/sessions/create", {"user_id": "not a number"}),
+            ("GET", "/no/such/route", None),
+        ):
+            wsgi = client.open(path, method=method, json=body)
+            asgi = requests.request(method, f"{server}{path}", json=body, timeout=10)
+            assert asgi.status_code == wsgi.status_code
+            assert asgi.headers["Content-Type"] == wsgi.headers["Content-Type"]
+            assert asgi.content == wsgi.data
+
+    def test_session_lifecycle(self, server, cleanup):
+        res = _create(server)
+        assert res.status_code == 200
+        session_id = res.json()["session_id"]
+
+        session = requests.get(f"{server}/sessions/{session_id}", timeout=10).json()["session"]
+        assert session["user_id"] == USER_ID
+        assert session["container"]["node_id"] == "n-1020"
+        users = requests.get(f"{server}/users/{USER_ID}/sessions", timeout=10).json()
+        assert [s["id"] for s in users["sessions"]] == [session_id]
+
+        assert requests.post(f"{server}/sessions/{session_id}/close", timeout=10).status_code == 200
+        assert requests.get(f"{server}/sessions/{session_id}", timeout=10).json()["code"] == 1404
+
+    def test_appsvc_calls_do_not_block_other_requests(self, server, cleanup):
+        # 20 creates (one appsvc call each) in one worker, serially they would take 20 * APPSVC_DELAY
+        calls = 20
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=calls) as pool:
+            statuses = list(pool.map(lambda i: _create(server, USER_ID - i).status_code, range(calls)))
+        elapsed = time.monotonic() - start
+
+        assert statuses == [200] * calls
+        assert elapsed < calls * APPSVC_DELAY / 2
+
+    def test_session_feed(self, server, cleanup):
+        def subscribers() -> float:
+            metrics = requests.get(f"{server}/metrics", timeout=10).text.splitlines()
+            return float(next(m for m in metrics if m.startswith("sessionsvc_feed_subscribers ")).split()[1])
+
+        with requests.get(f"{server}/users/{USER_ID}/events", stream=True, timeout=10) as res:
+            lines = res.iter_lines()
+            assert next(lines) == b"event: snapshot"
+            assert json.loads(next(lines).removeprefix(b"data: ")) == {"sessions": []}
+            assert subscribers() == 1
+            session_id = _create(server).json()["session_id"]
+            statuses = []
+            for line in lines:
+                if line.startswith(b"data: "):
+                    statuses.append(json.loads(line.removeprefix(b"data: "))["status"])
+                    if len(statuses) == 1:
+                        requests.post(f"{server}/sessions/{session_id}/close", timeout=10)
+                    if statuses[-1] == "closed":
+                        break
+        assert statuses[0] == "pending"
+        assert statuses[-1] == "closed"
+
+        # dropped on the first heartbeat after the client is gone
+        deadline = time.monotonic() + 5
+        while subscribers() and time.monotonic() < deadline:
+            time.sleep(0.1)
+        assert subscribers() == 0
@@ -0,0 +1,144 @@
+import threading
+import time
+import typing as t
+
+import pytest
+from sqlalchemy import text
+
+from sessionsvc.biz.cache import TTLCache
+from sessionsvc.biz.pgnotify import (
+    CHANNEL_SESSIONS,
+    PgListener,
+)
+from sessionsvc.biz.session import (
+    _on_sessions_notify,
+    session_cache,
+)
+from sessionsvc.biz.sqldb import sqldb
+
+
+def _wait_for(condition: t.Callable[[], bool], timeout: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not met in time"
+        time.sleep(0.01)
+
+
+@pytest.mark.unit
+class TestTTLCache:
+    def test_hit_and_miss(self):
+        cache: TTLCache[str, int] = TTLCache()
+        assert cache.get("a") is None
+        cache.set("a", 1, cache.generation)
+        assert cache.get("a") == 1
+        assert cache.stats() == {
+            "hits": 1,
+            "misses": 1,
+            "invalidations": 0,
+            "size": 1,
+            "maxsize": 10000,
+            "ttl": 10.0,
+        }
+
+    def test_entries_expire_and_least_recently_used_are_evicted(self):
+        cache: TTLCache[str, int] = TTLCache(maxsize=2, ttl=0.05)
+        for i, key in enumerate("abc"):
+            cache.set(key, i, cache.generation)
+            cache.get("a")
+        assert [cache.get(key) for key in "abc"] == [0, None, 2]
+        time.sleep(0.06)
+        assert cache.get("a") is None
+
+    def test_write_invalidates(self):
+        cache: TTLCache[str, int] = TTLCache()
+        cache.set("a", 1, cache.generation)
+        cache.invalidate("a")
+        assert cache.get("a") is None
+        cache.set("a", 2, cache.generation)
+        assert cache.get("a") == 2
+
+    def test_fill_racing_an_invalidation_is_not_cached(self):
+        cache: TTLCache[str, int] = TTLCache()
+        generation = cache.generation
+        cache.invalidate("a")
+        cache.set("a", 1, generation)
+        assert cache.get("a") is None
+
+        generation = cache.generation
+        cache.clear()
+        cache.set("a", 1, generation)
+        assert cache.get("a") is None
+
+    def test_invalidations_of_other_keys_do_not_discard_fills(self):
+        cache: TTLCache[str, int] = TTLCache()
+        generation = cache.generation
+        for i in range(100):
+            cache.invalidate(f"other-{i}")
+        cache.set("a", 1, generation)
+        assert cache.get("a") == 1
+
+    def test_evicted_stamps_discard_older_fills(self):
+        cache: TTLCache[str, int] = TTLCache(maxsize=2)
+        generation = cache.generation
+        for key in "abc":
+            cache.invalidate(key)
+        # the stamp of a is gone, the fill may have raced its invalidation
+        cache.set("a", 1, generation)
+        assert cache.get("a") is None
+        cache.set("a", 1, cache.generation)
+        assert cache.get("a") == 1
+
+    def test_concurrent_fills_and_invalidations(self):
+        cache: TTLCache[int, int] = TTLCache(maxsize=100)
+        db = dict.fromkeys(range(10), 0)
+        stop = threading.Event()
+
+        def write() -> None:
+            while not stop.is_set():
+                for key in db:
+                    db[key] += 1
+                    cache.invalidate(key)
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        try:
+            for _ in range(10000):
+                for key in db:
+                    generation = cache.generation
+                    cache.set(key, db[key], generation)
+        finally:
+            stop.set()
+            writer.join()
+        # whatever is left cached is up to date
+        for key, value in db.items():
+            assert cache.get(key) in (None, value)
+
+
+@pytest.mark.integration
+class TestPgListener:
+    def test_reconnect_clears_session_cache(self, app, monkeypatch: pytest.MonkeyPatch):
+        monkeypatch.setattr("sessionsvc.biz.pgnotify.RECONNECT_DELAY", 0.05)
+        listener = PgListener()
+        listener.init_app(app)
+        listener.subscribe(CHANNEL_SESSIONS, _on_sessions_notify)
+        conns: list[t.Any] = []
+        connect = listener._connect  # pylint: disable=protected-access
+
+        def capture() -> t.Any:
+            conns.append(connect())
+            return conns[-1]
+
+        monkeypatch.setattr(listener, "_connect", capture)
+        listener.ensure_started()
+        try:
+            _wait_for(lambda: listener.connected)
+            session_cache.set("pg-listener-test", t.cast(t.Any, "cached"), session_cache.generation)
+            assert session_cache.get("pg-listener-test") == "cached"
+
+            with app.app_context():
+                sqldb.session.execute(text("SELECT pg_terminate_backend(:pid)"), {"pid": conns[0].get_backend_pid()})
+                sqldb.session.commit()
+            _wait_for(lambda: len(conns) == 2 and listener.connected)
+            assert session_cache.get("pg-listener-test") is None
+        finally:
+            listener.close()
@@ -0,0 +1,109 @@
+import typing as t
+
+import pytest
+from sqlalchemy import delete
+
+from sessionsvc.biz.dcs import (
+    DEFAULT_INTER_REGION_RTT,
+    INTER_REGION_RTT,
+    DcRanker,
+    dc_ranker,
+    preferred_dcs,
+)
+from sessionsvc.biz.dto import DcRttSource
+from sessionsvc.biz.models import (
+    SessionDAO,
+    UsersDcsRttsDAO,
+)
+from sessionsvc.biz.rtt import empty_hist
+from sessionsvc.biz.sqlcount import SQL_STATEMENTS_HEADER
+from sessionsvc.biz.sqldb import sqldb
+from sessionsvc.services import appsvc
+from sessionsvc.services.dto.appsvc import (
+    DcRegion,
+    RunAppResponseDTO,
+)
+
+USER_ID = -1023
+
+
+@pytest.mark.unit
+class TestDcRanker:
+    def test_user_rtts_rank_first(self):
+        ranking = DcRanker().rank({"us-west-1": (100, 0.03), "us-east-1": (100, 0.08)}, {})
+        assert [r.region for r in ranking] == [DcRegion.US_WEST_1, DcRegion.US_EAST_1, DcRegion.EU_CENTRAL_1]
+        assert [r.source for r in ranking] == [DcRttSource.USER, DcRttSource.USER, DcRttSource.GEO]
+        assert ranking[2].rtt == pytest.approx(0.08 + 0.09)
+
+    def test_few_samples_are_shrunk_towards_population(self):
+        population = {DcRegion.EU_CENTRAL_1: 0.02, DcRegion.US_EAST_1: 0.1, DcRegion.US_WEST_1: 0.15}
+        ranking = DcRanker().rank({"us-east-1": (1, 0.01)}, population)
+        assert [r.region for r in ranking] == [DcRegion.US_EAST_1, DcRegion.US_WEST_1, DcRegion.EU_CENTRAL_1]
+        assert ranking[0].rtt == pytest.approx((0.01 + 10 * 0.1) / 11)
+        assert ranking[1].rtt == pytest.approx(ranking[0].rtt + 0.065)
+
+        ranking = DcRanker().rank({}, population)
+        assert [r.region for r in ranking] == [DcRegion.EU_CENTRAL_1, DcRegion.US_EAST_1, DcRegion.US_WEST_1]
+        assert {r.source for r in ranking} == {DcRttSource.POPULATION}
+
+    def test_unknown_region_pairs_get_the_default_distance(self, monkeypatch: pytest.MonkeyPatch):
+        monkeypatch.delitem(INTER_REGION_RTT, frozenset({DcRegion.US_EAST_1, DcRegion.US_WEST_1}))
+        ranking = DcRanker().rank({"us-east-1": (100, 0.08)}, {})
+        assert [r.region for r in ranking] == [DcRegion.US_EAST_1, DcRegion.EU_CENTRAL_1, DcRegion.US_WEST_1]
+        assert ranking[2].rtt == pytest.approx(0.08 + DEFAULT_INTER_REGION_RTT)
+
+    def test_no_estimates_leave_preferred_dcs_empty(self):
+        ranking = DcRanker().rank({"retired-region": (10, 0.01)}, {})
+        assert [r.source for r in ranking] == [DcRttSource.NONE] * len(DcRegion)
+        assert preferred_dcs(ranking) == []
+
+
+@pytest.fixture
+def rtts(app) -> t.Iterator[None]:
+    def cleanup() -> None:
+        with app.app_context():
+            sqldb.session.execute(delete(UsersDcsRttsDAO).where(UsersDcsRttsDAO.user_id == USER_ID))
+            sqldb.session.execute(delete(SessionDAO).where(SessionDAO.user_id == USER_ID))
+            sqldb.session.commit()
+        dc_ranker.cache.clear()
+
+    cleanup()
+    with app.app_context():
+        for region, rtt in (("us-west-1", 0.02), ("eu-central-1", 0.12)):
+            agg = UsersDcsRttsDAO(ewma=rtt, hist=empty_hist(), min_rtt=rtt, region=region, samples=50, user_id=USER_ID)
+            sqldb.session.add(agg)
+        sqldb.session.commit()
+    yield
+    cleanup()
+
+
+@pytest.mark.integration
+class TestUserDcs:
+    def test_get_user_dcs(self, app, rtts):
+        res = app.test_client().get(f"/users/{USER_ID}/dcs")
+        assert res.status_code == 200
+        assert [d["region"] for d in res.json["dcs"]] == ["us-west-1", "us-east-1", "eu-central-1"]
+        assert res.json["dcs"][1]["source"] == "geo"
+
+    def test_create_fills_preferred_dcs_in_the_same_round_trip(
+        self, app, rtts, fake_appsvc, monkeypatch: pytest.MonkeyPatch
+    ):
+        requests, fake_run_app = [], appsvc.run_app
+
+        def run_app(req: t.Any) -> RunAppResponseDTO:
+            requests.append(req)
+            return fake_run_app(req)
+
+        monkeypatch.setattr(appsvc, "run_app", run_app)
+        client = app.test_client()
+        body = {"app_release_uuid": "app", "user_id": USER_ID, "ws_conn": {"id": "ws", "consumer_id": "c"}}
+        res = client.post("/sessions/create", json=body)
+        assert res.status_code == 200
+        assert res.headers[SQL_STATEMENTS_HEADER] == "2"
+        assert requests[-1].preferred_dcs == ["us-west-1", "us-east-1", "eu-central-1"]
+        assert dc_ranker.cache.get(USER_ID) is not None
+
+        client.post(f"/sessions/{res.json['session_id']}/close")
+        client.post("/sessions/create", json={**body, "preferred_dcs": ["eu-central-1"]})
+        assert requests[-1].preferred_dcs == ["eu-central-1"]
+        assert fake_appsvc == ["run", "stop", "run"]
@@ -0,0 +1,85 @@
+import datetime
+
+import pytest
+from flask import Flask
+
+from sessionsvc.biz.dto import (
+    GetSessionsPageResponseDTO,
+    SessionDC,
+    SessionStatus,
+)
+from sessionsvc.biz.models import SessionDAO
+from sessionsvc.biz.serialization import (
+    JSON_BACKEND_ORJSON,
+    dumps,
+    output_fast_json,
+)
+from sessionsvc.services.dto.appsvc import DcRegion
+
+
+def _sessiondaos() -> list[SessionDAO]:
+    updated = datetime.datetime(2024, 5, 6, 7, 8, 9, 123456)
+    return [
+        SessionDAO(
+            id="s1",
+            app_release_uuid="app",
+            container={"id": "c1", "node_id": "n1", "region": DcRegion.US_EAST_1.name},
+            status=SessionStatus.ACTIVE.value,
+            updated=updated,
+            user_id=1,
+            ws_conn={"id": "w1", "consumer_id": "c1", "producer_id": "p1"},
+        ),
+        SessionDAO(
+            id="s2",
+            app_release_uuid="app",
+            container=None,
+            status=SessionStatus.PENDING.value,
+            updated=updated.replace(microsecond=0),
+            user_id=2,
+            ws_conn={"id": "w2", "consumer_id": "c2"},
+        ),
+    ]
+
+
+@pytest.mark.unit
+class TestSessionDC:
+    @pytest.mark.parametrize("sessiondao", _sessiondaos())
+    def test_from_sessiondao_matches_schema_load(self, sessiondao):
+        expected = SessionDC(
+            id=sessiondao.id,
+            app_release_uuid=sessiondao.app_release_uuid,
+            container=SessionDC.Container.Schema().load(sessiondao.container) if sessiondao.container else None,
+            status=SessionStatus(sessiondao.status),
+            user_id=sessiondao.user_id,
+            ws_conn=SessionDC.WsConn.Schema().load(sessiondao.ws_conn),
+            updated=sessiondao.updated.replace(tzinfo=datetime.timezone.utc),
+        )
+        assert SessionDC.from_sessiondao(sessiondao) == expected
+
+    @pytest.mark.parametrize("sessiondao", _sessiondaos())
+    def test_to_dict_matches_schema_dump(self, sessiondao):
+        session = SessionDC.from_sessiondao(sessiondao)
+        assert session.to_dict() == SessionDC.Schema().dump(session)
+        assert list(session.to_dict()) == list(SessionDC.Schema().dump(session))
+
+    def test_page_to_dict_matches_schema_dump(self):
+        res = GetSessionsPageResponseDTO(
+            sessions=[SessionDC.from_sessiondao(s) for s in _sessiondaos()],
+            next_cursor="cursor",
+        )
+        assert res.to_dict() == GetSessionsPageResponseDTO.Schema().dump(res)
+
+
+@pytest.mark.unit
+class TestOutputFastJson:
+    @pytest.mark.parametrize(
+        "config,body",
+        [({}, b'{"a": [1, "b"]}'), ({"JSON_BACKEND": JSON_BACKEND_ORJSON}, b'{"a":[1,"b"]}')],
+    )
+    def test_configured_backend_is_used(self, config, body):
+        app = Flask(__name__)
+        app.config.update(config)
+        with app.app_context():
+            resp = output_fast_json({"a": [1, "b"]}, 201, {"X-Test": "1"})
+            assert (resp.status_code, resp.headers["X-Test"], resp.get_data()) == (201, "1", body + b"\n")
+            assert dumps({"a": [1, "b"]}) == body
@@ -0,0 +1,143 @@
+import json
+import time
+import typing as t
+
+import pytest
+from sqlalchemy import text
+
+from sessionsvc.biz.errors import ERROR_FEED_BUSY
+from sessionsvc.biz.feed import (
+    RESYNC_EVENT,
+    Subscription,
+    session_feed,
+)
+from sessionsvc.biz.models import SessionDAO
+from sessionsvc.biz.pgnotify import pg_listener
+from sessionsvc.biz.sqldb import sqldb
+
+USER_ID = -1021
+
+
+@pytest.fixture
+def feed(app, monkeypatch: pytest.MonkeyPatch) -> t.Iterator[None]:
+    monkeypatch.setattr(session_feed, "heartbeat_interval", 0.2)
+    monkeypatch.setattr(session_feed, "max_duration", 10.0)
+    monkeypatch.setattr(session_feed, "max_subscribers", 2)
+
+    def cleanup() -> None:
+        with app.app_context():
+            sqldb.session.query(SessionDAO).filter(SessionDAO.user_id == USER_ID).delete()
+            sqldb.session.commit()
+
+    cleanup()
+    # a listener connecting later asks subscribers to resync
+    pg_listener.ensure_started()
+    deadline = time.monotonic() + 5
+    while not pg_listener.connected and time.monotonic() < deadline:
+        time.sleep(0.05)
+    yield
+    cleanup()
+
+
+def _execute(app: t.Any, sql: str) -> None:
+    with app.app_context():
+        sqldb.session.execute(text(sql), {"user_id": USER_ID})
+        sqldb.session.commit()
+
+
+def _events(res: t.Any) -> t.Iterator[tuple[str, t.Any]]:
+    """Yields (event, data) of a server-sent events response, ("heartbeat", None) for heartbeat comments."""
+    for chunk in res.response:
+        lines = chunk.decode().strip().split("\n")
+        if lines[0].startswith(":"):
+            yield "heartbeat", None
+        else:
+            yield lines[0].removeprefix("event: "), json.loads(lines[1].removeprefix("data: "))
+
+
+def _next_event(events: t.Iterator[tuple[str, t.Any]]) -> tuple[str, t.Any]:
+    for name, data in events:
+        if name != "heartbeat":
+            return name, data
+    raise AssertionError("stream ended")
+
+
+@pytest.mark.unit
+class TestSubscription:
+    def test_returns_pending_events(self):
+        sub = Subscription("id", "s-1", max_pending=10)
+        assert sub.next(0.01) == []
+        sub.push({"id": "s-1", "status": "active"})
+        sub.push({"id": "s-1", "status": "paused"})
+        assert [e["status"] for e in sub.next(0.01)] == ["active", "paused"]
+
+    def test_overflow_is_replaced_by_resync(self):
+        sub = Subscription("id", "s-1", max_pending=2)
+        for status in ("pending", "active", "paused"):
+            sub.push({"id": "s-1", "status": status})
+        assert sub.next(0.01) == [RESYNC_EVENT]
+
+
+@pytest.mark.integration
+class TestSessionFeed:
+    def test_streams_user_session_changes(self, app, feed):
+        client = app.test_client()
+        _execute(
+            app,
+            "INSERT INTO sessions.sessions (id, app_release_uuid, status, user_id, ws_conn) "
+            "VALUES ('feed-1', 'app', 'pending', :user_id, '{\"id\": \"ws\", \"consumer_id\": \"c-1021\"}')",
+        )
+        res = client.get(f"/users/{USER_ID}/events", buffered=False)
+        try:
+            assert res.status_code == 200
+            assert res.mimetype == "text/event-stream"
+            events = _events(res)
+            name, snapshot = _next_event(events)
+            assert name == "snapshot"
+            assert [s["status"] for s in snapshot["sessions"]] == ["pending"]
+
+            _execute(app, "UPDATE sessions.sessions SET status = 'active' WHERE user_id = :user_id")
+            _execute(app, "DELETE FROM sessions.sessions WHERE user_id = :user_id")
+            changes = []
+            while not changes or changes[-1]["status"] != "closed":
+                name, data = _next_event(events)
+                assert name == "status"
+                changes.append(data)
+            assert session_feed.subscribers == 1
+        finally:
+            res.close()
+
+        # the insert may be streamed too, if its notification arrived after the subscription
+        assert changes[-2:] == [
+            {"op": "update", "id": "feed-1", "status": "active", "user_id": USER_ID, "consumer_id": "c-1021"},
+            {"op": "delete", "id": "feed-1", "status": "closed", "user_id": USER_ID, "consumer_id": "c-1021"},
+        ]
+        assert session_feed.subscribers == 0
+
+    def test_other_sessions_changes_are_not_streamed(self, app, feed):
+        res = app.test_client().get("/sessions/feed-missing/events", buffered=False)
+        events = _events(res)
+        assert _next_event(events) == ("snapshot", {"sessions": []})
+        _execute(
+            app,
+            "INSERT INTO sessions.sessions (id, app_release_uuid, status, user_id, ws_conn) "
+            "VALUES ('feed-2', 'app', 'pending', :user_id, '{\"id\": \"ws\", \"consumer_id\": \"c-1021\"}')",
+        )
+        try:
+            names = [name for name, _ in (next(events) for _ in range(5))]
+        finally:
+            res.close()
+
+        assert "status" not in names
+
+    def test_rejects_subscribers_over_limit(self, app, feed):
+        client = app.test_client()
+        streams = [client.get(f"/consumers/c-{i}/events", buffered=False) for i in range(2)]
+        try:
+            res = client.get("/consumers/c-2/events")
+            assert res.status_code == 409
+            assert res.json["code"] == ERROR_FEED_BUSY[0]
+        finally:
+            for stream in streams:
+                stream.close()
+        assert session_feed.subscribers == 0
@@ -0,0 +1,140 @@
+import datetime
+import io
+import json
+import logging
+import typing as t
+
+import pytest
+
+from sessionsvc.biz.dto import (
+    GetSessionsResponseDTO,
+    SessionDC,
+    SessionStatus,
+)
+from sessionsvc.biz.log import (
+    AsyncHandler,
+    DebugSampler,
+    JsonFormatter,
+    TextFormatter,
+    log_fields,
+)
+from sessionsvc.biz.misc import log_call
+
+
+@pytest.fixture
+def logger() -> t.Iterator[logging.Logger]:
+    logger = logging.getLogger("sessionsvc.test_log")
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    yield logger
+    logger.handlers.clear()
+
+
+def _handler(logger: logging.Logger, formatter: logging.Formatter, **kwargs: t.Any) -> tuple[AsyncHandler, io.StringIO]:
+    stream = io.StringIO()
+    target = logging.StreamHandler(stream)
+    target.setFormatter(formatter)
+    handler = AsyncHandler(target, **kwargs)
+    logger.addHandler(handler)
+    return handler, stream
+
+
+def _session(i: int) -> SessionDC:
+    return SessionDC(
+        id=f"session-{i}",
+        app_release_uuid="421ba7f4-97ad-4c5d-8fbc-e176513516ba",
+        container=None,
+        status=SessionStatus.PENDING,
+        user_id=i,
+        ws_conn=SessionDC.WsConn(id=f"ws-{i}", consumer_id=f"consumer-{i}", producer_id=f"producer-{i}"),
+        updated=datetime.datetime.now(datetime.timezone.utc),
+    )
+
+
+@pytest.mark.unit
+class TestAsyncHandler:
+    def test_writes_json_with_capped_fields(self, logger):
+        handler, stream = _handler(logger, JsonFormatter(), field_max_length=50)
+        res = GetSessionsResponseDTO(sessions=[_session(i) for i in range(1000)])
+        logger.info("got %d sessions", 1000, extra=log_fields(user_id=1, result=res, note="x" * 100))
+        handler.stop()
+
+        entry = json.loads(stream.getvalue())
+        assert entry["level"] == "INFO"
+        assert entry["logger"] == "sessionsvc.test_log"
+        assert entry["msg"] == "got 1000 sessions"
+        assert entry["user_id"] == 1
+        assert entry["note"] == "x" * 50 + "..."
+        assert entry["result"].startswith("GetSessionsResponseDTO(sessions=[SessionDC(")
+        assert len(entry["result"]) <= 53
+
+    def test_fields_are_rendered_only_for_written_records(self, logger):
+        handler, stream = _handler(logger, JsonFormatter())
+        logger.setLevel(logging.INFO)
+        calls = []
+        logger.debug("skipped", extra=log_fields(value=lambda: calls.append(1)))
+        logger.info("written", extra=log_fields(value=lambda: calls.append(1) or len(calls)))
+        handler.stop()
+
+        assert calls == [1]
+        assert json.loads(stream.getvalue())["value"] == 1
+
+    def test_writes_exceptions(self, logger):
+        handler, stream = _handler(logger, TextFormatter())
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            logger.exception("failed", extra=log_fields(session_id="s-1"))
+        handler.stop()
+
+        text = stream.getvalue()
+        assert "[ERROR] failed session_id=s-1" in text
+        assert "ValueError: boom" in text
+
+    def test_drops_records_when_full(self, logger):
+        handler, stream = _handler(logger, TextFormatter(), queue_size=1)
+        handler.target.acquire()
+        try:
+            for i in range(10):
+                logger.info("record %d", i)
+        finally:
+            handler.target.release()
+        handler.stop()
+
+        # the listener may have taken one record off the queue before blocking on the target
+        assert handler.dropped in (8, 9)
+        assert stream.getvalue().count("record") == 10 - handler.dropped
+
+    def test_samples_debug_records(self, logger):
+        handler, stream = _handler(logger, TextFormatter())
+        handler.addFilter(DebugSampler(0.0))
+        logger.debug("debug")
+        logger.info("info")
+        handler.stop()
+
+        assert "debug" not in stream.getvalue()
+        assert "info" in stream.getvalue()
+
+
+@pytest.mark.unit
+class TestLogCall:
+    def test_logs_result_and_duration(self, logger, monkeypatch):
+        monkeypatch.setattr("sessionsvc.biz.misc.log", logger)
+        handler, stream = _handler(logger, JsonFormatter())
+
+        @log_call
+        def get_session(session_id: str) -> str:
+            return f"session {session_id}"
+
+        assert get_session.__name__ == "get_session"
+        assert get_session(session_id="s-1") == "session s-1"
+        with pytest.raises(TypeError):
+            get_session(1, 2)
+        handler.stop()
+
+        returned, raised = [json.loads(line) for line in stream.getvalue().splitlines()]
+        assert returned["msg"] == "get_session returned"
+        assert returned["kwargs"] == "{'session_id': 's-1'}"
+        assert returned["result"] == "session s-1"
+        assert returned["duration_ms"] >= 0
+        assert raised["msg"] == "get_session raised TypeError"
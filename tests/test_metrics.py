@@ -0,0 +1,61 @@
+import pytest
+from prometheus_client.parser import text_string_to_metric_families
+
+from sessionsvc.biz.models import SessionDAO
+from sessionsvc.biz.sqldb import sqldb
+
+SESSION_ID = "metrics-1017"
+
+
+def _samples(client) -> dict[tuple[str, frozenset], float]:
+    res = client.get("/metrics")
+    assert res.status_code == 200
+    assert res.content_type.startswith("text/plain")
+    return {
+        (s.name, frozenset(s.labels.items())): s.value
+        for family in text_string_to_metric_families(res.get_data(as_text=True))
+        for s in family.samples
+    }
+
+
+@pytest.mark.integration
+class TestMetrics:
+    @pytest.fixture
+    def client(self, app):
+        def cleanup() -> None:
+            with app.app_context():
+                sqldb.session.query(SessionDAO).filter(SessionDAO.id == SESSION_ID).delete()
+                sqldb.session.commit()
+
+        cleanup()
+        yield app.test_client()
+        cleanup()
+
+    def test_request_and_db_metrics(self, app, client):
+        route = frozenset({"method": "GET", "route": "/sessions/<string:session_id>", "status": "409"}.items())
+        before = _samples(client).get(("sessionsvc_http_request_duration_seconds_count", route), 0)
+        assert client.get("/sessions/missing").status_code == 409
+        samples = _samples(client)
+        assert samples[("sessionsvc_http_request_duration_seconds_count", route)] == before + 1
+        assert samples[("sessionsvc_db_statement_duration_seconds_count", frozenset({"operation": "SELECT"}.items()))]
+        assert samples[("sessionsvc_db_pool_checkout_duration_seconds_count", frozenset())]
+        assert samples[("sessionsvc_db_pool_size", frozenset())] > 0
+        # only the /metrics request itself is being served
+        in_flight = frozenset({"method": "GET", "route": "/metrics"}.items())
+        assert samples[("sessionsvc_http_requests_in_flight", in_flight)] == 1
+
+    def test_sessions_by_status_and_region(self, app, client):
+        with app.app_context():
+            sqldb.session.add(
+                SessionDAO(
+                    id=SESSION_ID,
+                    app_release_uuid="app",
+                    container={"id": "c", "node_id": "n", "region": "US_EAST_1"},
+                    status="paused",
+                    user_id=-1017,
+                    ws_conn={"id": "ws", "consumer_id": "c"},
+                )
+            )
+            sqldb.session.commit()
+        labels = frozenset({"status": "paused", "region": "US_EAST_1"}.items())
+        assert _samples(client)[("sessionsvc_sessions", labels)] >= 1
@@ -0,0 +1,102 @@
+import typing as t
+
+import pytest
+from sqlalchemy import (
+    event,
+    text,
+)
+
+from sessionsvc.biz.audit import (
+    get_session_history,
+    get_user_history,
+)
+from sessionsvc.biz.dto import (
+    GetHistoryRequestDTO,
+    SessionStatus,
+)
+from sessionsvc.biz.models import SessionDAO
+from sessionsvc.biz.reaper import reaper
+from sessionsvc.biz.session import (
+    get_consumer_sessions,
+    get_producer_sessions,
+)
+from sessionsvc.biz.sqldb import sqldb
+from sessionsvc.migrations import _split_statements
+
+
+def _explain(func: t.Callable[[], t.Any]) -> str:
+    """Runs func and returns the query plan of the last statement it executed (seq scans disabled)."""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):  # pylint: disable=unused-argument
+        statements.append((statement, parameters))
+
+    event.listen(sqldb.engine, "before_cursor_execute", capture)
+    try:
+        func()
+    finally:
+        event.remove(sqldb.engine, "before_cursor_execute", capture)
+    statement, parameters = statements[-1]
+    sqldb.session.execute(text("SET LOCAL enable_seqscan = off"))
+    cursor = sqldb.session.connection().connection.cursor()
+    cursor.execute(f"EXPLAIN {statement}", parameters)
+    plan = "\n".join(row[0] for row in cursor.fetchall())
+    sqldb.session.rollback()
+    return plan
+
+
+@pytest.mark.unit
+class TestSplitStatements:
+    def test_do_blocks_are_kept_whole(self):
+        sql = """-- no-transaction
+CREATE INDEX CONCURRENTLY a_idx ON a (x);
+DO $$
+BEGIN
+    ALTER TABLE a RENAME TO b;
+    DROP INDEX a_idx;
+END
+$$;
+
+ALTER TABLE b
+    ADD COLUMN y INTEGER;
+"""
+        assert _split_statements(sql) == [
+            "-- no-transaction\nCREATE INDEX CONCURRENTLY a_idx ON a (x);",
+            "DO $$\nBEGIN\n    ALTER TABLE a RENAME TO b;\n    DROP INDEX a_idx;\nEND\n$$;",
+            "\nALTER TABLE b\n    ADD COLUMN y INTEGER;",
+        ]
+
+
+@pytest.mark.integration
+class TestLookupIndexes:
+    @pytest.mark.parametrize(
+        "func,index",
+        [
+            (lambda: get_consumer_sessions("consumer"), "sessions_ws_conn_consumer_id_idx"),
+            (lambda: get_producer_sessions("producer"), "sessions_ws_conn_producer_id_idx"),
+            (
+                lambda: sqldb.session.query(SessionDAO).filter(SessionDAO.container["node_id"].astext == "n").all(),
+                "sessions_container_node_id_idx",
+            ),
+            (
+                lambda: sqldb.session.query(SessionDAO).filter(SessionDAO.container["region"].astext == "r").all(),
+                "sessions_container_region_idx",
+            ),
+            (
+                lambda: reaper._claim(SessionStatus.PAUSED, 60),  # pylint: disable=protected-access
+                "sessions_status_updated_idx",
+            ),
+            (
+                lambda: get_session_history("s", GetHistoryRequestDTO(cursor=2**62)),
+                "sessions_logs_session_id_id_idx",
+            ),
+            (
+                lambda: get_user_history(1, GetHistoryRequestDTO(cursor=2**62)),
+                "sessions_logs_user_id_id_idx",
+            ),
+        ],
+    )
+    def test_lookup_uses_index(self, app, func, index):
+        with app.app_context():
+            plan = _explain(func)
+        assert index in plan, plan
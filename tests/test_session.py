@@ -0,0 +1,505 @@
+import json
+import threading
+import time
+import typing as t
+
+import pytest
+from sqlalchemy import text
+
+from sessionsvc.biz.audit import audit_writer
+from sessionsvc.biz.dto import SessionStatus
+from sessionsvc.biz.errors import (
+    ERROR_EXECUTOR_QUEUE_FULL,
+    AppSvcException,
+)
+from sessionsvc.biz.executor import BoundedExecutor
+from sessionsvc.biz.models import (
+    SessionDAO,
+    SessionsLogDAO,
+)
+from sessionsvc.biz.reaper import (
+    REAPER_LOCK_ID,
+    reaper,
+)
+from sessionsvc.biz.sqlcount import SQL_STATEMENTS_HEADER
+from sessionsvc.biz.sqldb import sqldb
+from sessionsvc.services import appsvc
+
+USER_ID = -1012
+# history tests use their own user, so audit entries of other tests still in the writer queue don't show up
+HISTORY_USER_ID = -1014
+APP_RELEASE_UUID = "421ba7f4-97ad-4c5d-8fbc-e176513516ba"
+
+
+@pytest.fixture
+def client(app):
+    def cleanup() -> None:
+        with app.app_context():
+            sqldb.session.query(SessionDAO).filter(SessionDAO.user_id.in_([USER_ID, HISTORY_USER_ID])).delete()
+            sqldb.session.query(SessionsLogDAO).filter(SessionsLogDAO.user_id.in_([USER_ID, HISTORY_USER_ID])).delete()
+            sqldb.session.commit()
+
+    cleanup()
+    yield app.test_client()
+    cleanup()
+
+
+def _create(client: t.Any, app_release_uuid: str = APP_RELEASE_UUID, user_id: int = USER_ID) -> t.Any:
+    return client.post(
+        "/sessions/create",
+        json={"app_release_uuid": app_release_uuid, "user_id": user_id, "ws_conn": {"id": "ws", "consumer_id": "c"}},
+    )
+
+
+def _start(client: t.Any, session_id: str, producer_id: str = "p") -> t.Any:
+    return client.post(
+        f"/sessions/{session_id}/start", json={"ws_conn": {"id": "ws", "consumer_id": "c", "producer_id": producer_id}}
+    )
+
+
+def _set_status(app: t.Any, status: SessionStatus) -> None:
+    with app.app_context():
+        sqldb.session.query(SessionDAO).filter(SessionDAO.user_id == USER_ID).update({SessionDAO.status: status.value})
+        sqldb.session.commit()
+
+
+@pytest.mark.integration
+class TestCreateSession:
+    def test_fresh_create_takes_two_statements(self, app, client, fake_appsvc):
+        res = _create(client)
+        assert res.status_code == 200
+        assert res.headers[SQL_STATEMENTS_HEADER] == "2"
+        assert fake_appsvc == ["run"]
+        session = client.get(f"/sessions/{res.json['session_id']}").json["session"]
+        assert session["container"]["id"] == "c-1012"
+        assert session["status"] == SessionStatus.PENDING.value
+
+    def test_resume_paused_session(self, app, client, fake_appsvc):
+        session_id = _create(client).json["session_id"]
+        _set_status(app, SessionStatus.PAUSED)
+        res = _create(client)
+        assert res.status_code == 200
+        assert res.json["session_id"] == session_id
+        assert res.headers[SQL_STATEMENTS_HEADER] == "2"
+        assert fake_appsvc == ["run", "resume"]
+        assert client.get(f"/sessions/{session_id}").json["session"]["status"] == SessionStatus.PENDING.value
+
+    def test_non_paused_session_of_same_app(self, app, client, fake_appsvc):
+        _create(client)
+        res = _create(client)
+        assert res.status_code == 409
+        assert res.json["code"] == 1409
+
+    def test_quota_exceeded(self, app, client, fake_appsvc):
+        _create(client)
+        _set_status(app, SessionStatus.PAUSED)
+        res = _create(client, app_release_uuid="other-app")
+        assert res.status_code == 409
+        assert res.json["code"] == 1429
+
+    def test_failed_session_is_replaced(self, app, client, fake_appsvc):
+        failed_id = _create(client).json["session_id"]
+        _set_status(app, SessionStatus.FAILED)
+        res = _create(client, app_release_uuid="other-app")
+        assert res.status_code == 200
+        assert res.json["session_id"] != failed_id
+        assert client.get(f"/sessions/{failed_id}").status_code == 409
+
+
+def _wait_for(condition: t.Callable[[], bool], timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not met in time"
+        time.sleep(0.01)
+
+
+@pytest.mark.integration
+class TestAsyncCreateSession:
+    @pytest.fixture
+    def executor(self, app, monkeypatch: pytest.MonkeyPatch) -> BoundedExecutor:
+        executor = BoundedExecutor("launch", max_workers=1, max_pending=0)
+        executor.init_app(app)
+        monkeypatch.setattr("sessionsvc.biz.session.launch_executor", executor)
+        return executor
+
+    @pytest.fixture
+    def launch(self, fake_appsvc, monkeypatch: pytest.MonkeyPatch) -> t.Iterator[threading.Event]:
+        """Holds run_app calls until set."""
+        release, run_app = threading.Event(), appsvc.run_app
+
+        def blocked_run_app(req: t.Any) -> t.Any:
+            assert release.wait(5)
+            return run_app(req)
+
+        monkeypatch.setattr(appsvc, "run_app", blocked_run_app)
+        yield release
+        release.set()
+
+    @staticmethod
+    def _session(client: t.Any, session_id: str) -> t.Optional[dict]:
+        res = client.get(f"/sessions/{session_id}")
+        return res.json["session"] if res.status_code == 200 else None
+
+    def test_container_is_filled_in(self, app, client, fake_appsvc, executor, launch):
+        res = _create(client)
+        assert res.status_code == 200
+        session_id = res.json["session_id"]
+        assert self._session(client, session_id)["container"] is None
+        launch.set()
+        _wait_for(lambda: self._session(client, session_id)["container"] is not None)
+        session = self._session(client, session_id)
+        assert session["container"]["id"] == "c-1012"
+        assert session["status"] == SessionStatus.PENDING.value
+        assert fake_appsvc == ["run"]
+
+    def test_launch_failure_fails_session(self, app, client, executor, monkeypatch: pytest.MonkeyPatch):
+        def run_app(req: t.Any) -> None:
+            raise AppSvcException()
+
+        monkeypatch.setattr(appsvc, "run_app", run_app)
+        session_id = _create(client).json["session_id"]
+        _wait_for(lambda: self._session(client, session_id)["status"] == SessionStatus.FAILED.value)
+        assert self._session(client, session_id)["container"] is None
+
+    def test_full_queue_deletes_session(self, app, client, fake_appsvc, executor, launch):
+        session_id = _create(client).json["session_id"]
+        res = _create(client, user_id=HISTORY_USER_ID)
+        assert res.status_code == 409
+        assert res.json["code"] == ERROR_EXECUTOR_QUEUE_FULL[0]
+        assert client.get(f"/users/{HISTORY_USER_ID}/sessions").json["sessions"] == []
+        assert executor.rejected == 1
+        launch.set()
+        _wait_for(lambda: self._session(client, session_id)["container"] is not None)
+
+    def test_start_during_launch_keeps_app(self, app, client, fake_appsvc, executor, launch):
+        session_id = _create(client).json["session_id"]
+        assert _start(client, session_id).status_code == 200
+        launch.set()
+        _wait_for(lambda: self._session(client, session_id)["container"] is not None)
+        assert self._session(client, session_id)["status"] == SessionStatus.ACTIVE.value
+        time.sleep(0.1)
+        assert fake_appsvc == ["run"]
+
+    def test_close_during_launch_stops_app(self, app, client, fake_appsvc, executor, launch):
+        session_id = _create(client).json["session_id"]
+        assert client.post(f"/sessions/{session_id}/close").status_code == 200
+        assert fake_appsvc == []
+        launch.set()
+        _wait_for(lambda: fake_appsvc == ["run", "stop"])
+        assert self._session(client, session_id) is None
+
+
+def _concurrently(app: t.Any, *requests: t.Callable[[t.Any], t.Any]) -> list[t.Any]:
+    """Issues requests from parallel threads (each with its own test client), returns responses in order."""
+    barrier = threading.Barrier(len(requests))
+    responses: list[t.Any] = [None] * len(requests)
+
+    def run(i: int) -> None:
+        client = app.test_client()
+        barrier.wait()
+        responses[i] = requests[i](client)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(len(requests))]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    return responses
+
+
+@pytest.mark.integration
+class TestSessionTransitions:
+    @pytest.fixture
+    def session_id(self, app, client, fake_appsvc) -> str:
+        session_id = _create(client).json["session_id"]
+        _start(client, session_id)
+        fake_appsvc.clear()
+        return session_id
+
+    def _status(self, client: t.Any, session_id: str) -> t.Optional[str]:
+        res = client.get(f"/sessions/{session_id}")
+        return res.json["session"]["status"] if res.status_code == 200 else None
+
+    def test_start_takes_one_statement(self, app, client, session_id):
+        res = _start(client, session_id, producer_id="p2")
+        assert res.status_code == 200
+        assert res.headers[SQL_STATEMENTS_HEADER] == "1"
+        session = client.get(f"/sessions/{session_id}").json["session"]
+        assert session["status"] == SessionStatus.ACTIVE.value
+        assert session["ws_conn"] == {"id": "ws", "consumer_id": "c", "producer_id": "p2"}
+
+    def test_illegal_transition(self, app, client, fake_appsvc, session_id):
+        assert client.post(f"/sessions/{session_id}/pause").status_code == 200
+        res = client.post(f"/sessions/{session_id}/pause")
+        assert res.status_code == 409
+        assert res.json["code"] == 1412
+        res = _start(client, session_id)
+        assert res.json["code"] == 1412
+        assert fake_appsvc == ["pause"]
+
+    def test_concurrent_pauses_call_appsvc_once(self, app, client, fake_appsvc, session_id):
+        responses = _concurrently(app, *[lambda c: c.post(f"/sessions/{session_id}/pause")] * 4)
+        assert sorted(r.status_code for r in responses) == [200, 409, 409, 409]
+        assert fake_appsvc == ["pause"]
+        assert self._status(client, session_id) == SessionStatus.PAUSED.value
+
+    def test_concurrent_closes_stop_app_once(self, app, client, fake_appsvc, session_id):
+        responses = _concurrently(app, *[lambda c: c.post(f"/sessions/{session_id}/close")] * 4)
+        assert all(r.status_code == 200 for r in responses)
+        assert fake_appsvc == ["stop"]
+        assert self._status(client, session_id) is None
+
+    def test_concurrent_pause_and_close(self, app, client, fake_appsvc, session_id):
+        pause, close = _concurrently(
+            app,
+            lambda c: c.post(f"/sessions/{session_id}/pause"),
+            lambda c: c.post(f"/sessions/{session_id}/close"),
+        )
+        assert close.status_code == 200
+        # pause either won the race (and close stopped the paused app) or found the session closing
+        assert pause.status_code == 200 or pause.json["code"] in (1404, 1412)
+        assert fake_appsvc.count("stop") == 1
+        assert fake_appsvc.count("pause") == (1 if pause.status_code == 200 else 0)
+        assert self._status(client, session_id) is None
+
+    def test_failed_pause_reverts_status(self, app, client, fake_appsvc, session_id, monkeypatch):
+        def pause_app(req: t.Any) -> None:
+            raise AppSvcException()
+
+        monkeypatch.setattr(appsvc, "pause_app", pause_app)
+        assert client.post(f"/sessions/{session_id}/pause").json["code"] == 1409
+        assert self._status(client, session_id) == SessionStatus.ACTIVE.value
+
+
+@pytest.mark.integration
+class TestSessionHistory:
+    @staticmethod
+    def _wait_history(client: t.Any, url: str, count: int) -> list[dict]:
+        deadline = time.monotonic() + 5 * audit_writer.flush_interval
+        while True:
+            entries = client.get(url).json["entries"]
+            if len(entries) >= count or time.monotonic() > deadline:
+                return entries
+            time.sleep(0.1)
+
+    def test_session_lifecycle_is_recorded(self, app, client, fake_appsvc):
+        session_id = _create(client, user_id=HISTORY_USER_ID).json["session_id"]
+        _start(client, session_id)
+        client.post(f"/sessions/{session_id}/pause")
+        client.post(f"/sessions/{session_id}/close")
+        entries = self._wait_history(client, f"/sessions/{session_id}/history", 4)
+        assert [(e["op"], e["status"]) for e in entries] == [
+            ("close", SessionStatus.CLOSED.value),
+            ("pause", SessionStatus.PAUSED.value),
+            ("start", SessionStatus.ACTIVE.value),
+            ("create", SessionStatus.PENDING.value),
+        ]
+        assert entries[1]["ws_conn"]["producer_id"] == "p"
+
+    def test_keyset_pagination(self, app, client, fake_appsvc):
+        first_id = _create(client, user_id=HISTORY_USER_ID).json["session_id"]
+        client.post(f"/sessions/{first_id}/close")
+        second_id = _create(client, user_id=HISTORY_USER_ID).json["session_id"]
+        entries = self._wait_history(client, f"/users/{HISTORY_USER_ID}/history", 3)
+        assert [e["session_id"] for e in entries] == [second_id, first_id, first_id]
+
+        page = client.get(f"/users/{HISTORY_USER_ID}/history?limit=2").json
+        assert [e["id"] for e in page["entries"]] == [e["id"] for e in entries[:2]]
+        page = client.get(f"/users/{HISTORY_USER_ID}/history?limit=2&cursor={page['next_cursor']}").json
+        assert [e["id"] for e in page["entries"]] == [entries[2]["id"]]
+        assert page["next_cursor"] is None
+
+
+@pytest.mark.integration
+class TestSessionReaper:
+    @pytest.fixture
+    def ttls(self, monkeypatch: pytest.MonkeyPatch) -> dict[SessionStatus, float]:
+        ttls = {status: 0.0 for status in SessionStatus}
+        monkeypatch.setattr(reaper, "ttls", ttls)
+        return ttls
+
+    @staticmethod
+    def _reap(app: t.Any) -> t.Optional[dict[str, int]]:
+        with app.app_context():
+            return reaper.run()
+
+    def test_expired_paused_session_is_reaped(self, app, client, fake_appsvc, ttls):
+        session_id = _create(client).json["session_id"]
+        _set_status(app, SessionStatus.PAUSED)
+        ttls[SessionStatus.PAUSED] = 0.1
+        time.sleep(0.2)
+        assert self._reap(app) == {SessionStatus.PAUSED.value: 1}
+        assert fake_appsvc == ["run", "stop"]
+        assert client.get(f"/sessions/{session_id}").status_code == 409
+        # the user's quota slot is free again
+        assert _create(client).status_code == 200
+
+    def test_pending_session_without_container_is_deleted(self, app, client, fake_appsvc, ttls):
+        _create(client)
+        with app.app_context():
+            sqldb.session.query(SessionDAO).filter(SessionDAO.user_id == USER_ID).update({SessionDAO.container: None})
+            sqldb.session.commit()
+        ttls[SessionStatus.PENDING] = 0.1
+        time.sleep(0.2)
+        assert self._reap(app) == {SessionStatus.PENDING.value: 1}
+        assert fake_appsvc == ["run"]
+
+    def test_fresh_sessions_are_kept(self, app, client, fake_appsvc, ttls):
+        session_id = _create(client).json["session_id"]
+        ttls[SessionStatus.PENDING] = 60
+        assert self._reap(app) == {SessionStatus.PENDING.value: 0}
+        assert client.get(f"/sessions/{session_id}").status_code == 200
+
+    def test_failed_stop_keeps_session_closed_for_retry(self, app, client, fake_appsvc, ttls, monkeypatch):
+        def stop_app(req: t.Any) -> None:
+            raise AppSvcException()
+
+        session_id = _create(client).json["session_id"]
+        monkeypatch.setattr(appsvc, "stop_app", stop_app)
+        ttls[SessionStatus.PENDING] = 0.1
+        ttls[SessionStatus.CLOSED] = 0.1
+        time.sleep(0.2)
+        # the claimed session is fresh again for the CLOSED ttl, so it's not retried within the same pass
+        assert self._reap(app) == {SessionStatus.PENDING.value: 0, SessionStatus.CLOSED.value: 0}
+        assert client.get(f"/sessions/{session_id}").json["session"]["status"] == SessionStatus.CLOSED.value
+        monkeypatch.setattr(appsvc, "stop_app", lambda req: None)
+        time.sleep(0.2)
+        assert self._reap(app) == {SessionStatus.PENDING.value: 0, SessionStatus.CLOSED.value: 1}
+
+    def test_concurrent_pass_is_skipped(self, app, client, ttls):
+        with app.app_context():
+            with sqldb.engine.connect() as conn:
+                conn.execute(text("SELECT pg_advisory_lock(:id)"), {"id": REAPER_LOCK_ID})
+                try:
+                    assert reaper.run() is None
+                finally:
+                    conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": REAPER_LOCK_ID})
+
+
+@pytest.mark.integration
+class TestBulkClose:
+    @pytest.fixture
+    def session_ids(self, app, client, fake_appsvc) -> list[str]:
+        ids = [_create(client, user_id=user_id).json["session_id"] for user_id in (USER_ID, HISTORY_USER_ID)]
+        fake_appsvc.clear()
+        return ids
+
+    @staticmethod
+    def _outcomes(res: t.Any) -> dict[str, str]:
+        assert res.status_code == 200, res.json
+        return {r["id"]: r["outcome"] for r in res.json["results"]}
+
+    def test_drain_node(self, app, client, fake_appsvc, session_ids):
+        res = client.post("/sessions/close", json={"node_id": "n-1012"})
+        assert self._outcomes(res) == {session_id: "closed" for session_id in session_ids}
+        assert fake_appsvc == ["stop", "stop"]
+        assert all(client.get(f"/sessions/{session_id}").status_code == 409 for session_id in session_ids)
+
+    def test_close_by_ids(self, app, client, fake_appsvc, session_ids):
+        res = client.post("/sessions/close", json={"ids": [session_ids[0], "missing"]})
+        assert self._outcomes(res) == {session_ids[0]: "closed", "missing": "not_found"}
+        assert fake_appsvc == ["stop"]
+        assert client.get(f"/sessions/{session_ids[1]}").status_code == 200
+
+    def test_failed_stop_restores_status(self, app, client, fake_appsvc, session_ids, monkeypatch):
+        def stop_app(req: t.Any) -> None:
+            raise AppSvcException()
+
+        monkeypatch.setattr(appsvc, "stop_app", stop_app)
+        res = client.post("/sessions/close", json={"region": "US_EAST_1"})
+        assert self._outcomes(res) == {session_id: "failed" for session_id in session_ids}
+        assert {r["error"] for r in res.json["results"]} == {"appsvc exception"}
+        for session_id in session_ids:
+            assert client.get(f"/sessions/{session_id}").json["session"]["status"] == SessionStatus.PENDING.value
+
+    @pytest.mark.parametrize("body", [{}, {"node_id": "n-1012", "region": "US_EAST_1"}, {"ids": []}])
+    def test_exactly_one_criterion_is_required(self, app, client, body):
+        assert client.post("/sessions/close", json=body).status_code == 400
+
+
+@pytest.mark.integration
+class TestGetSessions:
+    APP_RELEASE_UUID = "get-sessions-test"
+    USER_IDS = [-1060, -1061, -1062, -1063, -1064]
+    STATUSES = ["pending", "active", "paused", "active", "pending"]
+
+    @pytest.fixture
+    def session_ids(self, app) -> t.Iterator[list[str]]:
+        def cleanup() -> None:
+            with app.app_context():
+                sqldb.session.query(SessionDAO).filter(SessionDAO.app_release_uuid == self.APP_RELEASE_UUID).delete()
+                sqldb.session.commit()
+
+        cleanup()
+        ids = [f"get-sessions-{i}" for i in range(len(self.STATUSES))]
+        with app.app_context():
+            # inserted in reverse, so the updated order is the reverse of the id order
+            for i in reversed(range(len(ids))):
+                sqldb.session.execute(
+                    text(
+                        "INSERT INTO sessions.sessions (id, app_release_uuid, container, status, user_id, ws_conn) "
+                        "VALUES (:id, :app_release_uuid, CAST(:container AS JSONB), :status, :user_id, "
+                        "CAST(:ws_conn AS JSONB))"
+                    ),
+                    {
+                        "id": ids[i],
+                        "app_release_uuid": self.APP_RELEASE_UUID,
+                        "container": f'{{"id": "c", "node_id": "n-{i % 2}", "region": "US_EAST_1"}}',
+                        "status": self.STATUSES[i],
+                        "user_id": self.USER_IDS[i],
+                        "ws_conn": '{"id": "ws", "consumer_id": "c"}',
+                    },
+                )
+                sqldb.session.commit()
+        yield ids
+        cleanup()
+
+    def _pages(self, client: t.Any, query: str) -> list[list[str]]:
+        """Ids of the sessions of every page, following next_cursor."""
+        pages, cursor = [], None
+        while True:
+            url = f"/sessions?app_release_uuid={self.APP_RELEASE_UUID}&{query}"
+            res = client.get(url + (f"&cursor={cursor}" if cursor else ""))
+            assert res.status_code == 200, res.json
+            pages.append([s["id"] for s in res.json["sessions"]])
+            cursor = res.json["next_cursor"]
+            if not cursor:
+                assert "Link" not in res.headers
+                return pages
+            assert res.headers["Link"].endswith(f'cursor={cursor}>; rel="next"')
+
+    def test_pages_by_id(self, app, session_ids):
+        pages = self._pages(app.test_client(), "limit=2")
+        assert pages == [session_ids[:2], session_ids[2:4], session_ids[4:]]
+
+    def test_pages_by_updated(self, app, session_ids):
+        pages = self._pages(app.test_client(), "limit=2&order_by=updated")
+        assert pages == [session_ids[:2:-1], session_ids[2:0:-1], session_ids[:1]]
+
+    def test_filters(self, app, session_ids):
+        client = app.test_client()
+        assert self._pages(client, "status=active") == [[session_ids[1], session_ids[3]]]
+        assert self._pages(client, "node_id=n-0&status=pending") == [[session_ids[0], session_ids[4]]]
+        assert self._pages(client, "region=US_EAST_1") == [session_ids]
+        assert self._pages(client, "region=EU_CENTRAL_1") == [[]]
+        assert self._pages(client, f"user_id={self.USER_IDS[2]}") == [[session_ids[2]]]
+
+    def test_page_without_limit_is_capped(self, app, session_ids, monkeypatch: pytest.MonkeyPatch):
+        monkeypatch.setattr("sessionsvc.biz.session.GET_SESSIONS_MAX_LIMIT", 3)
+        assert self._pages(app.test_client(), "order_by=id") == [session_ids[:3], session_ids[3:]]
+
+    @pytest.mark.parametrize("cursor", ["not-base64!", "e30=", "WzEsIDJd"])
+    def test_invalid_cursor(self, app, cursor):
+        assert app.test_client().get(f"/sessions?cursor={cursor}").status_code == 400
+        assert app.test_client().get(f"/sessions?cursor={cursor}&order_by=updated").status_code == 400
+
+    def test_stream(self, app, session_ids):
+        client = app.test_client()
+        res = client.get(f"/sessions?app_release_uuid={self.APP_RELEASE_UUID}&stream=true&order_by=updated")
+        assert res.status_code == 200
+        assert res.mimetype == "application/x-ndjson"
+        assert [json.loads(line)["id"] for line in res.get_data().splitlines()] == session_ids[::-1]
+
+        cursor = "WyJnZXQtc2Vzc2lvbnMtMCJd"  # after get-sessions-0
+        res = client.get(f"/sessions?app_release_uuid={self.APP_RELEASE_UUID}&stream=true&limit=2&cursor={cursor}")
+        assert [json.loads(line)["id"] for line in res.get_data().splitlines()] == session_ids[1:3]
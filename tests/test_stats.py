@@ -0,0 +1,478 @@
+import datetime
+import json
+import threading
+import time
+import typing as t
+
+import pytest
+from flask import Flask
+from sqlalchemy import (
+    delete,
+    func,
+    insert,
+    select,
+    text,
+)
+
+from sessionsvc.biz.batch_writer import BatchWriter
+from sessionsvc.biz.errors import (
+    ERROR_WRITER_QUEUE_FULL,
+    WriterQueueFullException,
+)
+from sessionsvc.biz.models import (
+    SessionDAO,
+    UsersDcsDAO,
+    UsersDcsRttsDAO,
+    WebRTCStatsLogsDAO,
+    WebRTCStatsRollupDAO,
+)
+from sessionsvc.biz.rtt import (
+    RTT_BUCKETS,
+    RTT_EWMA_ALPHA,
+    bucket_index,
+    empty_hist,
+    quantile,
+)
+from sessionsvc.biz.sqldb import sqldb
+from sessionsvc.biz.stats import (
+    WebRtcStatsSample,
+    _collapse_rtts,
+    _record_rtts,
+    _write_samples,
+    stats_writer,
+)
+from sessionsvc.biz.stats_maintenance import (
+    partition_name,
+    stats_maintenance,
+)
+from sessionsvc.biz.stats_storage import stats_storage
+from sessionsvc.migrations import MIGRATIONS_DIR
+
+
+def _wait_for(condition: t.Callable[[], bool], timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not met in time"
+        time.sleep(0.01)
+
+
+@pytest.mark.unit
+class TestBatchWriter:
+    @pytest.fixture
+    def batches(self) -> list[list[int]]:
+        return []
+
+    @pytest.fixture
+    def writer(self, batches) -> t.Iterator[BatchWriter[int]]:
+        writer: BatchWriter[int] = BatchWriter("test", flush=batches.append)
+        writer.init_app(Flask(__name__))
+        yield writer
+        writer.close()
+
+    def test_full_batches_are_flushed_at_once_the_rest_after_interval(self, writer, batches):
+        writer.batch_size, writer.flush_interval = 3, 0.2
+        started = time.monotonic()
+        for i in range(7):
+            writer.put(i)
+        _wait_for(lambda: writer.flushed == 7)
+        assert batches == [[0, 1, 2], [3, 4, 5], [6]]
+        assert time.monotonic() - started >= writer.flush_interval
+
+    def test_full_queue_rejects_items(self, writer, batches, monkeypatch: pytest.MonkeyPatch):
+        entered, release = threading.Event(), threading.Event()
+
+        def flush(batch: list[int]) -> None:
+            entered.set()
+            release.wait(5)
+            batches.append(batch)
+
+        monkeypatch.setattr(writer, "_flush", flush)
+        writer.queue_size, writer.batch_size, writer.put_timeout = 2, 1, 0.01
+        writer.put(0)
+        # the flusher holds the first item, the queue fills up behind it
+        assert entered.wait(5)
+        writer.put(1)
+        writer.put(2)
+        with pytest.raises(WriterQueueFullException):
+            writer.put(3)
+        assert writer.rejected == 1
+        release.set()
+        _wait_for(lambda: writer.flushed == 3)
+        assert batches == [[0], [1], [2]]
+
+    def test_close_flushes_buffered_items(self, writer, batches):
+        writer.flush_interval = 0.2
+        for i in range(5):
+            writer.put(i)
+        writer.close()
+        assert batches == [[0, 1, 2, 3, 4]]
+        assert writer.qsize() == 0
+
+    def test_failed_flush_is_retried(self, writer, batches, monkeypatch: pytest.MonkeyPatch):
+        attempts = []
+
+        def flush(batch: list[int]) -> None:
+            attempts.append(time.monotonic())
+            if len(attempts) < 3:
+                raise RuntimeError("db is down")
+            batches.append(batch)
+
+        monkeypatch.setattr(writer, "_flush", flush)
+        writer.flush_interval, writer.retry_delay = 0.01, 0.05
+        writer.put(0)
+        _wait_for(lambda: writer.flushed == 1)
+        assert batches == [[0]]
+        assert writer.dropped == 0
+        # backoff doubles
+        assert attempts[2] - attempts[1] >= 2 * writer.retry_delay
+
+    def test_batch_is_dropped_after_the_last_retry(self, writer, monkeypatch: pytest.MonkeyPatch):
+        attempts = []
+
+        def flush(batch: list[int]) -> None:
+            attempts.append(batch)
+            raise RuntimeError("db is down")
+
+        monkeypatch.setattr(writer, "_flush", flush)
+        writer.flush_interval, writer.retry_delay = 0.01, 0.01
+        writer.put(0)
+        _wait_for(lambda: writer.dropped == 1)
+        writer.close()
+        assert (writer.flushed, len(attempts)) == (0, writer.retries + 1)
+
+
+@pytest.mark.integration
+class TestBufferedIngestion:
+    USER_ID = -1001
+
+    def _cleanup(self) -> None:
+        sqldb.session.execute(delete(SessionDAO).where(SessionDAO.user_id == self.USER_ID))
+        sqldb.session.execute(delete(WebRTCStatsLogsDAO).where(WebRTCStatsLogsDAO.user_id == self.USER_ID))
+        sqldb.session.execute(delete(UsersDcsRttsDAO).where(UsersDcsRttsDAO.user_id == self.USER_ID))
+        sqldb.session.commit()
+
+    @pytest.fixture
+    def session_id(self, app, fake_appsvc, monkeypatch: pytest.MonkeyPatch) -> t.Iterator[str]:
+        """A session whose stats are submitted in the buffered mode."""
+        with app.app_context():
+            self._cleanup()
+        body = {"app_release_uuid": "app", "user_id": self.USER_ID, "ws_conn": {"id": "ws", "consumer_id": "c"}}
+        session_id = app.test_client().post("/sessions/create", json=body).json["session_id"]
+        # what init_app does with FLASK_STATS_INGEST_MODE=buffered, on a fresh queue and flusher
+        monkeypatch.setattr(stats_writer, "_app", app)
+        monkeypatch.setattr(stats_writer, "_pid", None)
+        monkeypatch.setattr(stats_writer, "flush_interval", 0.05)
+        yield session_id
+        stats_writer.close()
+        with app.app_context():
+            self._cleanup()
+
+    @staticmethod
+    def _submit(app: t.Any, session_id: str, rtt: float = 0.05) -> t.Any:
+        stats = json.dumps({"remote_inbound_rtp": {"round_trip_time": rtt}})
+        return app.test_client().post(f"/sessions/{session_id}/stats", json={"stats": stats})
+
+    def _logged(self, app: t.Any) -> int:
+        with app.app_context():
+            stmt = select(func.count()).where(
+                WebRTCStatsLogsDAO.user_id == self.USER_ID
+            )  # pylint: disable=not-callable
+            return sqldb.session.execute(stmt).scalar()
+
+    def test_submissions_are_accepted_and_written_in_batches(self, app, session_id, monkeypatch):
+        monkeypatch.setattr(stats_writer, "batch_size", 3)
+        flushed = stats_writer.flushed
+        for _ in range(5):
+            assert self._submit(app, session_id).status_code == 202
+        _wait_for(lambda: stats_writer.flushed == flushed + 5)
+        assert self._logged(app) == 5
+        with app.app_context():
+            agg = sqldb.session.query(UsersDcsRttsDAO).filter(UsersDcsRttsDAO.user_id == self.USER_ID).one()
+        assert agg.samples == 5
+
+    def test_full_queue_is_reported(self, app, session_id, monkeypatch):
+        entered, release = threading.Event(), threading.Event()
+        write = stats_writer._flush  # pylint: disable=protected-access
+
+        def flush(samples: list[WebRtcStatsSample]) -> None:
+            entered.set()
+            release.wait(5)
+            write(samples)
+
+        monkeypatch.setattr(stats_writer, "_flush", flush)
+        monkeypatch.setattr(stats_writer, "queue_size", 1)
+        monkeypatch.setattr(stats_writer, "batch_size", 1)
+        monkeypatch.setattr(stats_writer, "put_timeout", 0.01)
+        assert self._submit(app, session_id).status_code == 202
+        assert entered.wait(5)
+        assert self._submit(app, session_id).status_code == 202
+        res = self._submit(app, session_id)
+        assert res.status_code == 409
+        assert res.json["code"] == ERROR_WRITER_QUEUE_FULL[0]
+        release.set()
+        stats_writer.close()
+        assert self._logged(app) == 2
+
+
+@pytest.mark.unit
+class TestRttHist:
+    def test_bounds_are_inclusive_upper_bounds(self):
+        assert bucket_index(0.0) == 0
+        for i, bound in enumerate(RTT_BUCKETS):
+            assert bucket_index(bound) == i
+            assert bucket_index(bound + 1e-9) == min(i + 1, len(RTT_BUCKETS) - 1)
+        assert bucket_index(60.0) == len(RTT_BUCKETS) - 1
+
+    def test_quantile(self):
+        hist = empty_hist()
+        assert quantile(hist, 0.5) is None
+        hist[3] = 4
+        assert quantile(hist, 0.5) == pytest.approx((RTT_BUCKETS[2] + RTT_BUCKETS[3]) / 2)
+        assert quantile(hist, 1.0) == RTT_BUCKETS[3]
+        # the bucket's lower bound is raised to the min seen
+        min_rtt = (RTT_BUCKETS[2] + RTT_BUCKETS[3]) / 2
+        assert quantile(hist, 0.5, min_rtt) == pytest.approx((min_rtt + RTT_BUCKETS[3]) / 2)
+        hist[10] = 4
+        assert RTT_BUCKETS[9] < quantile(hist, 0.95) <= RTT_BUCKETS[10]
+
+
+@pytest.mark.integration
+class TestRecordRtt:
+    USER_ID = -1003
+    REGION = "us-east-1"
+
+    def _cleanup(self) -> None:
+        sqldb.session.execute(delete(UsersDcsRttsDAO).where(UsersDcsRttsDAO.user_id.in_([self.USER_ID, -1004])))
+        sqldb.session.commit()
+
+    def _sample(self, rtt: t.Optional[float], user_id: int = USER_ID, region: str = REGION) -> WebRtcStatsSample:
+        return WebRtcStatsSample("app", region, "record-rtt-test", {}, user_id, rtt)
+
+    def test_parallel_submissions_lose_no_samples(self, app):
+        threads_num, samples_num = 8, 25
+        rtts = [RTT_BUCKETS[i % 10] for i in range(threads_num)]
+        barrier = threading.Barrier(threads_num)
+        errors = []
+
+        def submit(rtt: float) -> None:
+            # batches of overlapping aggregates, queued in opposite orders by half of the workers
+            batch = [self._sample(rtt), self._sample(rtt, self.USER_ID, "us-west-1")]
+            if rtts.index(rtt) % 2:
+                batch.reverse()
+            with app.app_context():
+                barrier.wait()
+                try:
+                    for _ in range(samples_num):
+                        _record_rtts(batch)
+                        sqldb.session.commit()
+                except Exception as e:  # pylint: disable=broad-exception-caught
+                    errors.append(e)
+
+        with app.app_context():
+            self._cleanup()
+        threads = [threading.Thread(target=submit, args=(rtt,)) for rtt in rtts]
+        for th in threads:
+            th.start()
+        for th in threads:
+            th.join()
+
+        with app.app_context():
+            aggs = sqldb.session.query(UsersDcsRttsDAO).filter(UsersDcsRttsDAO.user_id == self.USER_ID).all()
+            self._cleanup()
+        assert not errors
+        assert len(aggs) == 2
+        for agg in aggs:
+            assert agg.samples == threads_num * samples_num
+            assert sum(agg.hist) == threads_num * samples_num
+            assert agg.min_rtt == min(rtts)
+            for rtt in rtts:
+                assert agg.hist[bucket_index(rtt)] >= samples_num
+
+    # batch sizes: sample per sample, all at once into a new aggregate, into an existing one
+    @pytest.mark.parametrize("sizes", [[1, 1, 1, 1, 1], [5], [2, 3]])
+    def test_aggregates_are_served(self, app, sizes):
+        rtts = [0.05, 0.02, RTT_BUCKETS[5], 0.1, 0.02]
+        ewma = rtts[0]
+        for rtt in rtts[1:]:
+            ewma += RTT_EWMA_ALPHA * (rtt - ewma)
+        hist = empty_hist()
+        for rtt in rtts:
+            hist[bucket_index(rtt)] += 1
+
+        with app.app_context():
+            self._cleanup()
+            offset = 0
+            for size in sizes:
+                # with samples of another user in between
+                batch = [self._sample(0.3, -1004), self._sample(0.3, -1004, "us-west-1")]
+                batch[1:1] = [self._sample(rtt) for rtt in rtts[offset : offset + size]]
+                offset += size
+                _record_rtts(batch)
+                sqldb.session.commit()
+            agg = sqldb.session.query(UsersDcsRttsDAO).filter(UsersDcsRttsDAO.user_id == self.USER_ID).one()
+            res = app.test_client().get(f"/users/{self.USER_ID}/rtts")
+            self._cleanup()
+        assert agg.samples == len(rtts)
+        assert agg.ewma == pytest.approx(ewma)
+        assert agg.min_rtt == min(rtts)
+        assert agg.hist == hist
+        assert res.status_code == 200
+        assert res.json == {
+            "rtts": [
+                {
+                    "region": self.REGION,
+                    "samples": len(rtts),
+                    "ewma": pytest.approx(ewma),
+                    "min": min(rtts),
+                    "p50": pytest.approx(quantile(hist, 0.5, min(rtts))),
+                    "p95": pytest.approx(quantile(hist, 0.95, min(rtts))),
+                }
+            ]
+        }
+
+    def test_samples_are_collapsed_per_user_and_region(self):
+        rows = _collapse_rtts(
+            [
+                self._sample(0.02, -1004),
+                self._sample(0.05),
+                self._sample(None),
+                self._sample(0.01),
+                self._sample(0.03, -1004),
+            ]
+        )
+        assert [(r["user_id"], r["region"], r["samples"], r["first_rtt"], r["min_rtt"]) for r in rows] == [
+            (-1004, self.REGION, 2, 0.02, 0.02),
+            (self.USER_ID, self.REGION, 2, 0.05, 0.01),
+        ]
+        assert rows[1]["ewma"] == pytest.approx(0.05 + RTT_EWMA_ALPHA * (0.01 - 0.05))
+
+    def test_backfill_buckets_like_record_rtts(self, app):
+        rtts = [0.001, *RTT_BUCKETS, *(bound + 1e-6 for bound in RTT_BUCKETS), 6.0]
+        hist = empty_hist()
+        for rtt in rtts:
+            hist[bucket_index(rtt)] += 1
+
+        with app.app_context():
+            self._cleanup()
+            sqldb.session.add(UsersDcsDAO(user_id=self.USER_ID, dcs={self.REGION: rtts}))
+            sqldb.session.flush()
+            # re-run of the backfill only fills in the aggregates missing, rolled back below
+            sql = (MIGRATIONS_DIR / "0001_stats_users_dcs_rtts.sql").read_text()
+            sqldb.session.connection().connection.cursor().execute(sql)
+            agg = sqldb.session.query(UsersDcsRttsDAO).filter(UsersDcsRttsDAO.user_id == self.USER_ID).one()
+            backfilled = (agg.hist, agg.min_rtt, agg.samples)
+            sqldb.session.rollback()
+        assert backfilled == (hist, min(rtts), len(rtts))
+
+
+def _webrtc_stats(rtt: float, jitter: float, packets_lost: int, bytes_received: int) -> dict:
+    return {
+        "remote_inbound_rtp": {"round_trip_time": rtt},
+        "inbound_rtp": {"jitter": jitter, "packetsLost": packets_lost, "bytesReceived": bytes_received},
+    }
+
+
+@pytest.mark.integration
+class TestStatsMaintenance:
+    SESSION_ID = "stats-maintenance-test"
+
+    def _cleanup(self) -> None:
+        sqldb.session.execute(delete(WebRTCStatsLogsDAO).where(WebRTCStatsLogsDAO.session_id == self.SESSION_ID))
+        sqldb.session.execute(delete(WebRTCStatsRollupDAO).where(WebRTCStatsRollupDAO.session_id == self.SESSION_ID))
+        sqldb.session.commit()
+
+    def test_partitions_are_created_ahead(self, app):
+        with app.app_context():
+            stats_maintenance.run()
+            today = stats_maintenance._now().date()  # pylint: disable=protected-access
+            partitions = stats_maintenance.partitions()
+            sample = WebRtcStatsSample("app", "us-east-1", self.SESSION_ID, _webrtc_stats(0.05, 0.01, 0, 0), -1024)
+            _write_samples([sample])
+            created = sqldb.session.execute(
+                select(WebRTCStatsLogsDAO.created).where(WebRTCStatsLogsDAO.session_id == self.SESSION_ID)
+            ).scalar()
+            self._cleanup()
+        for i in range(stats_maintenance.premake_days + 1):
+            assert partition_name(today + datetime.timedelta(days=i)) in partitions
+        assert created.date() == today
+
+    def test_ingestion_creates_a_missing_partition(self, app):
+        with app.app_context():
+            self._cleanup()
+            today = stats_maintenance._now().date()  # pylint: disable=protected-access
+            name = partition_name(today)
+            bounds = f"FOR VALUES FROM ('{today}') TO ('{today + datetime.timedelta(days=1)}')"
+            # today's partition is put aside, as if maintenance never created it
+            sqldb.session.execute(text(f"ALTER TABLE stats.webrtc_stats_logs DETACH PARTITION stats.{name}"))
+            sqldb.session.execute(text(f"ALTER TABLE stats.{name} RENAME TO {name}_aside"))
+            sqldb.session.commit()
+            try:
+                sample = WebRtcStatsSample("app", "us-east-1", self.SESSION_ID, _webrtc_stats(0.05, 0.01, 0, 0), -1024)
+                _write_samples([sample])
+                partition = sqldb.session.execute(
+                    select(text("tableoid::regclass::text"))
+                    .select_from(WebRTCStatsLogsDAO)
+                    .where(WebRTCStatsLogsDAO.session_id == self.SESSION_ID)
+                ).scalar()
+                self._cleanup()
+            finally:
+                sqldb.session.rollback()
+                sqldb.session.execute(text(f"DROP TABLE IF EXISTS stats.{name}"))
+                sqldb.session.execute(text(f"ALTER TABLE stats.{name}_aside RENAME TO {name}"))
+                sqldb.session.execute(
+                    text(f"ALTER TABLE stats.webrtc_stats_logs ATTACH PARTITION stats.{name} {bounds}")
+                )
+                sqldb.session.commit()
+        assert partition == f"stats.{name}"
+
+    def test_expired_partition_is_dropped(self, app, monkeypatch: pytest.MonkeyPatch):
+        with app.app_context():
+            day = stats_maintenance._now().date() + datetime.timedelta(days=400)  # pylint: disable=protected-access
+            assert stats_maintenance.create_partition(day)
+            name = partition_name(day)
+            partition = stats_maintenance.partitions()[name]
+            # only the test partition is considered, dropping it leaves the others alone
+            monkeypatch.setattr(stats_maintenance, "partitions", lambda: {name: partition})
+            expired = day + datetime.timedelta(days=stats_maintenance.retention_days + 1)
+            assert stats_maintenance.drop_expired_partitions(expired) == [name]
+            monkeypatch.undo()
+            assert name not in stats_maintenance.partitions()
+
+    def test_roll_up_hour(self, app):
+        with app.app_context():
+            self._cleanup()
+            hour = stats_maintenance._now().replace(  # pylint: disable=protected-access
+                minute=0, second=0, microsecond=0
+            ) - datetime.timedelta(hours=2)
+            rows = [
+                (0, _webrtc_stats(0.02, 0.001, 10, 1000)),
+                (30, _webrtc_stats(0.04, 0.003, 15, 4000)),
+                (60, _webrtc_stats(0.06, 0.002, 25, 10000)),
+                (61, {"inbound_rtp": {"jitter": "bad"}}),
+            ]
+            # the first rows are stored as a json blob (before the typed columns), the others in typed columns
+            sqldb.session.execute(
+                insert(WebRTCStatsLogsDAO),
+                [
+                    {
+                        "app_release_uuid": "app",
+                        "created": hour + datetime.timedelta(seconds=seconds),
+                        "region": "us-east-1",
+                        "session_id": self.SESSION_ID,
+                        "user_id": -1024,
+                        **({"stats": stats} if i < 2 else stats_storage.to_columns(stats)),
+                    }
+                    for i, (seconds, stats) in enumerate(rows)
+                ],
+            )
+            sqldb.session.commit()
+            stats_maintenance.roll_up_hour(hour)
+            rollup = sqldb.session.get(WebRTCStatsRollupDAO, (hour, self.SESSION_ID))
+            self._cleanup()
+        assert rollup.samples == 4
+        assert rollup.rtt_avg == pytest.approx(0.04)
+        assert rollup.rtt_max == pytest.approx(0.06)
+        assert rollup.jitter_max == pytest.approx(0.003)
+        assert rollup.packets_lost == 15
+        # bytes received over the seconds between the first and the last sample
+        assert rollup.bitrate_avg == pytest.approx(9000 * 8 / 61)
@@ -0,0 +1,109 @@
+import pytest
+from sqlalchemy import (
+    delete,
+    select,
+    text,
+)
+
+from sessionsvc.biz.models import WebRTCStatsLogsDAO
+from sessionsvc.biz.sqldb import sqldb
+from sessionsvc.biz.stats_storage import (
+    StatsStorage,
+    decode_extra,
+    encode_extra,
+    split,
+    stats_storage,
+)
+
+STATS = {
+    "candidate_pair": {"currentRoundTripTime": 0.03, "availableOutgoingBitrate": 2500000},
+    "codec": {"mimeType": "video/VP8", "clockRate": 90000},
+    "inbound_rtp": {
+        "jitter": 0.004,
+        "packetsLost": 12,
+        "framesDecoded": 3600,
+        "framesDropped": 5,
+        "bytesReceived": 7500000,
+        "framesPerSecond": 60,
+    },
+    "remote_inbound_rtp": {"round_trip_time": 0.05},
+}
+
+
+@pytest.mark.unit
+class TestSplit:
+    def test_metrics_are_moved_to_columns(self):
+        values, extra = split(STATS)
+        assert values == {
+            "rtt": 0.05,
+            "jitter": 0.004,
+            "packets_lost": 12,
+            "frames_decoded": 3600,
+            "frames_dropped": 5,
+            "bytes_received": 7500000,
+            "codec": "video/VP8",
+        }
+        assert extra == {
+            "candidate_pair": {"currentRoundTripTime": 0.03, "availableOutgoingBitrate": 2500000},
+            "codec": {"clockRate": 90000},
+            "inbound_rtp": {"framesPerSecond": 60},
+        }
+        assert STATS["remote_inbound_rtp"] == {"round_trip_time": 0.05}
+
+    def test_mistyped_values_are_kept_as_extra(self):
+        values, extra = split({"candidate_pair": {"currentRoundTripTime": 0.03}, "inbound_rtp": {"packetsLost": 2**40}})
+        assert values["rtt"] == 0.03
+        assert values["packets_lost"] is None
+        assert extra == {"inbound_rtp": {"packetsLost": 2**40}}
+
+        values, extra = split({"remote_inbound_rtp": {"round_trip_time": "0.05"}, "codec": {"mimeType": True}})
+        assert set(values.values()) == {None}
+        assert extra == {"remote_inbound_rtp": {"round_trip_time": "0.05"}, "codec": {"mimeType": True}}
+
+        assert split([1, 2]) == (dict.fromkeys(values), [1, 2])
+
+    def test_extra_round_trip(self):
+        _, extra = split(STATS)
+        data = encode_extra(extra)
+        assert decode_extra(memoryview(data)) == extra
+        assert len(data) < len(str(extra)) / 2
+        with pytest.raises(ValueError):
+            decode_extra(b"\x00" + data[1:])
+
+    def test_extra_is_optional(self):
+        storage = StatsStorage()
+        assert decode_extra(storage.to_columns(STATS)["stats_extra"])["codec"] == {"clockRate": 90000}
+        storage.keep_extra = False
+        assert storage.to_columns(STATS)["stats_extra"] is None
+        assert StatsStorage().to_columns({"remote_inbound_rtp": {"round_trip_time": 0.05}})["stats_extra"] is None
+
+
+@pytest.mark.integration
+class TestConvert:
+    SESSION_ID = "stats-storage-test"
+
+    def _cleanup(self) -> None:
+        sqldb.session.execute(delete(WebRTCStatsLogsDAO).where(WebRTCStatsLogsDAO.session_id == self.SESSION_ID))
+        sqldb.session.commit()
+
+    def test_json_rows_are_converted(self, app):
+        with app.app_context():
+            self._cleanup()
+            # a legacy row (without timestamp) and a row submitted before the typed columns
+            for created in ("-infinity", "now"):
+                sqldb.session.execute(
+                    text(
+                        "INSERT INTO stats.webrtc_stats_logs (app_release_uuid, created, region, session_id, stats) "
+                        "VALUES ('app', CAST(:created AS TIMESTAMP), 'us-east-1', :session_id, CAST(:stats AS JSONB))"
+                    ),
+                    {"created": created, "session_id": self.SESSION_ID, "stats": '{"inbound_rtp": {"jitter": 0.5}}'},
+                )
+            sqldb.session.commit()
+            assert sum(stats_storage.convert(batch_size=1)) >= 2
+            rows = sqldb.session.execute(
+                select(WebRTCStatsLogsDAO.stats, WebRTCStatsLogsDAO.jitter, WebRTCStatsLogsDAO.stats_extra).where(
+                    WebRTCStatsLogsDAO.session_id == self.SESSION_ID
+                )
+            ).all()
+            self._cleanup()
+        assert [tuple(r) for r in rows] == [(None, 0.5, None)] * 2
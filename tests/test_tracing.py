@@ -0,0 +1,164 @@
+import threading
+import time
+import typing as t
+from http.server import (
+    BaseHTTPRequestHandler,
+    ThreadingHTTPServer,
+)
+
+import pytest
+from opentelemetry import trace
+from opentelemetry.sdk.trace import (
+    ReadableSpan,
+    TracerProvider,
+)
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+from opentelemetry.trace import (
+    SpanKind,
+    StatusCode,
+)
+
+from sessionsvc.biz.models import SessionDAO
+from sessionsvc.biz.sqldb import sqldb
+from sessionsvc.biz.tracing import TailSamplingSpanProcessor
+from sessionsvc.services import appsvc
+
+SESSION_ID = "tracing-1018"
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+TRACEPARENT = f"00-{TRACE_ID}-00f067aa0ba902b7-01"
+
+
+@pytest.fixture(scope="session")
+def exporter() -> InMemorySpanExporter:
+    # the global tracer provider can only be set once per process
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+    return exporter
+
+
+@pytest.fixture
+def spans(exporter: InMemorySpanExporter) -> t.Callable[[], list[ReadableSpan]]:
+    exporter.clear()
+    return exporter.get_finished_spans
+
+
+@pytest.fixture
+def stub_appsvc(monkeypatch: pytest.MonkeyPatch) -> t.Iterator[list[dict]]:
+    requests_headers: list[dict] = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self) -> None:  # pylint: disable=invalid-name
+            self.rfile.read(int(self.headers["Content-Length"]))
+            requests_headers.append(dict(self.headers))
+            self.send_response(200)
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"{}")
+
+        def log_message(self, *args: t.Any) -> None:
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(appsvc, "APPSVC_URL", f"http://127.0.0.1:{server.server_port}")
+    yield requests_headers
+    server.shutdown()
+
+
+def _children(spans: list[ReadableSpan], parent: ReadableSpan) -> list[ReadableSpan]:
+    return [s for s in spans if s.parent is not None and s.parent.span_id == parent.context.span_id]
+
+
+def _one(spans: list[ReadableSpan], name: str) -> ReadableSpan:
+    matching = [s for s in spans if s.name == name]
+    assert len(matching) == 1, [s.name for s in spans]
+    return matching[0]
+
+
+@pytest.mark.integration
+class TestRequestTracing:
+    @pytest.fixture
+    def client(self, app):
+        def cleanup() -> None:
+            with app.app_context():
+                sqldb.session.query(SessionDAO).filter(SessionDAO.id == SESSION_ID).delete()
+                sqldb.session.commit()
+
+        cleanup()
+        yield app.test_client()
+        cleanup()
+
+    def test_request_continues_incoming_trace(self, app, client, spans):
+        res = client.get("/sessions/missing", headers={"traceparent": TRACEPARENT})
+        assert res.status_code == 409
+        finished = spans()
+        server = _one(finished, "GET /sessions/<string:session_id>")
+        assert server.kind == SpanKind.SERVER
+        assert format(server.context.trace_id, "032x") == TRACE_ID
+        assert server.parent.is_remote
+        assert server.attributes["http.response.status_code"] == 409
+
+        op = _one(_children(finished, server), "session.get_session")
+        assert op.status.status_code == StatusCode.ERROR
+        (statement,) = _children(finished, op)
+        assert statement.name == "SELECT"
+        assert statement.attributes["db.system"] == "postgresql"
+
+    def test_appsvc_call_propagates_context(self, app, client, spans, stub_appsvc):
+        with app.app_context():
+            sqldb.session.add(
+                SessionDAO(
+                    id=SESSION_ID,
+                    app_release_uuid="app",
+                    container={"id": "c", "node_id": "n", "region": "US_EAST_1"},
+                    status="active",
+                    user_id=-1018,
+                    ws_conn={"id": "ws", "consumer_id": "c"},
+                )
+            )
+            sqldb.session.commit()
+        assert client.post(f"/sessions/{SESSION_ID}/close").status_code == 200
+        finished = spans()
+        op = _one(finished, "session.close_session")
+        call = _one(_children(finished, op), "appsvc.stop")
+        assert call.kind == SpanKind.CLIENT
+        assert call.attributes["http.response.status_code"] == 200
+        (headers,) = stub_appsvc
+        assert headers["traceparent"].startswith(f"00-{call.context.trace_id:032x}-{call.context.span_id:016x}-")
+        assert [s.name for s in _children(finished, op)].count("DELETE") == 1
+
+
+@pytest.mark.unit
+class TestTailSampling:
+    @pytest.fixture
+    def tracer(self) -> t.Iterator[tuple[trace.Tracer, InMemorySpanExporter]]:
+        exporter = InMemorySpanExporter()
+        provider = TracerProvider()
+        provider.add_span_processor(TailSamplingSpanProcessor(SimpleSpanProcessor(exporter), latency_threshold=0.05))
+        yield provider.get_tracer("test"), exporter
+        provider.shutdown()
+
+    def test_fast_trace_is_dropped(self, tracer):
+        tr, exporter = tracer
+        with tr.start_as_current_span("root"):
+            with tr.start_as_current_span("child"):
+                pass
+        assert not exporter.get_finished_spans()
+
+    def test_slow_trace_is_kept_whole(self, tracer):
+        tr, exporter = tracer
+        with tr.start_as_current_span("root"):
+            with tr.start_as_current_span("child"):
+                time.sleep(0.06)
+        assert [s.name for s in exporter.get_finished_spans()] == ["child", "root"]
+
+    def test_failed_trace_is_kept(self, tracer):
+        tr, exporter = tracer
+        with pytest.raises(ValueError):
+            with tr.start_as_current_span("root"):
+                with tr.start_as_current_span("child"):
+                    raise ValueError()
+        assert [s.name for s in exporter.get_finished_spans()] == ["child", "root"]